@@ -0,0 +1,87 @@
+"""
+Micro-benchmark for WebSocket frame encoding and fan-out
+Compares json.dumps with Frame under orjson and under its stdlib fallback on agent_performance
+ticks, and times a broadcast through ConnectionManager to many idle sockets.
+
+    python bench_frames.py --subscribers 10000 --rounds 2000
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import timeit
+from datetime import datetime
+from websockets import frames
+from websockets.connection_manager import ConnectionManager
+from websockets.frames import Frame
+
+def performance_tick(agent: str) -> dict:
+    return {
+        "type": "agent_performance",
+        "agent": agent,
+        "data": {
+            "cpu_usage": random.uniform(10, 90),
+            "memory_usage": random.uniform(20, 85),
+            "response_time": random.uniform(50, 500),
+            "requests_per_minute": random.randint(10, 100),
+            "success_rate": random.uniform(95, 99.9),
+            "active_connections": random.randint(0, 50),
+            "status": random.choice(["active", "busy", "idle"]),
+            "last_activity": datetime.now().isoformat()
+        },
+        "timestamp": datetime.now().isoformat()
+    }
+
+def bench_encoders(rounds: int):
+    payload = performance_tick("neochat")
+    results = {"json.dumps": timeit.timeit(lambda: json.dumps(payload), number=rounds)}
+    if frames.orjson:
+        results["Frame (orjson)"] = timeit.timeit(lambda: Frame(payload), number=rounds)
+    orjson, frames.orjson = frames.orjson, None
+    try:
+        results["Frame (stdlib fallback)"] = timeit.timeit(lambda: Frame(payload), number=rounds)
+    finally:
+        frames.orjson = orjson
+    for name, seconds in results.items():
+        print(f"{name:<26} {seconds / rounds * 1e6:8.2f} µs/frame")
+
+class IdleSocket:
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        pass
+
+async def bench_fanout(subscribers: int, ticks: int):
+    manager = ConnectionManager()
+    for _ in range(subscribers):
+        await manager.connect(IdleSocket(), "neochat")
+
+    enqueue = 0.0
+    start = time.perf_counter()
+    for _ in range(ticks):
+        tick = time.perf_counter()
+        await manager.broadcast_to_agent(Frame(performance_tick("neochat")), "neochat", key="agent_performance:neochat")
+        enqueue += time.perf_counter() - tick
+        while any(client.queue for client in manager.connections()):
+            await asyncio.sleep(0)
+    drained = time.perf_counter() - start
+    print(f"broadcast to {subscribers} sockets: {enqueue / ticks * 1e3:.2f} ms/tick to enqueue, "
+          f"{drained / ticks * 1e3:.2f} ms/tick until every writer has sent")
+
+    for websocket in list(manager.clients):
+        manager.disconnect(websocket)
+
+def main():
+    parser = argparse.ArgumentParser(description="Frame encoding and fan-out micro-benchmark")
+    parser.add_argument("--rounds", type=int, default=20000, help="Frames encoded per encoder")
+    parser.add_argument("--subscribers", type=int, default=5000)
+    parser.add_argument("--ticks", type=int, default=20)
+    args = parser.parse_args()
+
+    bench_encoders(args.rounds)
+    asyncio.run(bench_fanout(args.subscribers, args.ticks))
+
+if __name__ == "__main__":
+    main()
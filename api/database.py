@@ -99,7 +99,8 @@ class Payment(Base):
     provider = Column(String)  # stripe, paypal, lemon_squeezy
     transaction_id = Column(String, unique=True)
     status = Column(String)  # pending, completed, failed, refunded
-    metadata = Column(JSON)
+    # "metadata" is reserved on declarative models, so the column is mapped under another name
+    payment_metadata = Column("metadata", JSON)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
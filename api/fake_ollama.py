@@ -0,0 +1,240 @@
+"""
+Ollama-compatible stand-in server for load and failover testing
+Serves /api/generate (streaming and not), /api/embed, /api/ps, /api/tags and /api/version
+with configurable token rate, time-to-first-token, error rate and hang probability.
+
+Serve every local model endpoint from ai_models_config.yml on one box:
+    python fake_ollama.py --ports 11434-11440 --token-rate 40 --ttft 0.3 --error-rate 0.02
+
+Behavior can be changed while running, e.g. to trip a breaker:
+    curl -X POST localhost:11436/fake/config -d '{"error_rate": 1.0}'
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import signal
+import time
+import uvicorn
+from datetime import datetime
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Dict, Any, List, Optional
+
+WORDS = (
+    "the model considered your question carefully and produced this simulated answer "
+    "so that routing streaming and failover paths can be exercised without real weights"
+).split()
+
+DEFAULT_SETTINGS = {
+    "token_rate": 30.0,         # tokens per second once generation starts
+    "ttft": 0.25,               # seconds before the first token
+    "ttft_jitter": 0.1,         # +/- uniform jitter on ttft
+    "tokens": 64,               # tokens per answer unless options.num_predict says otherwise
+    "error_rate": 0.0,          # chance a request fails with HTTP 500
+    "mid_stream_error_rate": 0.0,  # chance a stream breaks after some tokens
+    "hang_probability": 0.0,    # chance a request never answers
+    "load_time": 0.0,           # seconds to "load" a model that is not resident
+    "embedding_dim": 768
+}
+
+def create_app(settings: Dict[str, Any]) -> FastAPI:
+    """One fake Ollama instance; settings are shared and may be changed at runtime"""
+    app = FastAPI(title="Fake Ollama")
+    loaded: Dict[str, float] = {}
+    stats = {"requests": 0, "errors": 0, "hangs": 0, "tokens": 0}
+
+    async def ensure_loaded(model: str, keep_alive: Any):
+        if keep_alive in (0, "0", "0s"):
+            loaded.pop(model, None)
+            return
+        if model not in loaded:
+            await asyncio.sleep(settings["load_time"])
+        loaded[model] = time.time()
+
+    async def misbehave() -> Optional[JSONResponse]:
+        """Hang forever or fail as configured; returns the error response to send, if any"""
+        stats["requests"] += 1
+        if random.random() < settings["hang_probability"]:
+            stats["hangs"] += 1
+            await asyncio.Event().wait()
+        if random.random() < settings["error_rate"]:
+            stats["errors"] += 1
+            return JSONResponse(status_code=500, content={"error": "simulated model failure"})
+        return None
+
+    def first_token_delay() -> float:
+        return max(0.0, settings["ttft"] + random.uniform(-settings["ttft_jitter"], settings["ttft_jitter"]))
+
+    def answer_tokens(body: Dict[str, Any]) -> List[str]:
+        count = int((body.get("options") or {}).get("num_predict") or settings["tokens"])
+        return [WORDS[i % len(WORDS)] + " " for i in range(count)]
+
+    def final_fields(body: Dict[str, Any], tokens: List[str], started: float) -> Dict[str, Any]:
+        prompt_tokens = len(str(body.get("prompt", "")).split())
+        return {
+            "done": True,
+            "done_reason": "stop",
+            "context": list(body.get("context") or []) + list(range(prompt_tokens + len(tokens))),
+            "total_duration": int((time.perf_counter() - started) * 1e9),
+            "prompt_eval_count": prompt_tokens,
+            "eval_count": len(tokens)
+        }
+
+    @app.get("/api/version")
+    async def version():
+        return {"version": "0.0.0-fake"}
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": model, "model": model} for model in loaded]}
+
+    @app.get("/api/ps")
+    async def ps():
+        return {"models": [
+            {"name": model, "model": model, "expires_at": datetime.utcfromtimestamp(used + 300).isoformat() + "Z"}
+            for model, used in loaded.items()
+        ]}
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        body = await request.json()
+        model = body.get("model", "fake")
+        if ":" not in model:
+            model = f"{model}:latest"
+        started = time.perf_counter()
+
+        error = await misbehave()
+        if error is not None:
+            return error
+        await ensure_loaded(model, body.get("keep_alive"))
+
+        # Empty prompts only load or unload the model, like Ollama
+        if not body.get("prompt"):
+            return {"model": model, "response": "", "done": True, "done_reason": "load"}
+
+        tokens = answer_tokens(body)
+        await asyncio.sleep(first_token_delay())
+
+        if body.get("stream", True) is False:
+            await asyncio.sleep(len(tokens) / settings["token_rate"])
+            stats["tokens"] += len(tokens)
+            return {"model": model, "response": "".join(tokens), **final_fields(body, tokens, started)}
+
+        break_at = len(tokens) + 1
+        if random.random() < settings["mid_stream_error_rate"]:
+            break_at = random.randint(1, max(1, len(tokens) - 1))
+
+        async def token_stream():
+            for index, token in enumerate(tokens):
+                if index == break_at:
+                    stats["errors"] += 1
+                    yield json.dumps({"error": "simulated stream failure"}) + "\n"
+                    return
+                if index:
+                    await asyncio.sleep(1 / settings["token_rate"])
+                stats["tokens"] += 1
+                yield json.dumps({"model": model, "response": token, "done": False}) + "\n"
+            yield json.dumps({"model": model, "response": "", **final_fields(body, tokens, started)}) + "\n"
+
+        return StreamingResponse(token_stream(), media_type="application/x-ndjson")
+
+    @app.post("/api/embed")
+    async def embed(request: Request):
+        body = await request.json()
+        error = await misbehave()
+        if error is not None:
+            return error
+        texts = body.get("input") or []
+        texts = [texts] if isinstance(texts, str) else texts
+        embeddings = []
+        for text in texts:
+            # Deterministic per text so caches and similarity search behave sensibly
+            rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+            embeddings.append([rng.uniform(-1, 1) for _ in range(settings["embedding_dim"])])
+        await asyncio.sleep(0.002 * len(texts))
+        return {"model": body.get("model"), "embeddings": embeddings}
+
+    @app.get("/fake/config")
+    async def get_config():
+        return {"settings": settings, "stats": stats, "loaded": list(loaded)}
+
+    @app.post("/fake/config")
+    async def set_config(request: Request):
+        changes = await request.json()
+        unknown = [key for key in changes if key not in settings]
+        if unknown:
+            return JSONResponse(status_code=400, content={"error": f"unknown settings: {', '.join(unknown)}"})
+        settings.update({key: type(settings[key])(value) for key, value in changes.items()})
+        return {"settings": settings}
+
+    return app
+
+def parse_ports(value: str) -> List[int]:
+    """'11434' or '11434-11440' or '11434,11444'"""
+    ports = []
+    for part in value.split(","):
+        start, _, end = part.partition("-")
+        ports.extend(range(int(start), int(end or start) + 1))
+    return ports
+
+class FakeServer(uvicorn.Server):
+    """One port's server; serve() handles signals for all of them, so the last one installed does not win"""
+
+    def install_signal_handlers(self):
+        pass
+
+async def serve(ports: List[int], host: str, settings: Dict[str, Any]):
+    """Run one independent fake instance per port in this process; SIGINT/SIGTERM stop every port"""
+    servers = [
+        FakeServer(uvicorn.Config(
+            create_app(dict(settings)), host=host, port=port, log_level="warning",
+            # No WebSocket routes, and the local websockets package would shadow the library
+            ws="none",
+            # Simulated hangs never finish, so shutdown cannot wait for them
+            timeout_graceful_shutdown=1
+        ))
+        for port in ports
+    ]
+
+    def stop_all(*_):
+        for server in servers:
+            server.should_exit = True
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_all)
+        except NotImplementedError:  # Windows
+            signal.signal(sig, stop_all)
+
+    async def run(server: FakeServer) -> bool:
+        try:
+            await server.serve()
+            return True
+        except SystemExit:
+            # uvicorn exits when its port cannot be bound; take the other ports down too
+            stop_all()
+            return False
+
+    print(f"🧪 Fake Ollama serving on {host}:{', '.join(str(port) for port in ports)}")
+    if not all(await asyncio.gather(*(run(server) for server in servers))):
+        raise SystemExit(1)
+
+def main():
+    parser = argparse.ArgumentParser(description="Ollama-compatible stand-in server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--ports", default="11434", help="e.g. 11434-11440 or 11434,11444")
+    parser.add_argument("--seed", type=int, default=None, help="Seed the failure and jitter draws")
+    for key, default in DEFAULT_SETTINGS.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=type(default), default=default)
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    settings = {key: getattr(args, key) for key in DEFAULT_SETTINGS}
+    asyncio.run(serve(parse_ports(args.ports), args.host, settings))
+
+if __name__ == "__main__":
+    main()
@@ -33,7 +33,7 @@ templates = Jinja2Templates(directory="templates")
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 # Include WebSocket routes
-app.include_router(websocket_routes.router, prefix="/api")
+app.include_router(websocket_routes, prefix="/api")
 
 # Include payment routes
 from routes import payments
@@ -63,14 +63,41 @@ app.include_router(girlfriend.router, tags=["girlfriend"])
 app.include_router(application.router, tags=["application"])
 app.include_router(aiblogster.router, tags=["aiblogster"])
 app.include_router(hello.router, tags=["hello"])
+app.include_router(admin.router, tags=["admin"])
 
 # Initialize database on startup
 @app.on_event("startup")
 async def startup_event():
     await init_db()
     # Start performance monitoring
-    from websockets.connection_manager import performance_monitor
+    from websockets.connection_manager import manager, performance_monitor
+    # Relay WebSocket broadcasts between workers
+    await manager.start_broker()
     asyncio.create_task(performance_monitor.start_monitoring())
+    # Start model backend health checks
+    from services.model_router import model_router
+    asyncio.create_task(model_router.start_health_checks())
+    # Preload the models enabled agents need and keep them resident
+    from services.model_warmup import model_warmup
+    asyncio.create_task(model_warmup.start())
+
+    # Start rebalancing resident local models within the memory budget
+    asyncio.create_task(model_router.start_residency_rebalancing())
+    # Start extra local model workers when queues run hot
+    from services.autoscaler import model_autoscaler
+    asyncio.create_task(model_autoscaler.start())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Release pooled model endpoint connections
+    from services.model_warmup import model_warmup
+    model_warmup.stop()
+    from services.autoscaler import model_autoscaler
+    await model_autoscaler.shutdown()
+    from services.model_router import model_router
+    await model_router.close()
+    from websockets.connection_manager import manager
+    await manager.close_broker()
 
 @app.get("/", response_class=HTMLResponse)
 def homepage(request: Request):
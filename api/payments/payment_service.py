@@ -56,7 +56,7 @@ class PaymentService:
                     provider="stripe",
                     transaction_id=intent.id,
                     status="pending",
-                    metadata={"stripe_intent_id": intent.id}
+                    payment_metadata={"stripe_intent_id": intent.id}
                 )
                 db.add(payment)
                 await db.commit()
@@ -161,7 +161,7 @@ class PaymentService:
                         provider="paypal",
                         transaction_id=payment.id,
                         status="pending",
-                        metadata={"paypal_payment_id": payment.id}
+                        payment_metadata={"paypal_payment_id": payment.id}
                     )
                     db.add(payment_record)
                     await db.commit()
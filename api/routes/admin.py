@@ -1,4 +1,10 @@
 from fastapi import APIRouter
+from services.agent_metrics import agent_metrics
+from services.autoscaler import model_autoscaler
+from services.embeddings import embedding_service
+from services.model_metrics import model_metrics
+from services.model_router import model_router
+from typing import Optional
 
 router = APIRouter()
 
@@ -25,3 +31,29 @@ def payments():
 @router.get("/admin/analytics")
 def analytics():
     return {"page": "Admin Analytics"}
+
+@router.get("/admin/models/health")
+def models_health():
+    return model_router.breaker_status()
+
+@router.get("/admin/models/metrics")
+def models_metrics():
+    metrics = model_metrics.snapshot()
+    metrics["singleflight"] = model_router.singleflight.stats()
+    metrics["response_cache"] = model_router.response_cache.stats()
+    metrics["admission"] = model_router.admission_status()
+    metrics["replicas"] = model_router.replica_status()
+    metrics["hedging"] = model_router.hedging.snapshot()
+    metrics["sessions"] = model_router.sessions.stats()
+    metrics["embeddings"] = embedding_service.stats()
+    metrics["token_budget"] = model_router.token_budget.stats()
+    metrics["selection"] = model_router.selector.snapshot()
+    metrics["autoscaling"] = model_autoscaler.snapshot()
+    metrics["residency"] = model_router.residency_status()
+    metrics["agent_metrics"] = agent_metrics.stats()
+    return metrics
+
+@router.get("/admin/models/decisions")
+def models_decisions(agent: Optional[str] = None, limit: int = 50):
+    decisions = [d for d in model_router.selector.decisions if agent is None or d["agent"] == agent]
+    return {"decisions": decisions[-limit:]}
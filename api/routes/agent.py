@@ -1,12 +1,13 @@
 from fastapi import APIRouter, Request
 from datetime import datetime
+from services.visitor_ids import issue_visitor_id
 import uuid
 
 router = APIRouter()
 
 @router.get("/agent/init_session")
 def init_session():
-    user_id = str(uuid.uuid4())
+    user_id = issue_visitor_id()
     session_id = str(uuid.uuid4())
     return {"user_id": user_id, "session_id": session_id}
 
@@ -1,5 +1,7 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, status
+from fastapi.responses import JSONResponse
 from datetime import datetime
+from services.model_warmup import model_warmup
 
 router = APIRouter()
 
@@ -19,8 +21,11 @@ def check_ai_apis():
     # Simulate AI API check
     return True
 
+def check_models_warm():
+    return model_warmup.is_ready()
+
 def ready_to_serve():
-    return check_database() and check_redis()
+    return check_database() and check_redis() and check_models_warm()
 
 @router.get("/health")
 def show():
@@ -42,8 +47,11 @@ def show():
 @router.get("/health/ready")
 def ready():
     ready = ready_to_serve()
-    status = "ready" if ready else "not ready"
-    return {
-        "status": status,
-        "timestamp": datetime.utcnow().isoformat()
-    }
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={
+            "status": "ready" if ready else "not ready",
+            "timestamp": datetime.utcnow().isoformat(),
+            "models": model_warmup.snapshot()
+        }
+    )
@@ -1,5 +1,9 @@
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Depends, Request
+from auth.keycloak_auth import get_current_user_optional
+from database import User
+from services.agent_chat import agent_chat, agent_chat_stream
 from datetime import datetime
+from typing import Optional
 
 router = APIRouter()
 
@@ -14,10 +18,16 @@ def index():
     return {"agent_stats": agent_stats}
 
 @router.post("/labx/chat")
-def chat(request: Request):
+async def chat(request: Request, user: Optional[User] = Depends(get_current_user_optional)):
+    result = await agent_chat(request, "labx", user)
     return {
         "success": True,
-        "message": "Simulated LabX response",
-        "processing_time": "1s",
+        "message": result["response"],
+        "model": result["model"],
+        "processing_time": result["processing_time"],
         "timestamp": datetime.utcnow().strftime('%H:%M:%S')
     }
+
+@router.post("/labx/chat/stream")
+async def chat_stream(request: Request, user: Optional[User] = Depends(get_current_user_optional)):
+    return await agent_chat_stream(request, "labx", user)
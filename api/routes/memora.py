@@ -1,25 +1,48 @@
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Depends, Request
+from auth.keycloak_auth import get_current_user_optional
+from database import User
+from services.agent_chat import agent_chat, agent_chat_stream, read_chat_payload
+from services.deadline import Deadline
+from services.memora import memora_memory
+from services.model_router import model_router
+from typing import Optional
 
 router = APIRouter()
 
 @router.post("/memora/chat")
-def chat(request: Request):
-    # Simulate Memora chat response
+async def chat(request: Request, user: Optional[User] = Depends(get_current_user_optional)):
+    # Recall runs before the model, so it spends from the same budget
+    deadline = Deadline(model_router.request_timeout)
+    payload = await read_chat_payload(request)
+    owner = memora_memory.owner(user, payload)
+    memories = await memora_memory.recall_and_remember(owner, payload["message"])
+    result = await agent_chat(request, "memora", user, memora_memory.build_prompt(payload["message"], memories), deadline)
     return {
-        "response": "Simulated Memora response",
+        "response": result["response"],
         "agent": {
             "name": "MemoraAgent",
             "emoji": "🧠",
             "tagline": "Memory management AI",
             "last_active": "1m ago"
         },
-        "memory_analysis": {},
-        "knowledge_insights": {},
+        "memory_analysis": await memora_memory.analysis(owner, memories),
+        "knowledge_insights": {
+            "best_match_score": round(memories[0]["score"], 3) if memories else None,
+            "memories_recalled": len(memories)
+        },
         "storage_recommendations": {},
         "cognitive_guidance": {},
-        "processing_time": "1s"
+        "model": result["model"],
+        "processing_time": result["processing_time"]
     }
 
+@router.post("/memora/chat/stream")
+async def chat_stream(request: Request, user: Optional[User] = Depends(get_current_user_optional)):
+    deadline = Deadline(model_router.request_timeout)
+    payload = await read_chat_payload(request)
+    memories = await memora_memory.recall_and_remember(memora_memory.owner(user, payload), payload["message"])
+    return await agent_chat_stream(request, "memora", user, memora_memory.build_prompt(payload["message"], memories), deadline)
+
 @router.post("/memora/voice_input")
 def voice_input(request: Request):
     # Simulate voice input processing
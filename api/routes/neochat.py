@@ -1,4 +1,8 @@
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Depends, Request
+from auth.keycloak_auth import get_current_user_optional
+from database import User
+from services.agent_chat import agent_chat, agent_chat_stream
+from typing import Optional
 
 router = APIRouter()
 
@@ -13,9 +17,15 @@ def index():
     return {"agent_stats": agent_stats}
 
 @router.post("/neochat/chat")
-def chat(request: Request):
-    # Simulate chat response
+async def chat(request: Request, user: Optional[User] = Depends(get_current_user_optional)):
+    result = await agent_chat(request, "neochat", user)
     return {
         "success": True,
-        "message": "Simulated NeoChat response"
+        "message": result["response"],
+        "model": result["model"],
+        "processing_time": result["processing_time"]
     }
+
+@router.post("/neochat/chat/stream")
+async def chat_stream(request: Request, user: Optional[User] = Depends(get_current_user_optional)):
+    return await agent_chat_stream(request, "neochat", user)
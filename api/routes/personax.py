@@ -1,5 +1,9 @@
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Depends, Request
+from auth.keycloak_auth import get_current_user_optional
+from database import User
+from services.agent_chat import agent_chat, agent_chat_stream
 from datetime import datetime
+from typing import Optional
 
 router = APIRouter()
 
@@ -15,15 +19,20 @@ def index():
     return {"agent_stats": agent_stats}
 
 @router.post("/personax/chat")
-def chat(request: Request):
-    # Simulate chat response
+async def chat(request: Request, user: Optional[User] = Depends(get_current_user_optional)):
+    result = await agent_chat(request, "personax", user)
     return {
         "success": True,
-        "response": "Simulated PersonaX response",
-        "processing_time": "1s",
+        "response": result["response"],
+        "model": result["model"],
+        "processing_time": result["processing_time"],
         "agent_name": "PersonaXAgent",
         "timestamp": datetime.utcnow().strftime('%H:%M:%S'),
         "personality_insights": {},
         "behavioral_patterns": {},
         "communication_style": {}
     }
+
+@router.post("/personax/chat/stream")
+async def chat_stream(request: Request, user: Optional[User] = Depends(get_current_user_optional)):
+    return await agent_chat_stream(request, "personax", user)
@@ -1,4 +1,8 @@
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Depends, Request
+from auth.keycloak_auth import get_current_user_optional
+from database import User
+from services.agent_chat import agent_chat, agent_chat_stream
+from typing import Optional
 
 router = APIRouter()
 
@@ -14,10 +18,15 @@ def index():
     return {"agent_stats": agent_stats}
 
 @router.post("/reportly/chat")
-def chat(request: Request):
-    # Simulate chat response
+async def chat(request: Request, user: Optional[User] = Depends(get_current_user_optional)):
+    result = await agent_chat(request, "reportly", user)
     return {
         "success": True,
-        "message": "Simulated response",
-        "processing_time": "1s"
+        "message": result["response"],
+        "model": result["model"],
+        "processing_time": result["processing_time"]
     }
+
+@router.post("/reportly/chat/stream")
+async def chat_stream(request: Request, user: Optional[User] = Depends(get_current_user_optional)):
+    return await agent_chat_stream(request, "reportly", user)
@@ -0,0 +1,113 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional
+
+class ModelOverloaded(Exception):
+    """Raised when a model cannot admit a request; carries a Retry-After hint in seconds"""
+
+    def __init__(self, model: str, reason: str, retry_after: int):
+        super().__init__(f"{model} {reason}")
+        self.model = model
+        self.reason = reason
+        self.retry_after = retry_after
+
+class ModelAdmission:
+    """Concurrency limiter for one model with bounded premium and standard wait lanes"""
+
+    def __init__(self, name: str, max_concurrent: int = 5, max_queued: int = 20, queue_timeout: float = 15):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.premium_lane: deque = deque()
+        self.standard_lane: deque = deque()
+        self.service_time = 1.0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    @property
+    def queued(self) -> int:
+        return len(self.premium_lane) + len(self.standard_lane)
+
+    def retry_after(self) -> int:
+        """Rough wait estimate from queue depth and the EWMA of slot hold time"""
+        return max(1, math.ceil(self.service_time * (self.queued + 1) / self.max_concurrent))
+
+    async def acquire(self, premium: bool = False, timeout: Optional[float] = None):
+        """Take a slot, waiting at most queue_timeout (or the shorter timeout given)"""
+        if self.active < self.max_concurrent and not self.queued:
+            self.active += 1
+            self.admitted += 1
+            return
+
+        lane = self.premium_lane if premium else self.standard_lane
+        if len(lane) >= self.max_queued:
+            self.rejected += 1
+            raise ModelOverloaded(self.name, "queue is full", self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        lane.append(waiter)
+        try:
+            # asyncio.timeout, unlike wait_for, never swallows a cancel that lands as the slot is handed over
+            async with asyncio.timeout(self.queue_timeout if timeout is None else min(timeout, self.queue_timeout)):
+                await waiter
+        except asyncio.TimeoutError:
+            # The timeout can fire in the same loop pass that hands us a slot
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            self.timed_out += 1
+            raise ModelOverloaded(self.name, "queue wait timed out", self.retry_after())
+        except asyncio.CancelledError:
+            # A slot may have been handed over just as we were cancelled
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in lane:
+                lane.remove(waiter)
+        self.admitted += 1
+
+    def release(self):
+        self.active -= 1
+        self._hand_off()
+
+    def _hand_off(self):
+        # Hand free slots straight to the next waiters, premium lane first
+        for lane in (self.premium_lane, self.standard_lane):
+            while lane and self.active < self.max_concurrent:
+                waiter = lane.popleft()
+                if not waiter.done():
+                    self.active += 1
+                    waiter.set_result(True)
+
+    def resize(self, max_concurrent: int):
+        """Change the slot count; new slots go to waiters now, removed ones are reclaimed as requests finish"""
+        self.max_concurrent = max(1, max_concurrent)
+        self._hand_off()
+
+    @asynccontextmanager
+    async def slot(self, premium: bool = False, timeout: Optional[float] = None):
+        await self.acquire(premium, timeout)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.service_time = 0.8 * self.service_time + 0.2 * (time.perf_counter() - start)
+            self.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "max_concurrent": self.max_concurrent,
+            "queued_premium": len(self.premium_lane),
+            "queued_standard": len(self.standard_lane),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_service_time": round(self.service_time, 3)
+        }
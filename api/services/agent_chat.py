@@ -0,0 +1,192 @@
+import asyncio
+import json
+import time
+from fastapi import HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from typing import Dict, Any, Optional, Awaitable
+from database import User
+from services.deadline import Deadline
+from services.agent_metrics import agent_metrics
+from services.interactions import interaction_recorder
+from services.model_metrics import model_metrics
+from services.model_router import model_router
+from services.session_context import SessionContext
+
+async def read_chat_payload(request: Request) -> Dict[str, Any]:
+    """Parse and validate the JSON body sent by the agent chat pages"""
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Request body must be valid JSON"
+        )
+
+    if not isinstance(payload, dict):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Request body must be a JSON object"
+        )
+
+    message = str(payload.get("message") or payload.get("query") or "").strip()
+    if not message:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Message is required"
+        )
+
+    payload["message"] = message
+    payload["options"] = chat_options(payload)
+    return payload
+
+def chat_options(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Model options sent with a chat, which must be a JSON object when present"""
+    options = payload.get("options")
+    if options is not None and not isinstance(options, dict):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="options must be a JSON object"
+        )
+    return options
+
+def is_premium(user: Optional[User]) -> bool:
+    return bool(user and user.is_premium)
+
+def session_id_of(payload: Dict[str, Any]) -> Optional[str]:
+    """Session id handed out by /agent/init_session, sent top-level or inside the page's context"""
+    context = payload.get("context")
+    session_id = payload.get("session_id") or (context.get("session_id") if isinstance(context, dict) else None)
+    return str(session_id) if session_id else None
+
+def chat_session(payload: Dict[str, Any], agent_name: str) -> Optional[SessionContext]:
+    """Conversation context for the client's session, if it sent one"""
+    session_id = session_id_of(payload)
+    if not session_id or not model_router.sessions_enabled:
+        return None
+    return model_router.sessions.get(session_id, agent_name)
+
+# Status nginx logs when the client closes the connection before the answer
+CLIENT_CLOSED_REQUEST = 499
+
+async def wait_for_disconnect(request: Request):
+    """Return once the client has gone away; only call after the body has been read"""
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+async def until_disconnected(request: Request, agent_name: str, work: Awaitable[Any]) -> Any:
+    """Await work unless the client disconnects first, in which case it is cancelled and 499 raised
+
+    Cancelling the router call closes the upstream model request and releases its
+    admission slot, so an abandoned answer stops costing model time right away.
+    """
+    start = time.perf_counter()
+    work = asyncio.ensure_future(work)
+    disconnected = asyncio.ensure_future(wait_for_disconnect(request))
+    try:
+        await asyncio.wait({work, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in (work, disconnected):
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(disconnected, return_exceptions=True)
+
+    if not work.cancelled() and work.done():
+        return work.result()
+    await asyncio.gather(work, return_exceptions=True)
+    model_metrics.record_cancelled(agent_name, "http", time.perf_counter() - start)
+    raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Client closed request")
+
+async def agent_chat(request: Request, agent_name: str, user: Optional[User] = None, prompt: Optional[str] = None,
+                     deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+    """Run a chat turn for an agent through the model router; prompt replaces the raw message when given
+
+    Routes that do their own work before the model call pass the deadline they started
+    with, so that work counts against the request's time budget.
+    """
+    deadline = deadline or Deadline(model_router.request_timeout)
+    payload = await read_chat_payload(request)
+
+    start = time.perf_counter()
+    with agent_metrics.turn(agent_name):
+        result = await until_disconnected(request, agent_name, model_router.generate(
+            agent_name, prompt or payload["message"], payload.get("options"),
+            premium=is_premium(user), session=chat_session(payload, agent_name), deadline=deadline
+        ))
+    elapsed = time.perf_counter() - start
+    model_metrics.record_turn(agent_name, elapsed)
+    interaction_recorder.record(
+        agent_name, user, payload["message"], result["response"], elapsed, result.get("tokens_used", 0), session_id_of(payload),
+        deadline
+    )
+
+    return {
+        "response": result["response"],
+        "model": result["model"],
+        "tokens_used": result.get("tokens_used", 0),
+        "processing_time": f"{elapsed:.2f}s"
+    }
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """Encode a router stream event as a Server-Sent Events frame"""
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+async def agent_chat_stream(request: Request, agent_name: str, user: Optional[User] = None,
+                            prompt: Optional[str] = None, deadline: Optional[Deadline] = None) -> StreamingResponse:
+    """Stream a chat turn for an agent as Server-Sent Events; deadline works as for agent_chat"""
+    deadline = deadline or Deadline(model_router.request_timeout)
+    payload = await read_chat_payload(request)
+    start = time.perf_counter()
+    events = model_router.stream(
+        agent_name, prompt or payload["message"], payload.get("options"),
+        premium=is_premium(user), session=chat_session(payload, agent_name), deadline=deadline
+    )
+
+    turn = agent_metrics.turn(agent_name)
+
+    # Wait for a model to start producing tokens so routing failures still return a proper status code
+    try:
+        first = await until_disconnected(request, agent_name, events.__anext__())
+    except HTTPException as e:
+        turn.abort(e)
+        await events.aclose()
+        raise
+
+    async def event_source():
+        tokens = []
+        with turn:
+            try:
+                yield format_sse(first)
+                async for event in events:
+                    if event["type"] == "token":
+                        tokens.append(event["content"])
+                    elif event["type"] == "error":
+                        turn.finish(False)
+                    elif event["type"] == "done":
+                        elapsed = time.perf_counter() - start
+                        model_metrics.record_turn(agent_name, elapsed)
+                        interaction_recorder.record(
+                            agent_name, user, payload["message"], "".join(tokens),
+                            elapsed, event.get("tokens_used", 0), session_id_of(payload), deadline
+                        )
+                    yield format_sse(event)
+            except (asyncio.CancelledError, GeneratorExit):
+                # The response stops iterating when the client disconnects; closing events cancels the model
+                model_metrics.record_cancelled(agent_name, "sse", time.perf_counter() - start, len(tokens))
+                raise
+            finally:
+                await events.aclose()
+
+    async def settle():
+        # Runs after the response even if the client left before event_source was ever iterated
+        turn.finish(None)
+        await events.aclose()
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(settle)
+    )
@@ -0,0 +1,231 @@
+import asyncio
+import logging
+import os
+import time
+from array import array
+from datetime import datetime
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from typing import Any, Dict, List, Optional
+from database import AsyncSessionLocal, Agent, AgentPerformance
+from services.model_config import load_model_config
+
+logger = logging.getLogger(__name__)
+
+class AgentSamples:
+    """Fixed-size ring of one agent's finished turns: when each ended, how long it took, whether it worked
+
+    Turns are recorded and read only on the event loop, so writes need no lock and
+    never allocate; the oldest turn is overwritten once the ring is full.
+    """
+
+    __slots__ = ("size", "finished_at", "latency", "ok", "cursor", "count", "in_flight")
+
+    def __init__(self, size: int):
+        self.size = size
+        self.finished_at = array("d", bytes(8 * size))
+        self.latency = array("d", bytes(8 * size))
+        self.ok = array("b", bytes(size))
+        self.cursor = 0
+        self.count = 0
+        self.in_flight = 0
+
+    def record(self, finished_at: float, seconds: float, ok: bool):
+        index = self.cursor
+        self.finished_at[index] = finished_at
+        self.latency[index] = seconds
+        self.ok[index] = ok
+        self.cursor = (index + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+
+    def last_finished(self) -> Optional[float]:
+        return self.finished_at[self.cursor - 1] if self.count else None
+
+    def window(self, since: float) -> Dict[str, Any]:
+        """Turn count, busy seconds and successes for turns that ended after since"""
+        turns = busy = succeeded = 0
+        # Walk back from the newest turn until one ended before the window
+        index = self.cursor
+        for _ in range(self.count):
+            index = (index - 1) % self.size
+            if self.finished_at[index] < since:
+                break
+            turns += 1
+            busy += self.latency[index]
+            succeeded += self.ok[index]
+        return {"turns": turns, "busy": busy, "succeeded": succeeded}
+
+class Turn:
+    """One chat turn being measured; ends as a success, a failure, or abandoned and left uncounted"""
+
+    def __init__(self, samples: AgentSamples):
+        self.samples = samples
+        self.start = time.perf_counter()
+        self.finished = False
+        samples.in_flight += 1
+
+    def finish(self, ok: Optional[bool] = True):
+        """Record the turn once; ok=None drops it, as when the client went away"""
+        if self.finished:
+            return
+        self.finished = True
+        self.samples.in_flight -= 1
+        if ok is not None:
+            self.samples.record(time.time(), time.perf_counter() - self.start, ok)
+
+    def abort(self, error: BaseException):
+        """Cancellations and client errors say nothing about the agent; anything else is a failure"""
+        if isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+            self.finish(None)
+        elif isinstance(error, HTTPException) and error.status_code < 500:
+            self.finish(None)
+        else:
+            self.finish(False)
+
+    def __enter__(self) -> "Turn":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is None:
+            self.finish()
+        else:
+            self.abort(exc)
+        return False
+
+class AgentMetrics:
+    """Real per-agent load for the performance monitor, per monitoring.agent_metrics
+
+    Chat turns over HTTP, SSE and WebSockets land in per-agent rings; the monitor
+    turns the last window seconds of them into the dashboard stats. CPU is this
+    process's CPU time since the previous snapshot, split between agents by the time
+    their turns kept it busy; memory is the process's resident share of host memory.
+    Snapshots of agents with traffic are written to agent_performance every
+    persist_interval seconds, one transaction per batch.
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        settings = (config or {}).get("monitoring", {}).get("agent_metrics", {})
+        self.window = settings.get("window", 60)
+        self.ring_size = settings.get("samples", 1024)
+        self.persist_interval = settings.get("persist_interval", 60)
+        self.agents: Dict[str, AgentSamples] = {}
+        self._agent_ids: Dict[str, Optional[int]] = {}
+        self._cpu_mark = (time.monotonic(), time.process_time())
+        self._last_persist = time.monotonic()
+        self._persisting: Optional[asyncio.Task] = None
+        self.persisted_rows = 0
+        self.persist_failures = 0
+
+    def samples(self, agent_name: str) -> AgentSamples:
+        samples = self.agents.get(agent_name)
+        if samples is None:
+            samples = self.agents[agent_name] = AgentSamples(self.ring_size)
+        return samples
+
+    def turn(self, agent_name: str) -> Turn:
+        """Start timing a chat turn; use as a context manager or finish it explicitly"""
+        return Turn(self.samples(agent_name))
+
+    def process_cpu(self) -> float:
+        """Percent of the host's CPUs this process used since the last call"""
+        wall, cpu = time.monotonic(), time.process_time()
+        last_wall, last_cpu = self._cpu_mark
+        self._cpu_mark = (wall, cpu)
+        if wall <= last_wall:
+            return 0.0
+        return min(100.0, (cpu - last_cpu) / (wall - last_wall) / (os.cpu_count() or 1) * 100)
+
+    @staticmethod
+    def process_memory() -> Optional[float]:
+        """Resident memory as a percent of host memory, where /proc is available"""
+        try:
+            with open("/proc/self/statm") as statm:
+                resident_pages = int(statm.read().split()[1])
+            return resident_pages / os.sysconf("SC_PHYS_PAGES") * 100
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def snapshot(self, agent_names: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Rolling-window stats for the given agents plus any that have served turns"""
+        now = time.time()
+        since = now - self.window
+        cpu = self.process_cpu()
+        memory = self.process_memory()
+        windows = {name: samples.window(since) for name, samples in self.agents.items()}
+        busy_total = sum(window["busy"] for window in windows.values())
+
+        stats = {}
+        for name in dict.fromkeys(list(agent_names) + list(self.agents)):
+            samples = self.agents.get(name)
+            window = windows.get(name, {"turns": 0, "busy": 0.0, "succeeded": 0})
+            turns = window["turns"]
+            in_flight = samples.in_flight if samples else 0
+            last_finished = samples.last_finished() if samples else None
+            stats[name] = {
+                "cpu_usage": cpu * window["busy"] / busy_total if busy_total else 0.0,
+                "memory_usage": memory,
+                "response_time": window["busy"] / turns * 1000 if turns else None,
+                "requests_per_minute": round(turns * 60 / self.window),
+                "success_rate": window["succeeded"] / turns * 100 if turns else None,
+                "in_flight": in_flight,
+                "status": "busy" if in_flight else "active" if turns else "idle",
+                "last_activity": datetime.fromtimestamp(last_finished).isoformat() if last_finished else None
+            }
+        return stats
+
+    def maybe_persist(self, stats: Dict[str, Dict[str, Any]]):
+        """Write a batch in the background once persist_interval has passed; the caller never waits"""
+        if time.monotonic() - self._last_persist < self.persist_interval:
+            return
+        if self._persisting is not None and not self._persisting.done():
+            return
+        self._last_persist = time.monotonic()
+        active = {name: agent for name, agent in stats.items() if agent["status"] != "idle"}
+        if active:
+            self._persisting = asyncio.create_task(self.persist(active))
+
+    async def _agent_ids_for(self, db, agent_names: List[str]) -> Dict[str, Optional[int]]:
+        missing = [name for name in agent_names if name not in self._agent_ids]
+        if missing:
+            rows = await db.execute(select(Agent.name, Agent.id).where(Agent.name.in_(missing)))
+            found = dict(rows.all())
+            for name in missing:
+                self._agent_ids[name] = found.get(name)
+        return {name: self._agent_ids[name] for name in agent_names}
+
+    async def persist(self, stats: Dict[str, Dict[str, Any]]):
+        """Insert one AgentPerformance row per agent in a single transaction"""
+        try:
+            async with AsyncSessionLocal() as db:
+                agent_ids = await self._agent_ids_for(db, list(stats))
+                db.add_all([
+                    AgentPerformance(
+                        agent_id=agent_ids[name],
+                        cpu_usage=agent["cpu_usage"],
+                        memory_usage=agent["memory_usage"],
+                        response_time=agent["response_time"],
+                        requests_per_minute=agent["requests_per_minute"],
+                        success_rate=agent["success_rate"],
+                        active_connections=agent.get("active_connections", 0),
+                        status=agent["status"]
+                    )
+                    for name, agent in stats.items()
+                ])
+                await db.commit()
+            self.persisted_rows += len(stats)
+        except (SQLAlchemyError, OSError) as e:
+            self.persist_failures += 1
+            logger.warning(f"Failed to persist performance for {len(stats)} agents: {e!r}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "agents": len(self.agents),
+            "window": self.window,
+            "persisted_rows": self.persisted_rows,
+            "persist_failures": self.persist_failures
+        }
+
+# Global agent metrics
+agent_metrics = AgentMetrics(load_model_config())
@@ -0,0 +1,352 @@
+import asyncio
+import httpx
+import json
+import logging
+import os
+import socket
+import tempfile
+import time
+from typing import Dict, Any, List, Optional
+from services.model_router import ModelRouter, model_router
+
+try:
+    import fcntl
+except ImportError:  # No flock on Windows; each process then scales on its own
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+class ModelWorker:
+    """One extra model server process started by the autoscaler"""
+
+    def __init__(self, model_key: str, port: int, endpoint: str, process: asyncio.subprocess.Process):
+        self.model_key = model_key
+        self.port = port
+        self.endpoint = endpoint
+        self.process = process
+        self.started_at = time.time()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "endpoint": self.endpoint,
+            "pid": self.process.pid,
+            "running": self.process.returncode is None,
+            "started_at": self.started_at
+        }
+
+class ModelAutoscaler:
+    """Starts and stops extra worker processes for busy local models, per resource_management.auto_scaling
+
+    A model's utilization is its admission load (requests running and queued over its
+    slots) as a percentage. Above scale_up_threshold a worker is started on a free port,
+    loaded, and added to the model's replica pool, as long as the host CPU has headroom
+    and the model is below max_instances. Below scale_down_threshold the newest worker
+    leaves the pool, drains its in-flight requests and is terminated. Every configured
+    endpoint counts as an instance; only workers started here are ever stopped.
+
+    With residency enabled a worker is only started if another copy of the model fits
+    the memory budget, and its footprint stays reserved there until it stops. Of the
+    app's processes on a host only the holder of lock_file starts and stops workers; it
+    publishes them next to the lock, and the others route to and reserve memory for
+    those endpoints without scaling themselves.
+    """
+
+    def __init__(self, router: ModelRouter):
+        resources = router.config.get("resource_management", {})
+        scaling = resources.get("auto_scaling", {})
+        ollama = router.config.get("deployment", {}).get("ollama", {})
+        self.router = router
+        self.enabled = scaling.get("enabled", False)
+        self.min_instances = scaling.get("min_instances", 1)
+        self.max_instances = scaling.get("max_instances", 2)
+        self.scale_up_threshold = scaling.get("scale_up_threshold", 70)
+        self.scale_down_threshold = scaling.get("scale_down_threshold", 30)
+        self.cooldown_period = scaling.get("cooldown_period", 180)
+        self.check_interval = scaling.get("check_interval", 15)
+        self.cpu_ceiling = scaling.get("cpu_ceiling", 90)
+        self.worker_command: List[str] = scaling.get("worker_command", ["ollama", "serve"])
+        self.host = ollama.get("host", "localhost")
+        self.port_range_start = scaling.get("port_range_start", ollama.get("base_port", 11434) + 100)
+        self.port_range_size = scaling.get("port_range_size", 100)
+        self.lock_path = scaling.get("lock_file", os.path.join(tempfile.gettempdir(), "model-autoscaler.lock"))
+        self.state_path = f"{self.lock_path}.json"
+        self.startup_timeout = resources.get("model_warmup_time", 30)
+        self.drain_timeout = resources.get("request_timeout", 60)
+        self.keep_alive = resources.get("keep_alive", "10m")
+        self.workers: Dict[str, List[ModelWorker]] = {model_key: [] for model_key in router.local_models}
+        # Workers another process started, as followed from its published state
+        self.followed: Dict[str, List[str]] = {model_key: [] for model_key in router.local_models}
+        self.is_leader = False
+        self._lock = None
+        self.last_scaled: Dict[str, float] = {}
+        self.last_utilization: Dict[str, float] = {}
+        self.scale_ups = 0
+        self.scale_downs = 0
+        self.failed_starts = 0
+        self.is_running = False
+
+    def utilization(self, model_key: str) -> float:
+        """Requests running and queued as a percentage of the model's admission slots"""
+        return self.router.queue_load(model_key) * 100
+
+    def cpu_percent(self) -> float:
+        """Host CPU use from the 1-minute load average"""
+        try:
+            return os.getloadavg()[0] / (os.cpu_count() or 1) * 100
+        except OSError:
+            return 0.0
+
+    def instances(self, model_key: str) -> int:
+        return len(self.router.replicas[model_key])
+
+    def in_cooldown(self, model_key: str) -> bool:
+        return time.monotonic() - self.last_scaled.get(model_key, float("-inf")) < self.cooldown_period
+
+    def free_port(self) -> Optional[int]:
+        """Lowest port in the worker range that no worker holds and no local socket uses; blocks, so run it in a thread"""
+        taken = {worker.port for workers in self.workers.values() for worker in workers}
+        for port in range(self.port_range_start, self.port_range_start + self.port_range_size):
+            if port in taken:
+                continue
+            # Binding, unlike connecting, also sees the port held by an outgoing connection's local end
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+                try:
+                    probe.bind(("127.0.0.1", port))
+                except OSError:
+                    continue
+                return port
+        return None
+
+    def acquire_leadership(self) -> bool:
+        """Take the host-wide lock without waiting; it is held until shutdown or the process exits"""
+        if self.is_leader:
+            return True
+        try:
+            lock = open(self.lock_path, "a")
+        except OSError as e:
+            logger.warning(f"Cannot open autoscaler lock {self.lock_path}: {e!r}")
+            return False
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock.close()
+                return False
+        self._lock = lock
+        self.is_leader = True
+        return True
+
+    def release_leadership(self):
+        if self._lock is not None:
+            self._lock.close()
+            self._lock = None
+        self.is_leader = False
+
+    def _write_state(self, state: Dict[str, List[str]]):
+        partial = f"{self.state_path}.{os.getpid()}"
+        with open(partial, "w") as f:
+            json.dump(state, f)
+        os.replace(partial, self.state_path)
+
+    def _read_state(self) -> Dict[str, List[str]]:
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    async def publish(self):
+        """Tell the other processes which workers this leader is running"""
+        state = {model_key: [worker.endpoint for worker in workers] for model_key, workers in self.workers.items()}
+        try:
+            await asyncio.to_thread(self._write_state, state)
+        except OSError as e:
+            logger.warning(f"Failed to publish autoscaled workers: {e!r}")
+
+    async def follow(self):
+        """Route to the workers the leader published, and stop routing to ones it stopped"""
+        try:
+            state = await asyncio.to_thread(self._read_state)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to read autoscaled workers: {e!r}")
+            return
+        for model_key, followed in self.followed.items():
+            endpoints = state.get(model_key, [])
+            for endpoint in [endpoint for endpoint in followed if endpoint not in endpoints]:
+                self.unfollow(model_key, endpoint)
+            for endpoint in [endpoint for endpoint in endpoints if endpoint not in followed]:
+                followed.append(endpoint)
+                self.router.add_replica(model_key, endpoint)
+                self.router.residency.reserve(endpoint, model_key)
+
+    def unfollow(self, model_key: str, endpoint: str):
+        self.followed[model_key].remove(endpoint)
+        self.router.remove_replica(model_key, endpoint)
+        self.router.residency.release(endpoint)
+
+    async def evaluate(self, model_key: str):
+        """Scale one model up or down by a single worker if its utilization calls for it"""
+        utilization = self.last_utilization[model_key] = self.utilization(model_key)
+        instances = self.instances(model_key)
+        if instances < self.min_instances:
+            await self.scale_up(model_key)
+            return
+        if self.in_cooldown(model_key):
+            return
+        if utilization >= self.scale_up_threshold and instances < self.max_instances:
+            cpu = self.cpu_percent()
+            # Another server on a saturated host only splits the same cores
+            if cpu >= self.cpu_ceiling:
+                logger.info(f"Not scaling up {model_key} at {utilization:.0f}% utilization: host CPU at {cpu:.0f}%")
+                return
+            await self.scale_up(model_key)
+        elif utilization <= self.scale_down_threshold and self.workers[model_key] and instances > self.min_instances:
+            await self.scale_down(model_key)
+
+    async def scale_up(self, model_key: str) -> Optional[ModelWorker]:
+        """Start a worker on a free port, load the model on it and add it to the replica pool"""
+        self.last_scaled[model_key] = time.monotonic()
+        if self.router.residency_enabled and not self.router.residency.admits(model_key):
+            logger.info(f"Not scaling up {model_key}: another copy does not fit the model memory budget")
+            return None
+        port = await asyncio.to_thread(self.free_port)
+        if port is None:
+            self.failed_starts += 1
+            logger.warning(f"Not scaling up {model_key}: no free port from {self.port_range_start} "
+                           f"in {self.port_range_size}")
+            return None
+        endpoint = f"http://{self.host}:{port}"
+        command = [part.format(host=self.host, port=port) for part in self.worker_command]
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *command,
+                env=dict(os.environ, OLLAMA_HOST=f"{self.host}:{port}"),
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL
+            )
+        except OSError as e:
+            self.failed_starts += 1
+            logger.warning(f"Could not start a worker for {model_key}: {e!r}")
+            return None
+
+        worker = ModelWorker(model_key, port, endpoint, process)
+        self.router.residency.reserve(endpoint, model_key)
+        try:
+            await self.wait_ready(worker)
+            await self.router.load_model(model_key, self.keep_alive, self.startup_timeout, endpoints=[endpoint])
+        except (httpx.HTTPError, asyncio.TimeoutError) as e:
+            self.failed_starts += 1
+            logger.warning(f"Worker for {model_key} on port {port} did not come up: {e!r}")
+            await self.terminate(worker)
+            return None
+
+        self.workers[model_key].append(worker)
+        self.router.add_replica(model_key, endpoint)
+        await self.publish()
+        self.scale_ups += 1
+        logger.info(f"Scaled {model_key} up to {self.instances(model_key)} instances with a worker on port {port}")
+        return worker
+
+    async def wait_ready(self, worker: ModelWorker):
+        """Poll the worker's /api/version until it answers, it exits, or startup_timeout passes"""
+        deadline = time.monotonic() + self.startup_timeout
+        client = self.router.get_client(worker.endpoint)
+        while True:
+            if worker.process.returncode is not None:
+                raise httpx.ConnectError(f"worker exited with code {worker.process.returncode}")
+            try:
+                response = await client.get("/api/version", timeout=1.0)
+                response.raise_for_status()
+                return
+            except httpx.HTTPError:
+                if time.monotonic() >= deadline:
+                    raise asyncio.TimeoutError(f"no answer within {self.startup_timeout}s")
+                await asyncio.sleep(0.25)
+
+    async def scale_down(self, model_key: str):
+        """Take the newest worker out of the pool, let its requests finish, then stop it"""
+        self.last_scaled[model_key] = time.monotonic()
+        worker = self.workers[model_key].pop()
+        replica = self.router.remove_replica(model_key, worker.endpoint)
+        await self.publish()
+        deadline = time.monotonic() + self.drain_timeout
+        # Followers stop sending it new requests by their next check
+        await asyncio.sleep(min(self.check_interval, self.drain_timeout))
+        while replica is not None and replica.outstanding and time.monotonic() < deadline:
+            await asyncio.sleep(0.5)
+        await self.terminate(worker)
+        self.scale_downs += 1
+        logger.info(f"Scaled {model_key} down to {self.instances(model_key)} instances, stopped port {worker.port}")
+
+    async def terminate(self, worker: ModelWorker):
+        self.router.residency.release(worker.endpoint)
+        await self.router.close_client(worker.endpoint)
+        if worker.process.returncode is not None:
+            return
+        worker.process.terminate()
+        try:
+            await asyncio.wait_for(worker.process.wait(), timeout=10)
+        except asyncio.TimeoutError:
+            worker.process.kill()
+            await worker.process.wait()
+
+    async def start(self):
+        """Evaluate every local model each check_interval while leading, follow the leader otherwise"""
+        self.is_running = self.enabled
+        while self.is_running:
+            if not self.is_leader and self.acquire_leadership():
+                await self.take_over()
+            if self.is_leader:
+                for model_key in self.router.local_models:
+                    try:
+                        await self.evaluate(model_key)
+                    except Exception as e:
+                        logger.error(f"Autoscaling {model_key} failed: {e!r}")
+            else:
+                await self.follow()
+            await asyncio.sleep(self.check_interval)
+
+    async def take_over(self):
+        """Start leading: workers a previous leader left behind are no longer routed to"""
+        for model_key, followed in self.followed.items():
+            for endpoint in list(followed):
+                logger.warning(f"Dropping {model_key} worker {endpoint} left by the previous autoscaler leader")
+                self.unfollow(model_key, endpoint)
+        await self.publish()
+        logger.info(f"Autoscaler leading from process {os.getpid()}")
+
+    async def shutdown(self):
+        """Stop evaluating and terminate every worker this process started"""
+        self.is_running = False
+        for model_key, workers in self.workers.items():
+            for worker in workers:
+                self.router.remove_replica(model_key, worker.endpoint)
+                await self.terminate(worker)
+            workers.clear()
+        if self.is_leader:
+            await self.publish()
+            self.release_leadership()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "leader": self.is_leader,
+            "min_instances": self.min_instances,
+            "max_instances": self.max_instances,
+            "scale_ups": self.scale_ups,
+            "scale_downs": self.scale_downs,
+            "failed_starts": self.failed_starts,
+            "cpu_percent": round(self.cpu_percent(), 1),
+            "models": {
+                model_key: {
+                    "instances": self.instances(model_key),
+                    "utilization": round(self.last_utilization.get(model_key, 0.0), 1),
+                    "workers": [worker.snapshot() for worker in workers],
+                    "followed": self.followed[model_key]
+                }
+                for model_key, workers in self.workers.items()
+            }
+        }
+
+# Global autoscaler
+model_autoscaler = ModelAutoscaler(model_router)
@@ -0,0 +1,72 @@
+import time
+from typing import Dict, Any, Optional
+
+class CircuitBreaker:
+    """Per-backend breaker: closed -> open after repeated failures -> half_open trial -> closed"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, threshold: int = 5, reset_timeout: float = 300):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.last_failure: Optional[str] = None
+        self.last_checked: Optional[str] = None
+        self._trial_in_flight = False
+
+    def allow_request(self) -> bool:
+        """Return True if a request may be sent to this backend now"""
+        if self.state == self.CLOSED:
+            return True
+
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self._trial_in_flight = False
+
+        # Half open: let a single trial request through
+        if self._trial_in_flight:
+            return False
+        self._trial_in_flight = True
+        return True
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self, reason: str = ""):
+        self.consecutive_failures += 1
+        self.last_failure = reason
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.threshold:
+            self.trip(reason)
+
+    def release_trial(self):
+        """Free the half-open trial slot when a request ends without an outcome"""
+        self._trial_in_flight = False
+
+    def trip(self, reason: str = ""):
+        """Open the breaker immediately"""
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.last_failure = reason or self.last_failure
+        self._trial_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        retry_in = None
+        if self.state == self.OPEN:
+            retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "last_failure": self.last_failure,
+            "retry_in": retry_in,
+            "last_checked": self.last_checked
+        }
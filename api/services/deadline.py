@@ -0,0 +1,22 @@
+import time
+
+class Deadline:
+    """One time budget for a whole chat request, shared by every stage that works on it"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def allows(self, seconds: float) -> bool:
+        """Whether a stage expected to take this long can still finish in time"""
+        return self.remaining() > seconds
+
+    def timeout(self, limit: float) -> float:
+        """A stage's own timeout, cut short if the deadline comes first"""
+        return min(limit, self.remaining())
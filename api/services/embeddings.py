@@ -0,0 +1,152 @@
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+from services.model_metrics import Histogram
+from services.model_router import ModelBackendError, ModelRouter, model_router
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingService:
+    """Text embeddings from the Ollama embedding model configured under `embeddings`
+
+    Callers' texts are gathered for up to max_wait_ms (or until max_batch texts are
+    waiting) and sent as one /api/embed request; results are scattered back to each
+    caller and cached by content hash, and identical texts in flight share one slot.
+    """
+
+    BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128]
+    THROUGHPUT_BUCKETS = [10, 50, 100, 250, 500, 1000, 2500, 5000]
+
+    def __init__(self, router: ModelRouter):
+        embedding_config = router.config.get("embeddings", {})
+        self.router = router
+        self.model = embedding_config.get("model", "nomic-embed-text")
+        self.endpoint = embedding_config.get("endpoint", "http://localhost:11434")
+        self.dimensions = embedding_config.get("dimensions", 768)
+        self.timeout = embedding_config.get("timeout", 30)
+        self.max_batch = embedding_config.get("max_batch", 32)
+        self.max_wait = embedding_config.get("max_wait_ms", 5) / 1000
+        self.cache_size = embedding_config.get("cache_size", 10000)
+
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._pending: List[Any] = []
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._flush_timer: Optional[asyncio.TimerHandle] = None
+        self._batches: set = set()
+
+        self.batch_sizes = Histogram(self.BATCH_SIZE_BUCKETS)
+        self.throughput = Histogram(self.THROUGHPUT_BUCKETS)
+        self.embedded = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.failed_batches = 0
+
+    def _digest(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\0{text}".encode("utf-8")).hexdigest()
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts, in input order, through the shared micro-batcher"""
+        futures = [self._submit(text) for text in texts]
+        # Shielded because other callers may be waiting on the same shared future
+        return list(await asyncio.gather(*(asyncio.shield(future) for future in futures)))
+
+    def _submit(self, text: str) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        digest = self._digest(text)
+
+        cached = self._cache.get(digest)
+        if cached is not None:
+            self._cache.move_to_end(digest)
+            self.cache_hits += 1
+            future = loop.create_future()
+            future.set_result(cached)
+            return future
+
+        future = self._in_flight.get(digest)
+        if future is not None:
+            self.coalesced += 1
+            return future
+
+        future = self._in_flight[digest] = loop.create_future()
+        self._pending.append((digest, text, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_timer is None:
+            self._flush_timer = loop.call_later(self.max_wait, self._flush)
+        return future
+
+    def _flush(self):
+        """Send everything waiting as batches of at most max_batch texts"""
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        while self._pending:
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            task = asyncio.create_task(self._run_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch: List[Any]):
+        start = time.perf_counter()
+        try:
+            vectors = await self._embed_batch([text for _, text, _ in batch])
+        except Exception as e:
+            self.failed_batches += 1
+            logger.warning(f"Embedding batch of {len(batch)} failed: {e!r}")
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+                    # Mark it retrieved so callers that went away do not trigger warnings
+                    future.exception()
+        else:
+            elapsed = time.perf_counter() - start
+            self.batch_sizes.observe(len(batch))
+            self.throughput.observe(len(batch) / elapsed if elapsed > 0 else float("inf"))
+            self.embedded += len(batch)
+            for (digest, _, future), vector in zip(batch, vectors):
+                self._cache[digest] = vector
+                if not future.done():
+                    future.set_result(vector)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        finally:
+            for digest, _, future in batch:
+                if self._in_flight.get(digest) is future:
+                    del self._in_flight[digest]
+                if not future.done():
+                    # The batch task itself was cancelled, as at shutdown; its callers must not wait forever
+                    future.cancel()
+
+    async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts in one /api/embed call, in input order"""
+        client = self.router.get_client(self.endpoint)
+        response = await asyncio.wait_for(
+            client.post("/api/embed", json={"model": self.model, "input": texts}),
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        embeddings = response.json().get("embeddings") or []
+        if len(embeddings) != len(texts):
+            raise ModelBackendError(f"{self.model} returned {len(embeddings)} embeddings for {len(texts)} texts")
+        return embeddings
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.cache_hits + self.coalesced + self.embedded
+        return {
+            "model": self.model,
+            "dimensions": self.dimensions,
+            "embedded": self.embedded,
+            "cache_entries": len(self._cache),
+            "cache_hits": self.cache_hits,
+            "coalesced": self.coalesced,
+            "cache_hit_rate": self.cache_hits / lookups if lookups else 0.0,
+            "failed_batches": self.failed_batches,
+            "batch_size": self.batch_sizes.summary(),
+            "throughput_per_second": self.throughput.summary()
+        }
+
+# Global embedding service
+embedding_service = EmbeddingService(model_router)
@@ -0,0 +1,65 @@
+from typing import Dict, Any, List, Optional
+from services.model_metrics import LatencyWindow
+
+class HedgePolicy:
+    """Decides when a slow primary model call should be duplicated to the next mapped model
+
+    Every request earns `budget` hedge tokens (up to max_tokens) and every hedge spends
+    one, so hedging adds at most roughly `budget` extra load over time.
+    """
+
+    def __init__(self, agents: List[str], percentile: float = 90, min_samples: int = 20,
+                 budget: float = 0.1, max_tokens: float = 10):
+        self.agents = set(agents)
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.budget = budget
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.budget_exhausted = 0
+
+    @classmethod
+    def from_config(cls, hedging_config: Dict[str, Any]) -> "HedgePolicy":
+        return cls(
+            hedging_config.get("agents", []) if hedging_config.get("enabled", False) else [],
+            hedging_config.get("percentile", 90),
+            hedging_config.get("min_samples", 20),
+            hedging_config.get("budget", 0.1),
+            hedging_config.get("max_tokens", 10)
+        )
+
+    def enabled_for(self, agent_name: str) -> bool:
+        return agent_name in self.agents
+
+    def delay(self, window: Optional[LatencyWindow]) -> Optional[float]:
+        """Seconds to wait on the primary before hedging, or None until enough latency is observed"""
+        if window is None or len(window.samples) < self.min_samples:
+            return None
+        return window.percentile(self.percentile)
+
+    def record_request(self):
+        self.requests += 1
+        self.tokens = min(self.max_tokens, self.tokens + self.budget)
+
+    def try_spend(self) -> bool:
+        if self.tokens < 1:
+            self.budget_exhausted += 1
+            return False
+        self.tokens -= 1
+        self.hedged += 1
+        return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "agents": sorted(self.agents),
+            "percentile": self.percentile,
+            "budget": self.budget,
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "budget_exhausted": self.budget_exhausted,
+            "hedge_rate": self.hedged / self.requests if self.requests else 0.0
+        }
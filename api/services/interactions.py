@@ -0,0 +1,62 @@
+import asyncio
+import logging
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from typing import Awaitable, Dict, Optional, Set
+from database import AsyncSessionLocal, Agent, AgentInteraction, User
+from services.deadline import Deadline
+from services.model_metrics import model_metrics
+
+logger = logging.getLogger(__name__)
+
+# Time an insert always gets, so a turn answered right at its deadline is still recorded
+MIN_INSERT_SECONDS = 2.0
+
+class InteractionRecorder:
+    """Writes AgentInteraction rows off the request path"""
+
+    def __init__(self):
+        self._agent_ids: Dict[str, Optional[int]] = {}
+        self._pending: Set[asyncio.Task] = set()
+
+    def record(self, agent_name: str, user: Optional[User], input_text: str, output_text: str,
+               response_time: float, tokens_used: int, session_id: Optional[str] = None,
+               deadline: Optional[Deadline] = None):
+        """Schedule the insert; chat responses never wait on the database, and it is dropped once the deadline and MIN_INSERT_SECONDS have both passed"""
+        insert = self._insert(agent_name, user.id if user else None, input_text, output_text, response_time, tokens_used, session_id)
+        task = asyncio.create_task(self._insert_by(insert, agent_name, deadline) if deadline else insert)
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _agent_id(self, db, agent_name: str) -> Optional[int]:
+        if agent_name not in self._agent_ids:
+            agent = await db.execute(select(Agent.id).where(Agent.name == agent_name))
+            self._agent_ids[agent_name] = agent.scalar_one_or_none()
+        return self._agent_ids[agent_name]
+
+    async def _insert_by(self, insert: Awaitable[None], agent_name: str, deadline: Deadline):
+        try:
+            await asyncio.wait_for(insert, timeout=max(deadline.remaining(), MIN_INSERT_SECONDS))
+        except asyncio.TimeoutError:
+            model_metrics.record_deadline_miss("db")
+            logger.warning(f"Dropped {agent_name} interaction: request deadline passed before it was written")
+
+    async def _insert(self, agent_name: str, user_id: Optional[int], input_text: str, output_text: str,
+                      response_time: float, tokens_used: int, session_id: Optional[str]):
+        try:
+            async with AsyncSessionLocal() as db:
+                db.add(AgentInteraction(
+                    user_id=user_id,
+                    agent_id=await self._agent_id(db, agent_name),
+                    input_text=input_text,
+                    output_text=output_text,
+                    response_time=response_time,
+                    tokens_used=tokens_used,
+                    session_id=session_id
+                ))
+                await db.commit()
+        except (SQLAlchemyError, OSError) as e:
+            logger.warning(f"Failed to record {agent_name} interaction: {e!r}")
+
+# Global interaction recorder
+interaction_recorder = InteractionRecorder()
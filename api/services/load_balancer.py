@@ -0,0 +1,98 @@
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Optional
+
+class Replica:
+    """One Ollama endpoint serving a model, with its in-flight count and latency EWMA"""
+
+    def __init__(self, endpoint: str, initial_latency: float = 1.0, smoothing: float = 0.2):
+        self.endpoint = endpoint
+        self.smoothing = smoothing
+        self.outstanding = 0
+        self.latency = initial_latency
+        self.healthy = True
+        self.requests = 0
+        self.failures = 0
+
+    def cost(self) -> float:
+        """Expected wait if one more request lands here"""
+        return (self.outstanding + 1) * self.latency
+
+    def record_latency(self, seconds: float):
+        self.latency = (1 - self.smoothing) * self.latency + self.smoothing * seconds
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "outstanding": self.outstanding,
+            "ewma_latency": round(self.latency, 3),
+            "healthy": self.healthy,
+            "requests": self.requests,
+            "failures": self.failures
+        }
+
+class ReplicaPool:
+    """Least-outstanding-requests balancing across the endpoints of one model, weighted by EWMA latency"""
+
+    def __init__(self, name: str, endpoints: List[str], balanced: bool = True, affinity_slack: float = 2.0):
+        self.name = name
+        self.balanced = balanced
+        self.affinity_slack = affinity_slack
+        self.replicas = [Replica(endpoint) for endpoint in endpoints]
+
+    @classmethod
+    def from_config(cls, name: str, model_config: Dict[str, Any], balanced: bool = True) -> "ReplicaPool":
+        endpoints = model_config.get("endpoints") or [model_config["endpoint"]]
+        return cls(name, endpoints, balanced)
+
+    def __len__(self) -> int:
+        return len(self.replicas)
+
+    def pick(self, prefer: Optional[str] = None) -> Replica:
+        """Cheapest healthy replica; every replica is a candidate if none look healthy
+
+        A preferred endpoint (the one holding a session's context) wins unless it is
+        more than affinity_slack times as costly as the cheapest replica.
+        """
+        candidates = [replica for replica in self.replicas if replica.healthy] or self.replicas
+        if not self.balanced:
+            return candidates[0]
+        cheapest = min(candidates, key=lambda replica: (replica.cost(), replica.outstanding))
+        preferred = next((replica for replica in candidates if replica.endpoint == prefer), None)
+        if preferred and preferred.cost() <= cheapest.cost() * self.affinity_slack:
+            return preferred
+        return cheapest
+
+    @asynccontextmanager
+    async def track(self, replica: Optional[Replica] = None):
+        """Count a request against a replica for as long as it runs"""
+        replica = replica or self.pick()
+        replica.outstanding += 1
+        replica.requests += 1
+        start = time.perf_counter()
+        try:
+            yield replica
+        except Exception:
+            replica.failures += 1
+            raise
+        else:
+            replica.record_latency(time.perf_counter() - start)
+        finally:
+            replica.outstanding -= 1
+
+    def add(self, endpoint: str) -> Replica:
+        replica = next((replica for replica in self.replicas if replica.endpoint == endpoint), None)
+        if replica is None:
+            replica = Replica(endpoint)
+            self.replicas.append(replica)
+        return replica
+
+    def remove(self, endpoint: str) -> Optional[Replica]:
+        """Stop routing new requests to an endpoint; its in-flight requests finish normally"""
+        replica = next((replica for replica in self.replicas if replica.endpoint == endpoint), None)
+        if replica is not None and len(self.replicas) > 1:
+            self.replicas.remove(replica)
+            return replica
+        return None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {replica.endpoint: replica.snapshot() for replica in self.replicas}
@@ -0,0 +1,69 @@
+import asyncio
+import httpx
+import logging
+import os
+from typing import Dict, Any, List, Optional
+from database import User
+from services.embeddings import EmbeddingService, embedding_service
+from services.memory_store import MemoryStore
+from services.model_router import ModelBackendError
+from services.visitor_ids import verify_visitor_id
+
+logger = logging.getLogger(__name__)
+
+class MemoraMemory:
+    """Long-term recall for the Memora agent: remembers what each user says and retrieves it by similarity"""
+
+    def __init__(self, embeddings: EmbeddingService):
+        store_config = embeddings.router.config.get("memory_store", {})
+        default_root = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "storage", "memora")
+        self.embeddings = embeddings
+        self.top_k = store_config.get("top_k", 5)
+        self.min_score = store_config.get("min_score", 0.3)
+        self.store = MemoryStore(
+            os.getenv(store_config.get("path_env", "MEMORA_STORE_PATH"), default_root),
+            embeddings.dimensions,
+            store_config.get("max_open_users", 256)
+        )
+
+    def owner(self, user: Optional[User], payload: Dict[str, Any]) -> Optional[str]:
+        """Signed-in users own their memories; anonymous visitors need the signed user_id from /agent/init_session
+
+        Ids the server did not sign get no memory, so nobody can read or write another
+        visitor's memories by sending their id.
+        """
+        if user is not None:
+            return f"user:{user.id}"
+        visitor = verify_visitor_id(payload.get("user_id"))
+        return f"visitor:{visitor}" if visitor else None
+
+    async def recall_and_remember(self, owner: Optional[str], message: str) -> List[Dict[str, Any]]:
+        """Memories related to a message, which is then stored itself; embedding failures only skip recall"""
+        if owner is None:
+            return []
+        try:
+            vector = (await self.embeddings.embed([message]))[0]
+        except (httpx.HTTPError, asyncio.TimeoutError, ModelBackendError) as e:
+            logger.warning(f"Memora could not embed a message: {e!r}")
+            return []
+        memories = await self.store.run(self.store.recall, owner, vector, self.top_k, self.min_score)
+        await self.store.run(self.store.remember, owner, [message], [vector])
+        return memories
+
+    def build_prompt(self, message: str, memories: List[Dict[str, Any]]) -> str:
+        if not memories:
+            return message
+        recalled = "\n".join(f"- ({memory['created_at'][:10]}) {memory['text']}" for memory in memories)
+        return f"Things the user told you before:\n{recalled}\n\nUser: {message}"
+
+    async def analysis(self, owner: Optional[str], memories: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            "recalled": [
+                {"text": memory["text"], "score": round(memory["score"], 3), "created_at": memory["created_at"]}
+                for memory in memories
+            ],
+            "total_memories": await self.store.run(self.store.count, owner) if owner else 0
+        }
+
+# Global Memora memory
+memora_memory = MemoraMemory(embedding_service)
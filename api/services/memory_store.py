@@ -0,0 +1,166 @@
+import asyncio
+import hashlib
+import json
+import logging
+import numpy as np
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, Callable, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+class VectorIndex:
+    """Unit-normalized float32 vectors in one contiguous array, searched by cosine similarity
+
+    With a path the vectors live in a memory-mapped `<path>.f32` file and their
+    records in `<path>.jsonl`, so reopening an index does not re-embed anything.
+    """
+
+    def __init__(self, dim: int, path: Optional[str] = None, initial_capacity: int = 1024):
+        self.dim = dim
+        self.path = path
+        self.records: List[Dict[str, Any]] = []
+        if path and os.path.exists(f"{path}.jsonl"):
+            self.records = self._load_records(f"{path}.jsonl")
+        self.vectors = self._allocate(max(initial_capacity, len(self.records)))
+        # Records are appended only after their vectors are flushed, so a torn write is ignored
+        self.count = min(len(self.records), len(self.vectors))
+        self.records = self.records[:self.count]
+
+    @staticmethod
+    def _load_records(filename: str) -> List[Dict[str, Any]]:
+        """Records from the jsonl file; a last line torn by a crash mid-append is cut off the file"""
+        with open(filename, "rb") as records_file:
+            lines = records_file.readlines()
+        records, good = [], 0
+        for number, line in enumerate(lines, 1):
+            if line.strip():
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    if number < len(lines):
+                        raise
+                    logger.warning(f"Dropping a torn record at the end of {filename}")
+                    with open(filename, "r+b") as records_file:
+                        records_file.truncate(good)
+                    break
+            good += len(line)
+        else:
+            if lines and not lines[-1].endswith(b"\n"):
+                # Whole record, missing only its newline; the next append must not run into it
+                with open(filename, "ab") as records_file:
+                    records_file.write(b"\n")
+        return records
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _allocate(self, capacity: int) -> np.ndarray:
+        if not self.path:
+            vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+            if getattr(self, "vectors", None) is not None:
+                vectors[:self.count] = self.vectors[:self.count]
+            return vectors
+
+        filename = f"{self.path}.f32"
+        size = capacity * self.dim * 4
+        if not os.path.exists(filename) or os.path.getsize(filename) < size:
+            with open(filename, "ab") as vectors_file:
+                vectors_file.truncate(size)
+        rows = os.path.getsize(filename) // (self.dim * 4)
+        return np.memmap(filename, dtype=np.float32, mode="r+", shape=(rows, self.dim))
+
+    def _normalize(self, vectors: Sequence[Sequence[float]]) -> np.ndarray:
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+
+    def append(self, vectors: Sequence[Sequence[float]], records: List[Dict[str, Any]]) -> List[int]:
+        """Add vectors with their records, growing storage by doubling; returns the new ids"""
+        matrix = self._normalize(vectors)
+        needed = self.count + len(matrix)
+        if needed > len(self.vectors):
+            capacity = len(self.vectors)
+            while capacity < needed:
+                capacity *= 2
+            if isinstance(self.vectors, np.memmap):
+                self.vectors.flush()
+            self.vectors = self._allocate(capacity)
+
+        start = self.count
+        self.vectors[start:needed] = matrix
+        if isinstance(self.vectors, np.memmap):
+            self.vectors.flush()
+            with open(f"{self.path}.jsonl", "a", encoding="utf-8") as records_file:
+                records_file.writelines(json.dumps(record) + "\n" for record in records)
+        self.records.extend(records)
+        self.count = needed
+        return list(range(start, needed))
+
+    def search(self, queries: Sequence[Sequence[float]], k: int = 5) -> List[List[Dict[str, Any]]]:
+        """Top-k records by cosine similarity for each query, best first"""
+        matrix = self._normalize(queries)
+        if not self.count:
+            return [[] for _ in matrix]
+
+        k = min(k, self.count)
+        scores = self.vectors[:self.count] @ matrix.T
+        results = []
+        for column in range(scores.shape[1]):
+            column_scores = scores[:, column]
+            top = np.argpartition(-column_scores, k - 1)[:k]
+            top = top[np.argsort(-column_scores[top])]
+            results.append([dict(self.records[i], id=int(i), score=float(column_scores[i])) for i in top])
+        return results
+
+class MemoryStore:
+    """Per-user vector indexes, with at most max_open of them mapped at once
+
+    Searches, file writes and msyncs run through run() on one worker thread, which
+    keeps them off the event loop and never lets two of them touch an index at once.
+    """
+
+    def __init__(self, root: Optional[str], dim: int, max_open: int = 256):
+        self.root = root
+        self.dim = dim
+        self.max_open = max_open
+        self._indexes: "OrderedDict[str, VectorIndex]" = OrderedDict()
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-store")
+        if root:
+            os.makedirs(root, exist_ok=True)
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Call one of the store's methods on its worker thread"""
+        return await asyncio.get_running_loop().run_in_executor(self._io, fn, *args)
+
+    def index_for(self, owner: str) -> VectorIndex:
+        index = self._indexes.get(owner)
+        if index is None:
+            # Owner ids are hashed so they are always safe file names
+            name = hashlib.sha256(owner.encode("utf-8")).hexdigest()[:32]
+            index = self._indexes[owner] = VectorIndex(self.dim, os.path.join(self.root, name) if self.root else None)
+        self._indexes.move_to_end(owner)
+        while len(self._indexes) > self.max_open:
+            _, closed = self._indexes.popitem(last=False)
+            if isinstance(closed.vectors, np.memmap):
+                closed.vectors.flush()
+        return index
+
+    def remember(self, owner: str, texts: List[str], vectors: Sequence[Sequence[float]]) -> List[int]:
+        created_at = datetime.utcnow().isoformat()
+        return self.index_for(owner).append(vectors, [{"text": text, "created_at": created_at} for text in texts])
+
+    def recall(self, owner: str, vector: Sequence[float], k: int = 5, min_score: float = 0.0) -> List[Dict[str, Any]]:
+        return [memory for memory in self.index_for(owner).search([vector], k)[0] if memory["score"] >= min_score]
+
+    def count(self, owner: str) -> int:
+        return len(self.index_for(owner))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "open_indexes": len(self._indexes),
+            "open_memories": sum(len(index) for index in self._indexes.values()),
+            "dimensions": self.dim
+        }
@@ -0,0 +1,26 @@
+import os
+import yaml
+from functools import lru_cache
+from typing import Dict, Any
+
+# AI models configuration
+AI_MODELS_CONFIG_PATH = os.getenv(
+    "AI_MODELS_CONFIG",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config", "ai_models_config.yml")
+)
+
+@lru_cache(maxsize=None)
+def load_model_config(path: str = AI_MODELS_CONFIG_PATH) -> Dict[str, Any]:
+    """Load ai_models_config.yml once per process"""
+    with open(path, "r") as config_file:
+        return yaml.safe_load(config_file) or {}
+
+def parse_memory_size(value: Any) -> int:
+    """Convert sizes such as '512MB' or '16GB' to bytes"""
+    if isinstance(value, (int, float)):
+        return int(value)
+    text = str(value).strip().upper()
+    for suffix, factor in (("TB", 1024 ** 4), ("GB", 1024 ** 3), ("MB", 1024 ** 2), ("KB", 1024), ("B", 1)):
+        if text.endswith(suffix):
+            return int(float(text[:-len(suffix)]) * factor)
+    return int(float(text))
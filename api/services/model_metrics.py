@@ -0,0 +1,112 @@
+import bisect
+from collections import deque
+from typing import Dict, Any, List, Optional
+
+class LatencyWindow:
+    """Fixed-size window of recent latency samples in seconds"""
+
+    def __init__(self, size: int = 500):
+        self.samples = deque(maxlen=size)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def summary(self) -> Dict[str, Any]:
+        count = len(self.samples)
+        return {
+            "count": count,
+            "avg": sum(self.samples) / count if count else None,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99)
+        }
+
+class Histogram:
+    """Bucket counts; each observation lands in the first bucket whose upper bound covers it"""
+
+    def __init__(self, bounds: List[float]):
+        self.bounds = sorted(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def summary(self) -> Dict[str, Any]:
+        labels = [f"{bound:g}" for bound in self.bounds] + ["+Inf"]
+        return {
+            "buckets": dict(zip(labels, self.counts)),
+            "count": self.count,
+            "avg": self.total / self.count if self.count else None
+        }
+
+class ModelMetrics:
+    """In-process latency metrics for the model router"""
+
+    def __init__(self):
+        self.ttft: Dict[str, LatencyWindow] = {}
+        self.model_latency: Dict[str, LatencyWindow] = {}
+        self.turn_latency: Dict[str, LatencyWindow] = {}
+        self.cancelled: Dict[str, int] = {}
+        self.cancelled_tokens = 0
+        self.saved_seconds = 0.0
+        self.deadline_misses: Dict[str, int] = {}
+
+    def record_ttft(self, agent_name: str, seconds: float):
+        """Record time-to-first-token for a streamed agent chat"""
+        window = self.ttft.get(agent_name)
+        if window is None:
+            window = self.ttft[agent_name] = LatencyWindow()
+        window.record(seconds)
+
+    def record_model_latency(self, model: str, seconds: float):
+        """Record how long a model took to answer a non-streaming completion"""
+        window = self.model_latency.get(model)
+        if window is None:
+            window = self.model_latency[model] = LatencyWindow()
+        window.record(seconds)
+
+    def record_turn(self, agent_name: str, seconds: float):
+        """Record how long a finished chat turn kept a model busy"""
+        window = self.turn_latency.get(agent_name)
+        if window is None:
+            window = self.turn_latency[agent_name] = LatencyWindow()
+        window.record(seconds)
+
+    def record_cancelled(self, agent_name: str, path: str, elapsed: float, tokens_streamed: int = 0):
+        """Record a chat turn whose client went away; the saving is the rest of the agent's median turn"""
+        self.cancelled[path] = self.cancelled.get(path, 0) + 1
+        self.cancelled_tokens += tokens_streamed
+        window = self.turn_latency.get(agent_name)
+        typical = window.percentile(50) if window else None
+        if typical is not None:
+            self.saved_seconds += max(0.0, typical - elapsed)
+
+    def record_deadline_miss(self, stage: str):
+        """Count a stage that was skipped or cut short because its request ran out of time"""
+        self.deadline_misses[stage] = self.deadline_misses.get(stage, 0) + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "time_to_first_token": {agent: window.summary() for agent, window in self.ttft.items()},
+            "model_latency": {model: window.summary() for model, window in self.model_latency.items()},
+            "cancelled_turns": {
+                "by_path": dict(self.cancelled),
+                "tokens_streamed_before_cancel": self.cancelled_tokens,
+                "model_seconds_saved": round(self.saved_seconds, 3)
+            },
+            "deadline_misses": dict(self.deadline_misses)
+        }
+
+# Global model metrics
+model_metrics = ModelMetrics()
@@ -0,0 +1,141 @@
+import logging
+import time
+from typing import Dict, Any, List, Optional, Callable
+from services.model_config import parse_memory_size
+
+logger = logging.getLogger(__name__)
+
+class ResidencyScheduler:
+    """Decides which local models stay loaded within a RAM budget
+
+    Demand is an exponentially decayed count of requests whose preferred model was
+    this one; a model's value is its demand per GB, and the least valuable idle
+    models (then the least recently used) are evicted first.
+    """
+
+    def __init__(self, memory_requirements: Dict[str, int], memory_budget: int,
+                 demand_half_life: float = 300, busy: Optional[Callable[[str], bool]] = None):
+        self.memory_requirements = memory_requirements
+        self.memory_budget = memory_budget
+        self.demand_half_life = demand_half_life
+        self.busy = busy or (lambda model_key: False)
+        self.resident: Dict[str, float] = {}
+        # Memory held outside the resident set, such as autoscaled replicas, keyed by owner
+        self.reserved: Dict[str, int] = {}
+        self._demand: Dict[str, float] = {}
+        self._demand_at: Dict[str, float] = {}
+        self.loads = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_config(cls, local_models: Dict[str, Dict[str, Any]], residency_config: Dict[str, Any],
+                    busy: Optional[Callable[[str], bool]] = None) -> "ResidencyScheduler":
+        requirements = {
+            model_key: parse_memory_size(model_config.get("memory_requirement", 0))
+            for model_key, model_config in local_models.items()
+        }
+        budget = residency_config.get("memory_budget")
+        return cls(
+            requirements,
+            parse_memory_size(budget) if budget else sum(requirements.values()),
+            residency_config.get("demand_half_life", 300),
+            busy
+        )
+
+    @property
+    def used_memory(self) -> int:
+        resident = sum(self.memory_requirements.get(model_key, 0) for model_key in self.resident)
+        return resident + sum(self.reserved.values())
+
+    def admits(self, model_key: str) -> bool:
+        """Whether another copy of model_key fits in the free budget without evicting anything"""
+        return self.memory_budget - self.used_memory >= self.memory_requirements.get(model_key, 0)
+
+    def reserve(self, owner: str, model_key: str):
+        self.reserved[owner] = self.memory_requirements.get(model_key, 0)
+
+    def release(self, owner: str):
+        self.reserved.pop(owner, None)
+
+    def is_resident(self, model_key: str) -> bool:
+        return model_key in self.resident
+
+    def demand(self, model_key: str, now: Optional[float] = None) -> float:
+        now = now if now is not None else time.monotonic()
+        last = self._demand_at.get(model_key)
+        if last is None:
+            return 0.0
+        return self._demand[model_key] * 0.5 ** ((now - last) / self.demand_half_life)
+
+    def record_demand(self, model_key: str, weight: float = 1.0):
+        now = time.monotonic()
+        self._demand[model_key] = self.demand(model_key, now) + weight
+        self._demand_at[model_key] = now
+
+    def value(self, model_key: str) -> float:
+        gigabytes = max(self.memory_requirements.get(model_key, 0) / 1024 ** 3, 0.1)
+        return self.demand(model_key) / gigabytes
+
+    def touch(self, model_key: str):
+        if model_key in self.resident:
+            self.resident[model_key] = time.monotonic()
+
+    def mark_resident(self, model_key: str):
+        if model_key not in self.resident:
+            self.loads += 1
+        self.resident[model_key] = time.monotonic()
+
+    def mark_evicted(self, model_key: str):
+        if self.resident.pop(model_key, None) is not None:
+            self.evictions += 1
+
+    def order(self, models: List[str]) -> List[str]:
+        """Put resident local models ahead of cold ones; non-local entries keep their place at the end"""
+        local = [model for model in models if model in self.memory_requirements]
+        warm = [model for model in local if model in self.resident]
+        if not warm:
+            return list(models)
+        cold = [model for model in local if model not in self.resident]
+        return warm + cold + [model for model in models if model not in self.memory_requirements]
+
+    def victims_for(self, model_key: str, exclude: Optional[List[str]] = None) -> Optional[List[str]]:
+        """Idle resident models to evict so model_key fits, or None if it cannot fit"""
+        needed = self.memory_requirements.get(model_key, 0)
+        free = self.memory_budget - self.used_memory
+        if free >= needed:
+            return []
+
+        protected = set(exclude or [])
+        candidates = sorted(
+            (resident for resident in self.resident
+             if resident != model_key and resident not in protected and not self.busy(resident)),
+            key=lambda resident: (self.value(resident), self.resident[resident])
+        )
+        victims = []
+        for candidate in candidates:
+            victims.append(candidate)
+            free += self.memory_requirements.get(candidate, 0)
+            if free >= needed:
+                return victims
+        return None
+
+    def plan(self, models: List[str]) -> List[str]:
+        """Most valuable subset of models that fits the budget together"""
+        chosen, used = [], sum(self.reserved.values())
+        for model_key in sorted(models, key=self.value, reverse=True):
+            size = self.memory_requirements.get(model_key, 0)
+            if used + size <= self.memory_budget:
+                chosen.append(model_key)
+                used += size
+        return chosen
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "memory_budget": self.memory_budget,
+            "used_memory": self.used_memory,
+            "reserved": dict(self.reserved),
+            "resident": sorted(self.resident),
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "demand": {model_key: round(self.demand(model_key), 3) for model_key in self.memory_requirements}
+        }
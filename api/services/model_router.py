@@ -0,0 +1,895 @@
+import asyncio
+import functools
+import httpx
+import json
+import logging
+import os
+import time
+from contextlib import nullcontext
+from datetime import datetime
+from fastapi import HTTPException, status
+from typing import Dict, Any, List, Optional, AsyncIterator, Iterator, Set
+from services.admission import ModelAdmission, ModelOverloaded
+from services.circuit_breaker import CircuitBreaker
+from services.deadline import Deadline
+from services.hedging import HedgePolicy
+from services.load_balancer import Replica, ReplicaPool
+from services.model_config import load_model_config
+from services.model_metrics import model_metrics
+from services.model_residency import ResidencyScheduler
+from services.model_selection import AdaptiveSelector
+from services.response_cache import ResponseCache
+from services.session_context import SessionContext, SessionContextStore
+from services.singleflight import SingleFlight, request_key
+from services.token_budget import TokenBudget
+
+logger = logging.getLogger(__name__)
+
+class ModelBackendError(Exception):
+    """Raised when a model endpoint cannot produce a completion"""
+
+class ModelRouter:
+    """Routes agent chats to their mapped models using local_first_with_fallback"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.config = config if config is not None else load_model_config()
+        models = self.config.get("ai_models", {})
+        selection = self.config.get("model_selection", {})
+        resources = self.config.get("resource_management", {})
+        error_handling = self.config.get("monitoring", {}).get("error_handling", {})
+        cache_config = self.config.get("response_cache", {})
+
+        self.local_models: Dict[str, Dict[str, Any]] = models.get("local_models", {})
+        self.cloud_models: Dict[str, Dict[str, Any]] = models.get("cloud_models", {})
+        self.agent_mappings: Dict[str, List[str]] = selection.get("agent_mappings", {})
+        self.failover_timeout = selection.get("failover_timeout", 10)
+        self.load_balancing = selection.get("load_balancing", True)
+        self.retry_attempts = max(1, selection.get("retry_attempts", 1))
+        self.retry_delay = selection.get("retry_delay", 0)
+        self.min_attempt_time = selection.get("min_attempt_time", 1)
+        self.request_timeout = resources.get("request_timeout", 60)
+        self.max_connections = resources.get("max_concurrent_requests", 5)
+        self.max_queued_requests = resources.get("max_queued_requests", 20)
+        residency_config = resources.get("residency", {})
+        self.residency_enabled = residency_config.get("enabled", False)
+        self.rebalance_interval = residency_config.get("rebalance_interval", 60)
+        self.keep_alive = resources.get("keep_alive", "10m")
+        self.queue_timeout = resources.get("queue_timeout", 15)
+        self.stream_buffer_size = resources.get("stream_buffer_size", 64)
+        self.health_check_interval = selection.get("health_check_interval", 30)
+        self.breakers_enabled = error_handling.get("circuit_breaker_enabled", True)
+        self.breaker_threshold = error_handling.get("circuit_breaker_threshold", 5)
+        self.breaker_timeout = error_handling.get("circuit_breaker_timeout", 300)
+
+        # One pooled keep-alive client per model endpoint
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        # Shared streams hold no more than the relay buffer, so coalescing keeps its backpressure
+        self.singleflight = SingleFlight(self.stream_buffer_size)
+
+        # Replicas of each local model, balanced by outstanding requests and latency
+        self.replicas: Dict[str, ReplicaPool] = {
+            model_key: ReplicaPool.from_config(model_key, model_config, self.load_balancing)
+            for model_key, model_config in self.local_models.items()
+        }
+
+        # Per-model admission control for local backends; every replica adds capacity
+        self.admission: Dict[str, ModelAdmission] = {
+            model_key: ModelAdmission(
+                model_key, self.max_connections * len(self.replicas[model_key]), self.max_queued_requests, self.queue_timeout
+            )
+            for model_key in self.local_models
+        }
+
+        # Which local models are loaded, within the host RAM budget
+        self.residency = ResidencyScheduler.from_config(
+            self.local_models,
+            residency_config,
+            busy=lambda model_key: self.admission[model_key].active > 0
+        )
+        self.is_rebalancing = False
+        # Background unloads of evicted models, kept so they are not garbage collected mid-flight
+        self._unloads: Set[asyncio.Task] = set()
+
+        # Completion cache for deterministic requests
+        self.cache_enabled = cache_config.get("enabled", False)
+        self.cache_default_temperature = cache_config.get("default_temperature", 0.8)
+        self.cache_sampled_agents = set(cache_config.get("cache_sampled_agents", []))
+        redis_url_env = cache_config.get("redis_url_env")
+        self.response_cache = ResponseCache(
+            max_entries=cache_config.get("max_entries", 1000),
+            ttl=cache_config.get("ttl", 600),
+            redis_url=os.getenv(redis_url_env) if redis_url_env else None,
+            redis_ttl=cache_config.get("redis_ttl", 3600)
+        )
+        self.hedging = HedgePolicy.from_config(selection.get("hedging", {}))
+        self.selector = AdaptiveSelector(
+            selection.get("adaptive_selection", {}), self.failover_timeout, self.queue_load, self.is_cold
+        )
+        self.token_budget = TokenBudget(self.local_models, self.cloud_models, self.config.get("token_budget", {}))
+
+        # Multi-turn chat state, so follow-up turns only send the new message
+        session_config = self.config.get("session_context", {})
+        self.sessions_enabled = session_config.get("enabled", False)
+        self.sessions = SessionContextStore(
+            max_sessions=session_config.get("max_sessions", 1000),
+            max_messages=session_config.get("max_messages", 20),
+            ttl=session_config.get("ttl", 1800)
+        )
+        self.is_probing = False
+
+    def models_for_agent(self, agent_name: str) -> List[str]:
+        """Return the ordered model list for an agent"""
+        models = self.agent_mappings.get(agent_name)
+        if not models:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"No models are mapped for agent '{agent_name}'"
+            )
+        return models
+
+    def candidate_models(self, agent_name: str, prompt: str) -> List[str]:
+        """Mapped models that can hold the prompt, in the order they should be tried, preferring resident ones"""
+        models = self.token_budget.fitting_models(self.models_for_agent(agent_name), prompt)
+        if not models:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Message is too long for the models behind '{agent_name}'"
+            )
+        preferred = next((model for model in models if model in self.local_models), None)
+        if preferred:
+            self.residency.record_demand(preferred)
+        if self.selector.enabled_for(agent_name):
+            return self.selector.order(agent_name, models)
+        if not self.residency_enabled:
+            return models
+        return self.residency.order(models)
+
+    def queue_load(self, model: str) -> float:
+        """Admitted plus queued requests per slot; cloud models are treated as unloaded"""
+        admission = self.admission.get(model)
+        if admission is None:
+            return 0.0
+        return (admission.active + admission.queued) / admission.max_concurrent
+
+    def is_cold(self, model: str) -> bool:
+        return self.residency_enabled and model in self.local_models and not self.residency.is_resident(model)
+
+    def ensure_resident(self, model: str) -> bool:
+        """Make room for a local model before it is used; False if it cannot fit the memory budget"""
+        if not self.residency_enabled or model not in self.local_models:
+            return True
+        if self.residency.is_resident(model):
+            self.residency.touch(model)
+            return True
+
+        victims = self.residency.victims_for(model)
+        if victims is None:
+            logger.warning(f"Skipping {model}: it does not fit the model memory budget")
+            return False
+        for victim in victims:
+            self.residency.mark_evicted(victim)
+            task = asyncio.create_task(self.unload_model(victim))
+            self._unloads.add(task)
+            task.add_done_callback(functools.partial(self._unload_done, victim))
+        self.residency.mark_resident(model)
+        return True
+
+    def _unload_done(self, model_key: str, task: asyncio.Task):
+        self._unloads.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Failed to unload {model_key}: {task.exception()!r}")
+
+    def is_cacheable(self, agent_name: str, options: Optional[Dict[str, Any]] = None) -> bool:
+        """Cache only deterministic requests unless the agent opts in to caching sampled ones"""
+        if not self.cache_enabled:
+            return False
+        if agent_name in self.cache_sampled_agents:
+            return True
+        try:
+            temperature = float((options or {}).get("temperature", self.cache_default_temperature))
+        except (TypeError, ValueError):
+            # Malformed temperatures are left for the model to reject, never cached
+            return False
+        return temperature <= 0
+
+    def get_breaker(self, model: str) -> CircuitBreaker:
+        """Return the circuit breaker tracking a model backend"""
+        breaker = self.breakers.get(model)
+        if breaker is None:
+            breaker = CircuitBreaker(model, self.breaker_threshold, self.breaker_timeout)
+            self.breakers[model] = breaker
+        return breaker
+
+    def get_client(self, endpoint: str) -> httpx.AsyncClient:
+        """Return the shared HTTP client for an endpoint, creating it on first use"""
+        client = self._clients.get(endpoint)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                base_url=endpoint,
+                timeout=httpx.Timeout(self.request_timeout, connect=self.failover_timeout),
+                # Admission control caps generations; the extra connections leave room for health probes
+                limits=httpx.Limits(
+                    max_connections=self.max_connections + 2,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=self.request_timeout
+                )
+            )
+            self._clients[endpoint] = client
+        return client
+
+    def admission_slot(self, model: str, premium: bool = False, deadline: Optional[Deadline] = None):
+        """Concurrency slot for a local model; cloud models are not limited here"""
+        admission = self.admission.get(model)
+        return admission.slot(premium, deadline.remaining() if deadline else None) if admission else nullcontext()
+
+    def can_finish(self, model: str, deadline: Deadline) -> bool:
+        """Whether a model is expected to answer in the time left; a skipped model is a deadline miss"""
+        window = model_metrics.model_latency.get(model)
+        typical = window.percentile(50) if window else None
+        if deadline.allows(max(typical or 0.0, self.min_attempt_time)):
+            return True
+        model_metrics.record_deadline_miss("fallback")
+        return False
+
+    def can_retry(self, deadline: Deadline) -> bool:
+        if deadline.allows(self.retry_delay + self.min_attempt_time):
+            return True
+        model_metrics.record_deadline_miss("retry")
+        return False
+
+    def deadline_error(self, agent_name: str, deadline: Deadline) -> HTTPException:
+        model_metrics.record_deadline_miss("request")
+        return HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=f"'{agent_name}' could not answer within {deadline.seconds:g}s"
+        )
+
+    def overloaded_error(self, agent_name: str, overloaded: List[ModelOverloaded]) -> HTTPException:
+        """Build the load-shedding response when every candidate model refused admission"""
+        queue_full = any(e.reason == "queue is full" for e in overloaded)
+        return HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS if queue_full else status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Models for '{agent_name}' are at capacity, please retry shortly",
+            headers={"Retry-After": str(min(e.retry_after for e in overloaded))}
+        )
+
+    async def generate(self, agent_name: str, prompt: str, options: Optional[Dict[str, Any]] = None, premium: bool = False,
+                       session: Optional[SessionContext] = None, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        """Run a completion for an agent, falling through its mapped models in order
+
+        With a session, the model that holds its context only receives the new message
+        and the finished turn is recorded on the session; session turns are never cached.
+        Queueing, retries and fallbacks all share one deadline (request_timeout by default);
+        models that cannot answer in the time left are skipped and 504 is raised once it runs out.
+        """
+        deadline = deadline or Deadline(self.request_timeout)
+        models = self.candidate_models(agent_name, prompt)
+        overloaded: List[ModelOverloaded] = []
+
+        use_cache = session is None and self.is_cacheable(agent_name, options)
+        if use_cache:
+            cached = await self.response_cache.get_first([request_key(agent_name, model, prompt, options) for model in models])
+            if cached is not None:
+                return dict(cached, latency=0.0, cached=True)
+
+        out_of_time = False
+        for attempt in range(self.retry_attempts):
+            if attempt:
+                if not self.can_retry(deadline):
+                    out_of_time = True
+                    break
+                await asyncio.sleep(self.retry_delay)
+
+            candidates = iter(models)
+            for model in candidates:
+                if not self.can_finish(model, deadline):
+                    out_of_time = True
+                    continue
+                if not self.admit(model):
+                    continue
+
+                start = time.perf_counter()
+                try:
+                    if self.hedging.enabled_for(agent_name):
+                        result = await self._call_hedged(agent_name, model, candidates, prompt, options, premium, session, deadline)
+                    else:
+                        result = await self._attempt(agent_name, model, prompt, options, premium, session, deadline)
+                except ModelOverloaded as e:
+                    overloaded.append(e)
+                    continue
+                except (httpx.HTTPError, asyncio.TimeoutError, ModelBackendError):
+                    continue
+
+                context, endpoint = result.pop("context", None), result.pop("endpoint", None)
+                if not result.get("tokens_used"):
+                    result["tokens_used"] = self.estimate_tokens(result["model"], prompt, result["response"])
+                if session is not None:
+                    session.record(result["model"], prompt, result["response"], context, endpoint)
+                if use_cache:
+                    await self.response_cache.set(request_key(agent_name, result["model"], prompt, options), dict(result))
+                result["latency"] = time.perf_counter() - start
+                return result
+
+        if out_of_time or deadline.expired():
+            raise self.deadline_error(agent_name, deadline)
+        if overloaded:
+            raise self.overloaded_error(agent_name, overloaded)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"All models for '{agent_name}' are currently unavailable"
+        )
+
+    def estimate_tokens(self, model: str, prompt: str, response: str) -> int:
+        """Token usage from the budget tokenizer, for backends that do not report it"""
+        return self.token_budget.count(model, prompt) + self.token_budget.count(model, response)
+
+    def admit(self, model: str) -> bool:
+        """Whether a model may be tried now: its breaker allows it and it fits in memory"""
+        breaker = self.get_breaker(model)
+        if self.breakers_enabled and not breaker.allow_request():
+            return False
+        if not self.ensure_resident(model):
+            breaker.release_trial()
+            return False
+        return True
+
+    async def _attempt(self, agent_name: str, model: str, prompt: str, options: Optional[Dict[str, Any]], premium: bool,
+                       session: Optional[SessionContext] = None, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        """One admitted completion call, settling the model's breaker with the outcome"""
+        breaker = self.get_breaker(model)
+        model_prompt, context = self.token_budget.session_prompt(model, session, prompt) if session else (prompt, None)
+        endpoint = session.endpoint if session and session.model == model else None
+        start = time.perf_counter()
+        try:
+            result = dict(await self.singleflight.do(
+                request_key(agent_name, model, model_prompt, options, session.session_id if session else None),
+                functools.partial(self._call_admitted, model, model_prompt, options, premium, context, endpoint, deadline)
+            ))
+        except ModelOverloaded:
+            breaker.release_trial()
+            if deadline and deadline.expired():
+                model_metrics.record_deadline_miss("queue")
+            raise
+        except (httpx.HTTPError, asyncio.TimeoutError, ModelBackendError) as e:
+            if isinstance(e, asyncio.TimeoutError) and deadline and deadline.expired():
+                # Cut short by the request's deadline, not a sign the model is unhealthy
+                model_metrics.record_deadline_miss("model")
+                breaker.release_trial()
+                raise
+            logger.warning(f"Model {model} failed for {agent_name}: {e!r}")
+            breaker.record_failure(repr(e))
+            self.selector.record(agent_name, model, None, False)
+            raise
+        except asyncio.CancelledError:
+            breaker.release_trial()
+            raise
+
+        breaker.record_success()
+        latency = time.perf_counter() - start
+        model_metrics.record_model_latency(model, latency)
+        self.selector.record(agent_name, model, latency, True)
+        result["model"] = model
+        return result
+
+    async def _call_hedged(self, agent_name: str, model: str, fallbacks: Iterator[str], prompt: str,
+                           options: Optional[Dict[str, Any]], premium: bool,
+                           session: Optional[SessionContext] = None, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        """Call a model; once it passes its latency percentile, race it against the next admissible fallback"""
+        self.hedging.record_request()
+        start = time.perf_counter()
+        primary = asyncio.ensure_future(self._attempt(agent_name, model, prompt, options, premium, session, deadline))
+        hedge = None
+        try:
+            delay = self.hedging.delay(model_metrics.model_latency.get(model))
+            if delay is None:
+                return await primary
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done or not self.hedging.try_spend():
+                return await primary
+            hedge_model = next((
+                fallback for fallback in fallbacks
+                if (deadline is None or self.can_finish(fallback, deadline)) and self.admit(fallback)
+            ), None)
+            if hedge_model is None:
+                return await primary
+
+            logger.info(f"Hedging {agent_name} request from {model} to {hedge_model} after {delay:.2f}s")
+            hedge = asyncio.ensure_future(self._attempt(agent_name, hedge_model, prompt, options, premium, session, deadline))
+            pending = {primary, hedge}
+            errors = []
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedging.hedge_wins += 1
+                            # Keep the slow sample so the percentile does not drift down as hedges win
+                            model_metrics.record_model_latency(model, time.perf_counter() - start)
+                        return task.result()
+                    errors.append(task.exception())
+            # Prefer an overload so the caller can still answer 429 with Retry-After
+            raise next((e for e in errors if isinstance(e, ModelOverloaded)), errors[0])
+        finally:
+            losers = [task for task in (primary, hedge) if task is not None and not task.done()]
+            for task in losers:
+                task.cancel()
+            await asyncio.gather(*losers, return_exceptions=True)
+
+    async def stream(self, agent_name: str, prompt: str, options: Optional[Dict[str, Any]] = None, premium: bool = False,
+                     session: Optional[SessionContext] = None, deadline: Optional[Deadline] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Stream a completion for an agent as start/token/done events
+
+        Falls through the mapped models until one produces its first token within
+        failover_timeout; once tokens have been sent a failure ends the stream with
+        an error event instead. The whole stream, including its tail, shares one deadline.
+        """
+        deadline = deadline or Deadline(self.request_timeout)
+        models = self.candidate_models(agent_name, prompt)
+        overloaded: List[ModelOverloaded] = []
+
+        use_cache = session is None and self.is_cacheable(agent_name, options)
+        if use_cache:
+            cached = await self.response_cache.get_first([request_key(agent_name, model, prompt, options) for model in models])
+            if cached is not None:
+                yield {"type": "start", "model": cached["model"], "ttft": 0.0, "cached": True}
+                yield {"type": "token", "content": cached["response"]}
+                yield {"type": "done", "model": cached["model"], "tokens_used": cached.get("tokens_used", 0), "latency": 0.0, "cached": True}
+                return
+
+        out_of_time = False
+        for attempt in range(self.retry_attempts):
+            if attempt:
+                if not self.can_retry(deadline):
+                    out_of_time = True
+                    break
+                await asyncio.sleep(self.retry_delay)
+
+            for model in models:
+                if not self.can_finish(model, deadline):
+                    out_of_time = True
+                    continue
+                if not self.admit(model):
+                    continue
+                breaker = self.get_breaker(model)
+                model_prompt, context = self.token_budget.session_prompt(model, session, prompt) if session else (prompt, None)
+                endpoint = session.endpoint if session and session.model == model else None
+
+                start = time.perf_counter()
+                chunks = self.singleflight.stream(
+                    request_key(agent_name, model, model_prompt, options, session.session_id if session else None),
+                    functools.partial(self._stream_admitted, model, model_prompt, options, premium, context, endpoint, deadline)
+                )
+                try:
+                    first = await chunks.__anext__()
+                except ModelOverloaded as e:
+                    overloaded.append(e)
+                    await chunks.aclose()
+                    breaker.release_trial()
+                    if deadline.expired():
+                        model_metrics.record_deadline_miss("queue")
+                    continue
+                except (httpx.HTTPError, asyncio.TimeoutError, ModelBackendError, StopAsyncIteration) as e:
+                    if isinstance(e, asyncio.TimeoutError) and deadline.expired():
+                        await chunks.aclose()
+                        model_metrics.record_deadline_miss("model")
+                        breaker.release_trial()
+                        continue
+                    logger.warning(f"Model {model} failed to stream for {agent_name}: {e!r}")
+                    await chunks.aclose()
+                    breaker.record_failure(repr(e))
+                    self.selector.record(agent_name, model, None, False)
+                    continue
+                except asyncio.CancelledError:
+                    await chunks.aclose()
+                    breaker.release_trial()
+                    raise
+
+                breaker.record_success()
+                ttft = time.perf_counter() - start
+                model_metrics.record_ttft(agent_name, ttft)
+                yield {"type": "start", "model": model, "ttft": ttft}
+
+                tokens = []
+                async for event in self._relay(model, chunks, first, deadline):
+                    if event["type"] == "token":
+                        tokens.append(event["content"])
+                    if event["type"] == "done":
+                        event["latency"] = time.perf_counter() - start
+                        self.selector.record(agent_name, model, event["latency"], True)
+                        context, endpoint = event.pop("context", None), event.pop("endpoint", None)
+                        if not event["tokens_used"]:
+                            event["tokens_used"] = self.estimate_tokens(model, prompt, "".join(tokens))
+                        if session is not None:
+                            session.record(model, prompt, "".join(tokens), context, endpoint)
+                        if use_cache:
+                            await self.response_cache.set(request_key(agent_name, model, prompt, options), {
+                                "response": "".join(tokens),
+                                "tokens_used": event["tokens_used"],
+                                "model": model
+                            })
+                    yield event
+                return
+
+        if out_of_time or deadline.expired():
+            raise self.deadline_error(agent_name, deadline)
+        if overloaded:
+            raise self.overloaded_error(agent_name, overloaded)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"All models for '{agent_name}' are currently unavailable"
+        )
+
+    async def _relay(self, model: str, chunks: AsyncIterator[Dict[str, Any]], first: Dict[str, Any],
+                     deadline: Optional[Deadline] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Read ahead from an upstream stream into a bounded buffer and emit token events until the deadline"""
+        buffer: asyncio.Queue = asyncio.Queue(maxsize=self.stream_buffer_size)
+
+        async def read_upstream():
+            try:
+                async for chunk in chunks:
+                    await buffer.put(chunk)
+            except (httpx.HTTPError, ModelBackendError) as e:
+                await buffer.put(e)
+            else:
+                await buffer.put(None)
+
+        reader = asyncio.create_task(read_upstream())
+        try:
+            chunk = first
+            while chunk is not None:
+                if isinstance(chunk, Exception):
+                    logger.warning(f"Model {model} failed mid-stream: {chunk!r}")
+                    self.get_breaker(model).record_failure(repr(chunk))
+                    yield {"type": "error", "model": model, "detail": "Model stream interrupted"}
+                    return
+                if chunk["token"]:
+                    yield {"type": "token", "content": chunk["token"]}
+                if chunk["done"]:
+                    yield {
+                        "type": "done",
+                        "model": model,
+                        "tokens_used": chunk.get("tokens_used", 0),
+                        "context": chunk.get("context"),
+                        "endpoint": chunk.get("endpoint")
+                    }
+                    return
+                if not buffer.empty() or deadline is None:
+                    chunk = await buffer.get()
+                    continue
+                try:
+                    # asyncio.timeout, unlike wait_for, never swallows a cancel that lands as a chunk arrives
+                    async with asyncio.timeout(deadline.remaining()):
+                        chunk = await buffer.get()
+                except asyncio.TimeoutError:
+                    model_metrics.record_deadline_miss("stream")
+                    yield {"type": "error", "model": model, "detail": "Deadline exceeded"}
+                    return
+            yield {"type": "done", "model": model, "tokens_used": 0}
+        finally:
+            reader.cancel()
+            await asyncio.gather(reader, return_exceptions=True)
+            await chunks.aclose()
+
+    async def _call_admitted(self, model: str, prompt: str, options: Optional[Dict[str, Any]], premium: bool,
+                             context: Optional[List[int]] = None, endpoint: Optional[str] = None,
+                             deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        """Wait for a model slot, then bound the call itself by failover_timeout or the deadline, whichever is sooner"""
+        async with self.admission_slot(model, premium, deadline):
+            timeout = deadline.timeout(self.failover_timeout) if deadline else self.failover_timeout
+            return await asyncio.wait_for(self.call_model(model, prompt, options, context, endpoint), timeout=timeout)
+
+    async def _stream_admitted(self, model: str, prompt: str, options: Optional[Dict[str, Any]], premium: bool,
+                               context: Optional[List[int]] = None, endpoint: Optional[str] = None,
+                               deadline: Optional[Deadline] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Hold a model slot for the whole stream; the first chunk must arrive within failover_timeout or the deadline"""
+        async with self.admission_slot(model, premium, deadline):
+            chunks = self.stream_model(model, prompt, options, context, endpoint)
+            try:
+                try:
+                    timeout = deadline.timeout(self.failover_timeout) if deadline else self.failover_timeout
+                    first = await asyncio.wait_for(chunks.__anext__(), timeout=timeout)
+                except StopAsyncIteration:
+                    return
+                yield first
+                async for chunk in chunks:
+                    yield chunk
+            finally:
+                await chunks.aclose()
+
+    def _generate_body(self, model_key: str, prompt: str, options: Optional[Dict[str, Any]], stream: bool,
+                       context: Optional[List[int]] = None) -> Dict[str, Any]:
+        """Ollama /api/generate request body, continuing from a session's context when given"""
+        model_config = self.local_models[model_key]
+        body = {
+            "model": model_config.get("ollama_model", model_key),
+            "prompt": prompt,
+            "stream": stream,
+            "options": self.token_budget.generate_options(model_key, options)
+        }
+        if context:
+            body["context"] = context
+        return body
+
+    async def stream_model(self, model: str, prompt: str, options: Optional[Dict[str, Any]] = None,
+                           context: Optional[List[int]] = None, endpoint: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Yield token chunks from a single model entry from agent_mappings
+
+        For local models the final chunk carries Ollama's context and the replica that served it.
+        """
+        provider, _, model_name = model.partition(":")
+        if model_name:
+            # Cloud fallbacks are relayed as a single chunk
+            result = await self._call_cloud(provider, model_name, prompt, options or {})
+            yield {"token": result["response"], "done": True, "tokens_used": result["tokens_used"]}
+            return
+
+        if model not in self.local_models:
+            raise ModelBackendError(f"Unknown local model '{model}'")
+
+        pool = self.replicas[model]
+        async with pool.track(pool.pick(endpoint)) as replica:
+            client = self.get_client(replica.endpoint)
+            async with client.stream("POST", "/api/generate", json=self._generate_body(model, prompt, options, True, context)) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    try:
+                        data = json.loads(line)
+                    except ValueError:
+                        raise ModelBackendError(f"Malformed stream chunk from {model}")
+                    if data.get("error"):
+                        raise ModelBackendError(data["error"])
+                    yield {
+                        "token": data.get("response", ""),
+                        "done": data.get("done", False),
+                        "tokens_used": data.get("prompt_eval_count", 0) + data.get("eval_count", 0),
+                        "context": data.get("context"),
+                        "endpoint": replica.endpoint
+                    }
+
+    async def call_model(self, model: str, prompt: str, options: Optional[Dict[str, Any]] = None,
+                         context: Optional[List[int]] = None, endpoint: Optional[str] = None) -> Dict[str, Any]:
+        """Send a prompt to a single model entry from agent_mappings"""
+        provider, _, model_name = model.partition(":")
+        if model_name:
+            return await self._call_cloud(provider, model_name, prompt, options or {})
+        return await self._call_local(model, prompt, options or {}, context, endpoint)
+
+    async def _call_local(self, model_key: str, prompt: str, options: Dict[str, Any],
+                          context: Optional[List[int]] = None, endpoint: Optional[str] = None) -> Dict[str, Any]:
+        if model_key not in self.local_models:
+            raise ModelBackendError(f"Unknown local model '{model_key}'")
+
+        pool = self.replicas[model_key]
+        async with pool.track(pool.pick(endpoint)) as replica:
+            client = self.get_client(replica.endpoint)
+            response = await client.post("/api/generate", json=self._generate_body(model_key, prompt, options, False, context))
+            response.raise_for_status()
+            data = response.json()
+
+        return {
+            "response": data.get("response", ""),
+            "tokens_used": data.get("prompt_eval_count", 0) + data.get("eval_count", 0),
+            "context": data.get("context"),
+            "endpoint": replica.endpoint
+        }
+
+    async def _call_cloud(self, provider: str, model_name: str, prompt: str, options: Dict[str, Any]) -> Dict[str, Any]:
+        provider_config = self.cloud_models.get(provider)
+        if provider_config is None:
+            raise ModelBackendError(f"Unknown cloud provider '{provider}'")
+
+        api_key = os.getenv(provider_config.get("api_key_env", ""))
+        if not api_key:
+            raise ModelBackendError(f"{provider_config.get('api_key_env')} is not set")
+
+        client = self.get_client(provider_config["endpoint"])
+        messages = [{"role": "user", "content": prompt}]
+
+        if provider == "openai":
+            body = {"model": model_name, "messages": messages}
+            if "temperature" in options:
+                body["temperature"] = options["temperature"]
+            response = await client.post(
+                "/chat/completions",
+                json=body,
+                headers={"Authorization": f"Bearer {api_key}"}
+            )
+            response.raise_for_status()
+            data = response.json()
+            return {
+                "response": data["choices"][0]["message"]["content"],
+                "tokens_used": data.get("usage", {}).get("total_tokens", 0)
+            }
+
+        if provider == "anthropic":
+            body = {"model": model_name, "messages": messages, "max_tokens": self.token_budget.answer_tokens(options)}
+            if "temperature" in options:
+                body["temperature"] = options["temperature"]
+            response = await client.post(
+                "/messages",
+                json=body,
+                headers={"x-api-key": api_key, "anthropic-version": "2023-06-01"}
+            )
+            response.raise_for_status()
+            data = response.json()
+            usage = data.get("usage", {})
+            return {
+                "response": "".join(block.get("text", "") for block in data.get("content", [])),
+                "tokens_used": usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+            }
+
+        raise ModelBackendError(f"Cloud provider '{provider}' is not supported by the router")
+
+    async def load_model(self, model_key: str, keep_alive: Any, timeout: float, endpoints: Optional[List[str]] = None):
+        """Ask replicas of a model (all by default) to load it, or refresh its keep-alive, with an empty generate request"""
+        model_config = self.local_models[model_key]
+
+        async def ping(endpoint: str):
+            response = await asyncio.wait_for(self.get_client(endpoint).post("/api/generate", json={
+                "model": model_config.get("ollama_model", model_key),
+                "prompt": "",
+                "keep_alive": keep_alive
+            }), timeout=timeout)
+            response.raise_for_status()
+
+        endpoints = endpoints or [replica.endpoint for replica in self.replicas[model_key].replicas]
+        await asyncio.gather(*(ping(endpoint) for endpoint in endpoints))
+
+    async def unload_model(self, model_key: str):
+        """Ask Ollama to release a model's memory now"""
+        try:
+            await self.load_model(model_key, 0, self.failover_timeout)
+        except (httpx.HTTPError, asyncio.TimeoutError) as e:
+            logger.warning(f"Failed to unload {model_key}: {e!r}")
+
+    async def sync_residency(self):
+        """Refresh the resident set from each Ollama instance's /api/ps"""
+        async def loaded_on(endpoint: str, tag: str) -> Optional[bool]:
+            try:
+                response = await asyncio.wait_for(self.get_client(endpoint).get("/api/ps"), timeout=self.failover_timeout)
+                response.raise_for_status()
+            except (httpx.HTTPError, asyncio.TimeoutError):
+                return None
+            return any(tag in (entry.get("name"), entry.get("model")) for entry in response.json().get("models", []))
+
+        async def loaded(model_key: str) -> Optional[bool]:
+            tag = self.local_models[model_key].get("ollama_model", model_key)
+            tag = tag if ":" in tag else f"{tag}:latest"
+            answers = await asyncio.gather(*(loaded_on(replica.endpoint, tag) for replica in self.replicas[model_key].replicas))
+            answers = [answer for answer in answers if answer is not None]
+            return any(answers) if answers else None
+
+        model_keys = list(self.local_models)
+        for model_key, is_loaded in zip(model_keys, await asyncio.gather(*(loaded(model_key) for model_key in model_keys))):
+            if is_loaded is None:
+                continue
+            if is_loaded and not self.residency.is_resident(model_key):
+                self.residency.mark_resident(model_key)
+            elif not is_loaded and self.residency.is_resident(model_key):
+                self.residency.mark_evicted(model_key)
+
+    async def rebalance_residency(self):
+        """Load models whose demand now outweighs idle resident ones, evicting those to stay in budget"""
+        await self.sync_residency()
+        wanted = [model_key for model_key in self.local_models
+                  if self.residency.is_resident(model_key) or self.residency.demand(model_key) > 0]
+        planned = self.residency.plan(wanted)
+        for model_key in planned:
+            if self.residency.is_resident(model_key):
+                continue
+            victims = self.residency.victims_for(model_key, exclude=planned)
+            if victims is None:
+                continue
+            for victim in victims:
+                self.residency.mark_evicted(victim)
+                await self.unload_model(victim)
+            try:
+                await self.load_model(model_key, self.keep_alive, self.request_timeout)
+            except (httpx.HTTPError, asyncio.TimeoutError) as e:
+                logger.warning(f"Failed to load {model_key}: {e!r}")
+                continue
+            self.residency.mark_resident(model_key)
+
+    async def start_residency_rebalancing(self):
+        """Rebalance resident models every rebalance_interval until stopped"""
+        self.is_rebalancing = self.residency_enabled
+        while self.is_rebalancing:
+            await asyncio.sleep(self.rebalance_interval)
+            await self.rebalance_residency()
+
+    def add_replica(self, model_key: str, endpoint: str) -> Replica:
+        """Start routing a model's requests to another endpoint; admission grows by one replica's slots"""
+        pool = self.replicas[model_key]
+        replica = pool.add(endpoint)
+        self.admission[model_key].resize(self.max_connections * len(pool))
+        return replica
+
+    def remove_replica(self, model_key: str, endpoint: str) -> Optional[Replica]:
+        """Stop routing new requests to an endpoint; the caller waits for its in-flight requests"""
+        pool = self.replicas[model_key]
+        replica = pool.remove(endpoint)
+        if replica is not None:
+            self.admission[model_key].resize(self.max_connections * len(pool))
+        return replica
+
+    async def close_client(self, endpoint: str):
+        client = self._clients.pop(endpoint, None)
+        if client is not None:
+            await client.aclose()
+
+    async def probe_replica(self, replica: Replica) -> Optional[Exception]:
+        """Check one model endpoint, returning the error if it is down"""
+        try:
+            response = await asyncio.wait_for(self.get_client(replica.endpoint).get("/api/version"), timeout=self.failover_timeout)
+            response.raise_for_status()
+        except (httpx.HTTPError, asyncio.TimeoutError) as e:
+            replica.healthy = False
+            return e
+        replica.healthy = True
+        return None
+
+    async def probe_model(self, model_key: str):
+        """Check every replica of a local model; the breaker only trips when none answer
+
+        An answering /api/version says nothing about generation, so a probe never
+        closes a breaker or clears its failures; only a real request's half-open
+        trial does that.
+        """
+        breaker = self.get_breaker(model_key)
+        errors = await asyncio.gather(*(self.probe_replica(replica) for replica in self.replicas[model_key].replicas))
+        if all(errors):
+            if breaker.state != CircuitBreaker.OPEN:
+                logger.warning(f"Health check failed for {model_key}: {errors[0]!r}")
+            # Unreachable: keep the breaker open so callers fail fast instead of timing out
+            breaker.trip(f"health check: {errors[0]!r}")
+        breaker.last_checked = datetime.utcnow().isoformat()
+
+    async def start_health_checks(self):
+        """Probe every local model on health_check_interval until stopped"""
+        self.is_probing = True
+        while self.is_probing:
+            await asyncio.gather(*(self.probe_model(model_key) for model_key in self.local_models))
+            await asyncio.sleep(self.health_check_interval)
+
+    def stop_health_checks(self):
+        self.is_probing = False
+
+    def admission_status(self) -> Dict[str, Any]:
+        """Slot usage and queue depth for every local model"""
+        return {model: admission.snapshot() for model, admission in self.admission.items()}
+
+    def replica_status(self) -> Dict[str, Any]:
+        """In-flight requests, latency and health of every local model replica"""
+        return {model_key: pool.snapshot() for model_key, pool in self.replicas.items()}
+
+    def residency_status(self) -> Dict[str, Any]:
+        """Resident set, memory use and decayed demand of the local models"""
+        return {"enabled": self.residency_enabled, **self.residency.snapshot()}
+
+    def breaker_status(self) -> Dict[str, Any]:
+        """Breaker state for every known model backend"""
+        for model_key in self.local_models:
+            self.get_breaker(model_key)
+        return {
+            "enabled": self.breakers_enabled,
+            "threshold": self.breaker_threshold,
+            "timeout": self.breaker_timeout,
+            "health_check_interval": self.health_check_interval,
+            "models": {model: breaker.snapshot() for model, breaker in self.breakers.items()}
+        }
+
+    async def close(self):
+        """Close all pooled endpoint clients"""
+        self.stop_health_checks()
+        self.is_rebalancing = False
+        await asyncio.gather(*self._unloads, return_exceptions=True)
+        await self.response_cache.close()
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+
+# Global model router
+model_router = ModelRouter()
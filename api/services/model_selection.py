@@ -0,0 +1,151 @@
+import json
+import logging
+import random
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional, Callable, Tuple
+
+logger = logging.getLogger(__name__)
+
+class ModelStats:
+    """EWMA latency and error rate of one model serving one agent"""
+
+    def __init__(self, smoothing: float):
+        self.smoothing = smoothing
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.samples = 0
+        self.updated = 0.0
+
+    def record(self, latency: Optional[float], ok: bool):
+        alpha = self.smoothing
+        if ok and latency is not None:
+            self.latency = latency if self.latency is None else (1 - alpha) * self.latency + alpha * latency
+        self.error_rate = (1 - alpha) * self.error_rate + alpha * (0.0 if ok else 1.0)
+        self.samples += 1
+        self.updated = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "ewma_latency": round(self.latency, 3) if self.latency is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "samples": self.samples
+        }
+
+class AdaptiveSelector:
+    """Reorders an agent's mapped models by expected latency learned from live traffic
+
+    A model's cost is its EWMA latency scaled by its queue load, plus its error rate
+    times the failover timeout it would waste, plus a penalty when it is not loaded.
+    Quality constraints keep the mapping meaningful: a model moves at most
+    max_promotion places ahead of where agent_mappings put it, and cloud fallbacks
+    only move ahead of local models when promote_cloud is on.
+    """
+
+    def __init__(self, selection_config: Dict[str, Any], failover_timeout: float,
+                 load: Callable[[str], float], is_cold: Callable[[str], bool]):
+        self.enabled = selection_config.get("enabled", False)
+        self.agents = set(selection_config.get("agents") or [])
+        self.max_promotion = selection_config.get("max_promotion", 1)
+        self.promote_cloud = selection_config.get("promote_cloud", False)
+        self.exploration_rate = selection_config.get("exploration_rate", 0.05)
+        self.stale_after = selection_config.get("stale_after", 300)
+        self.smoothing = selection_config.get("smoothing", 0.2)
+        self.default_latency = selection_config.get("default_latency", 2.0)
+        self.cold_load_penalty = selection_config.get("cold_load_penalty", 5.0)
+        self.failover_timeout = failover_timeout
+        self.load = load
+        self.is_cold = is_cold
+        self.stats: Dict[Tuple[str, str], ModelStats] = {}
+        self.decisions: deque = deque(maxlen=selection_config.get("audit_log_size", 200))
+        self.reordered = 0
+        self.explored = 0
+
+    def enabled_for(self, agent_name: str) -> bool:
+        return self.enabled and (not self.agents or agent_name in self.agents)
+
+    def stats_for(self, agent_name: str, model: str) -> ModelStats:
+        stats = self.stats.get((agent_name, model))
+        if stats is None:
+            stats = self.stats[(agent_name, model)] = ModelStats(self.smoothing)
+        return stats
+
+    def record(self, agent_name: str, model: str, latency: Optional[float], ok: bool):
+        if self.enabled_for(agent_name):
+            self.stats_for(agent_name, model).record(latency, ok)
+
+    def cost(self, agent_name: str, model: str) -> float:
+        stats = self.stats_for(agent_name, model)
+        latency = stats.latency if stats.latency is not None else self.default_latency
+        cost = latency * (1 + self.load(model)) + stats.error_rate * self.failover_timeout
+        if self.is_cold(model):
+            cost += self.cold_load_penalty
+        return cost
+
+    def _movable(self, model: str, displaced: str) -> bool:
+        is_cloud = ":" in model
+        return self.promote_cloud or not is_cloud or ":" in displaced
+
+    def order(self, agent_name: str, models: List[str]) -> List[str]:
+        """Mapped models reordered by cost within the quality constraints; the decision is audit-logged"""
+        rank = {model: index for index, model in enumerate(models)}
+        costs = {model: self.cost(agent_name, model) for model in models}
+
+        remaining = list(models)
+        ordered = []
+        while remaining:
+            head = remaining[0]
+            eligible = [
+                model for model in remaining
+                if rank[model] - rank[head] <= self.max_promotion and self._movable(model, head)
+            ]
+            best = min(eligible, key=lambda model: (costs[model], rank[model]))
+            ordered.append(best)
+            remaining.remove(best)
+
+        explored = None
+        now = time.monotonic()
+        stale = [
+            model for model in ordered[1:]
+            if now - self.stats_for(agent_name, model).updated > self.stale_after and self._movable(model, ordered[0])
+        ]
+        if stale and random.random() < self.exploration_rate:
+            # Spend a little traffic on a model whose stats have gone stale
+            explored = random.choice(stale)
+            ordered.remove(explored)
+            ordered.insert(0, explored)
+            self.explored += 1
+
+        if ordered != models:
+            self.reordered += 1
+        self._audit(agent_name, models, ordered, costs, explored)
+        return ordered
+
+    def _audit(self, agent_name: str, mapped: List[str], ordered: List[str], costs: Dict[str, float], explored: Optional[str]):
+        decision = {
+            "at": time.time(),
+            "agent": agent_name,
+            "mapped": mapped,
+            "chosen": ordered,
+            "explored": explored,
+            "inputs": {
+                model: dict(self.stats_for(agent_name, model).snapshot(), load=round(self.load(model), 3),
+                            cold=self.is_cold(model), cost=round(costs[model], 3))
+                for model in mapped
+            }
+        }
+        self.decisions.append(decision)
+        if ordered != mapped:
+            logger.info(f"Model selection: {json.dumps(decision)}")
+        else:
+            logger.debug(f"Model selection: {json.dumps(decision)}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "reordered": self.reordered,
+            "explored": self.explored,
+            "stats": {
+                f"{agent}/{model}": stats.snapshot() for (agent, model), stats in self.stats.items()
+            }
+        }
@@ -0,0 +1,131 @@
+import asyncio
+import httpx
+import logging
+import os
+from datetime import datetime
+from dotenv import dotenv_values
+from typing import Dict, Any, List, Optional
+from services.model_router import ModelRouter, model_router
+
+logger = logging.getLogger(__name__)
+
+# Agent registry
+AI_AGENTS_ENV_PATH = os.getenv(
+    "AI_AGENTS_ENV",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config", "ai_agents.env")
+)
+
+class ModelWarmupManager:
+    """Preloads the local models enabled agents depend on and keeps them resident in Ollama"""
+
+    COLD = "cold"
+    WARMING = "warming"
+    WARM = "warm"
+    FAILED = "failed"
+
+    def __init__(self, router: ModelRouter, agents_env_path: str = AI_AGENTS_ENV_PATH):
+        resources = router.config.get("resource_management", {})
+        self.router = router
+        self.agents_env_path = agents_env_path
+        self.warmup_timeout = resources.get("model_warmup_time", 30)
+        self.keep_alive = resources.get("keep_alive", "10m")
+        self.keep_alive_interval = resources.get("keep_alive_interval", 240)
+        self.retry_interval = router.health_check_interval
+        self.status: Dict[str, Dict[str, Any]] = {}
+        self.required: Optional[List[str]] = None
+        self.is_running = False
+
+    def enabled_agents(self) -> List[str]:
+        """Agents switched on in ai_agents.env that have a model mapping"""
+        values = dotenv_values(self.agents_env_path)
+        return [
+            agent for agent in self.router.agent_mappings
+            if str(values.get(f"{agent.upper()}_ENABLED", "false")).lower() == "true"
+        ]
+
+    def required_models(self) -> List[str]:
+        """Primary local model of every enabled agent; fallbacks are loaded on demand
+
+        Each enabled agent seeds demand for its primary model, so when the models do
+        not all fit the residency budget the ones serving most agents are preloaded.
+        """
+        required = []
+        for agent in self.enabled_agents():
+            primary = next((model for model in self.router.agent_mappings[agent] if model in self.router.local_models), None)
+            if primary:
+                self.router.residency.record_demand(primary)
+            if primary and primary not in required:
+                required.append(primary)
+        if self.router.residency_enabled:
+            required = self.router.residency.plan(required)
+        return required
+
+    def _set_status(self, model_key: str, state: str, error: Optional[str] = None):
+        entry = self.status.setdefault(model_key, {"state": self.COLD, "warmed_at": None, "last_error": None})
+        entry["state"] = state
+        if state == self.WARM:
+            entry["warmed_at"] = datetime.utcnow().isoformat()
+            entry["last_error"] = None
+        if error:
+            entry["last_error"] = error
+
+    async def ping(self, model_key: str):
+        """Load a model (or refresh its keep-alive) with an empty generate request"""
+        await self.router.load_model(model_key, self.keep_alive, self.warmup_timeout)
+
+    async def warm(self, model_key: str):
+        """Retry loading a model until it answers"""
+        self._set_status(model_key, self.WARMING)
+        while self.is_running:
+            try:
+                await self.ping(model_key)
+            except (httpx.HTTPError, asyncio.TimeoutError) as e:
+                logger.warning(f"Warm-up failed for {model_key}: {e!r}")
+                self._set_status(model_key, self.FAILED, repr(e))
+                await asyncio.sleep(self.retry_interval)
+                continue
+            self._set_status(model_key, self.WARM)
+            self.router.residency.mark_resident(model_key)
+            logger.info(f"Model {model_key} is warm")
+            return
+
+    async def start(self):
+        """Warm every required model, then ping them every keep_alive_interval until stopped"""
+        self.is_running = True
+        self.required = self.required_models()
+        for model_key in self.required:
+            self._set_status(model_key, self.COLD)
+
+        await asyncio.gather(*(self.warm(model_key) for model_key in self.required))
+
+        while self.is_running:
+            await asyncio.sleep(self.keep_alive_interval)
+            await asyncio.gather(*(self.keep_alive_ping(model_key) for model_key in self.resident_models()))
+
+    def resident_models(self) -> List[str]:
+        """Models whose keep-alive should be refreshed; evicted ones are left to unload"""
+        if self.router.residency_enabled:
+            return [model_key for model_key in self.router.local_models if self.router.residency.is_resident(model_key)]
+        return self.required
+
+    async def keep_alive_ping(self, model_key: str):
+        try:
+            await self.ping(model_key)
+        except (httpx.HTTPError, asyncio.TimeoutError) as e:
+            logger.warning(f"Keep-alive failed for {model_key}: {e!r}")
+            self._set_status(model_key, self.COLD, repr(e))
+        else:
+            self._set_status(model_key, self.WARM)
+
+    def stop(self):
+        self.is_running = False
+
+    def is_ready(self) -> bool:
+        """True once every required model has been loaded"""
+        return self.required is not None and all(self.status[model_key]["state"] == self.WARM for model_key in self.required)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {model_key: dict(entry) for model_key, entry in self.status.items()}
+
+# Global warm-up manager
+model_warmup = ModelWarmupManager(model_router)
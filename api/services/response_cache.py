@@ -0,0 +1,89 @@
+import json
+import logging
+import time
+import redis.asyncio as aioredis
+from collections import OrderedDict
+from redis.exceptions import RedisError
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class ResponseCache:
+    """Completion cache: in-process LRU with TTL, optionally backed by a Redis tier shared across workers"""
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 600, redis_url: Optional[str] = None,
+                 redis_ttl: int = 3600, key_prefix: str = "onelastai:completion:"):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.redis_ttl = redis_ttl
+        self.key_prefix = key_prefix
+        self.redis = aioredis.from_url(redis_url) if redis_url else None
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def _get_local(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _set_local(self, key: str, value: Dict[str, Any]):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_first(self, keys: List[str]) -> Optional[Dict[str, Any]]:
+        """Return the cached value for the first key that has one, checking memory before Redis"""
+        for key in keys:
+            value = self._get_local(key)
+            if value is not None:
+                self.hits += 1
+                return value
+
+        if self.redis is not None:
+            try:
+                values = await self.redis.mget([self.key_prefix + key for key in keys])
+            except RedisError as e:
+                logger.warning(f"Response cache Redis lookup failed: {e!r}")
+                values = []
+            for key, raw in zip(keys, values):
+                if raw is not None:
+                    value = json.loads(raw)
+                    self._set_local(key, value)
+                    self.redis_hits += 1
+                    return value
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: Dict[str, Any]):
+        self._set_local(key, value)
+        if self.redis is not None:
+            try:
+                await self.redis.set(self.key_prefix + key, json.dumps(value), ex=self.redis_ttl)
+            except RedisError as e:
+                logger.warning(f"Response cache Redis write failed: {e!r}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.redis_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.redis_hits) / lookups if lookups else 0.0,
+            "redis_enabled": self.redis is not None
+        }
+
+    async def close(self):
+        if self.redis is not None:
+            await self.redis.close()
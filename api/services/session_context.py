@@ -0,0 +1,90 @@
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Any, List, Optional, Tuple
+
+class SessionContext:
+    """Conversation state for one chat session: the model's context handle and a trimmed message window"""
+
+    def __init__(self, session_id: str, agent_name: str, max_messages: int = 20):
+        self.session_id = session_id
+        self.agent_name = agent_name
+        self.messages: deque = deque(maxlen=max_messages)
+        self.model: Optional[str] = None
+        self.context: Optional[List[int]] = None
+        self.endpoint: Optional[str] = None
+        self.turns = 0
+        self.context_turns = 0
+
+    def prompt_for(self, model: str, message: str) -> Tuple[str, Optional[List[int]]]:
+        """Prompt and Ollama context to send to a model for the next turn
+
+        The model that produced the stored context only needs the new message; any
+        other model gets the trimmed transcript replayed in front of it.
+        """
+        if self.context and model == self.model:
+            return message, self.context
+        return self.transcript(message), None
+
+    def transcript(self, message: str, keep: Optional[int] = None) -> str:
+        """The newest `keep` messages (all by default) replayed in front of the new message"""
+        messages = list(self.messages)[-keep:] if keep else ([] if keep == 0 else list(self.messages))
+        if not messages:
+            return message
+        omitted = len(self.messages) - len(messages)
+        lines = [f"({omitted} earlier messages omitted)"] if omitted else []
+        lines += [f"{role}: {content}" for role, content in messages]
+        return "\n".join(lines) + f"\nuser: {message}\nassistant:"
+
+    def record(self, model: str, message: str, response: str, context: Optional[List[int]] = None,
+               endpoint: Optional[str] = None):
+        """Append a finished turn; a turn without a context handle invalidates the stored one"""
+        if context and model == self.model and self.context:
+            self.context_turns += 1
+        self.messages.append(("user", message))
+        self.messages.append(("assistant", response))
+        self.model = model
+        self.context = context or None
+        self.endpoint = endpoint
+        self.turns += 1
+
+class SessionContextStore:
+    """In-process LRU of chat sessions with an idle TTL"""
+
+    def __init__(self, max_sessions: int = 1000, max_messages: int = 20, ttl: float = 1800):
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self.ttl = ttl
+        self._sessions: "OrderedDict[str, Tuple[float, SessionContext]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, session_id: str, agent_name: str) -> SessionContext:
+        """Return the session for (session_id, agent), starting a new one if it is unknown or expired"""
+        key = f"{agent_name}:{session_id}"
+        entry = self._sessions.get(key)
+        if entry is not None and entry[0] >= time.monotonic():
+            self.hits += 1
+            session = entry[1]
+        else:
+            self.misses += 1
+            session = SessionContext(session_id, agent_name, self.max_messages)
+
+        self._sessions[key] = (time.monotonic() + self.ttl, session)
+        self._sessions.move_to_end(key)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+        return session
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "context_turns": sum(session.context_turns for _, session in self._sessions.values())
+        }
@@ -0,0 +1,198 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import deque
+from typing import Dict, Any, Deque, List, Optional, AsyncIterator, Awaitable, Callable
+
+def request_key(agent_name: str, model: str, prompt: str, options: Optional[Dict[str, Any]] = None,
+                scope: Optional[str] = None) -> str:
+    """Hash of (agent, model, normalized prompt, sampling params), optionally scoped to a session"""
+    normalized = " ".join(prompt.split())
+    raw = json.dumps([agent_name, model, normalized, options or {}] + ([scope] if scope else []), sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class _SharedCall:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+        self.started = time.perf_counter()
+        self.duration = 0.0
+
+class _SharedStream:
+    """One upstream stream fanned out to every subscriber, in at most max_buffered chunks of memory
+
+    When the buffer is full, chunks every subscriber has read are dropped to make
+    room; if the slowest subscriber has not read them yet the producer stops reading
+    upstream until it does, so backpressure still reaches the model. Late joiners
+    replay from the first chunk, so the stream takes new subscribers only until its
+    first chunk is dropped; after that an identical request starts its own stream.
+    """
+
+    def __init__(self, source: Callable[[], AsyncIterator[Dict[str, Any]]], on_close: Callable[[], None],
+                 max_buffered: int = 64):
+        self.source = source
+        self.on_close = on_close
+        self.max_buffered = max(1, max_buffered)
+        self.chunks: Deque[Dict[str, Any]] = deque()
+        # Stream position of chunks[0], and of the next chunk each subscriber will read
+        self.base = 0
+        self.positions: Dict[object, int] = {}
+        self.error: Optional[BaseException] = None
+        self.finished = False
+        self.subscribers = 0
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self._updated = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def _notify(self):
+        updated, self._updated = self._updated, asyncio.Event()
+        updated.set()
+
+    def _drop_read(self) -> bool:
+        """Drop chunks every subscriber has read; False if the slowest has read none of them"""
+        slowest = min(self.positions.values(), default=self.base + len(self.chunks))
+        if slowest <= self.base:
+            return False
+        while self.base < slowest:
+            self.chunks.popleft()
+            self.base += 1
+        # The first chunks are gone, so newcomers could no longer replay the whole answer
+        self.on_close()
+        return True
+
+    async def _produce(self):
+        chunks = self.source()
+        try:
+            while True:
+                while len(self.chunks) >= self.max_buffered and not self._drop_read():
+                    await self._drained.wait()
+                try:
+                    chunk = await chunks.__anext__()
+                except StopAsyncIteration:
+                    break
+                self.chunks.append(chunk)
+                self._notify()
+        except Exception as e:
+            self.error = e
+        finally:
+            await chunks.aclose()
+            self.finished = True
+            self.duration = time.perf_counter() - self.started
+            self.on_close()
+            self._notify()
+
+    def _wake_producer(self):
+        # Only a full buffer has a producer waiting for room
+        if len(self.chunks) >= self.max_buffered:
+            drained, self._drained = self._drained, asyncio.Event()
+            drained.set()
+
+    async def subscribe(self) -> AsyncIterator[Dict[str, Any]]:
+        subscriber = object()
+        index = self.base
+        self.positions[subscriber] = index
+        self.subscribers += 1
+        if self._task is None:
+            self._task = asyncio.create_task(self._produce())
+        try:
+            while True:
+                while index < self.base + len(self.chunks):
+                    chunk = self.chunks[index - self.base]
+                    index += 1
+                    self.positions[subscriber] = index
+                    self._wake_producer()
+                    yield chunk
+                if self.finished:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await self._updated.wait()
+        finally:
+            self.subscribers -= 1
+            del self.positions[subscriber]
+            self._wake_producer()
+            # Nobody is reading any more; stop the upstream generation
+            if self.subscribers == 0 and not self.finished:
+                self.on_close()
+                self._task.cancel()
+
+class SingleFlight:
+    """Coalesces identical in-flight model requests so they share one upstream generation"""
+
+    def __init__(self, max_buffered: int = 64):
+        self.max_buffered = max_buffered
+        self._calls: Dict[str, _SharedCall] = {}
+        self._streams: Dict[str, _SharedStream] = {}
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Await fn() once per key; concurrent callers with the same key share its result"""
+        call = self._calls.get(key)
+        shared = call is not None
+        if shared:
+            self.hits += 1
+        else:
+            self.misses += 1
+            call = _SharedCall(asyncio.create_task(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda task: self._finish_call(key, call))
+
+        call.waiters += 1
+        try:
+            result = await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                self._forget_call(key, call)
+                call.task.cancel()
+
+        if shared:
+            self.saved_seconds += call.duration
+        return result
+
+    def _finish_call(self, key: str, call: _SharedCall):
+        call.duration = time.perf_counter() - call.started
+        self._forget_call(key, call)
+
+    def _forget_call(self, key: str, call: _SharedCall):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def _forget_stream(self, key: str, shared_stream: "_SharedStream"):
+        if self._streams.get(key) is shared_stream:
+            del self._streams[key]
+
+    async def stream(self, key: str, source: Callable[[], AsyncIterator[Dict[str, Any]]]) -> AsyncIterator[Dict[str, Any]]:
+        """Iterate source() once per key; concurrent callers with the same key get the same chunks"""
+        shared_stream = self._streams.get(key)
+        shared = shared_stream is not None
+        if shared:
+            self.hits += 1
+        else:
+            self.misses += 1
+            shared_stream = _SharedStream(source, lambda: self._forget_stream(key, shared_stream), self.max_buffered)
+            self._streams[key] = shared_stream
+
+        chunks = shared_stream.subscribe()
+        try:
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await chunks.aclose()
+            if shared and shared_stream.finished and shared_stream.error is None:
+                self.saved_seconds += shared_stream.duration
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "saved_model_seconds": round(self.saved_seconds, 3),
+            "in_flight": len(self._calls) + len(self._streams)
+        }
@@ -0,0 +1,147 @@
+import math
+import re
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
+from services.session_context import SessionContext
+
+# Words, numbers, and single punctuation marks, roughly how BPE vocabularies split text
+PIECE_PATTERN = re.compile(r"[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]")
+
+# Average characters per token for long words, by tokenizer family
+FAMILY_CHARS_PER_TOKEN = {
+    "llama": 4.0,
+    "gemma": 4.2,
+    "phi": 3.9,
+    "gpt": 4.0,
+    "mistral": 3.4,
+    "smollm": 3.6,
+    "claude": 3.5
+}
+
+class ApproxTokenizer:
+    """Fast token estimate for one model family, without loading its vocabulary"""
+
+    def __init__(self, family: str, chars_per_token: float):
+        self.family = family
+        self.chars_per_token = chars_per_token
+
+    def count(self, text: str) -> int:
+        total = 0
+        for piece in PIECE_PATTERN.findall(text):
+            total += 1 if len(piece) <= self.chars_per_token else math.ceil(len(piece) / self.chars_per_token)
+        return total
+
+@lru_cache(maxsize=None)
+def get_tokenizer(family: str) -> ApproxTokenizer:
+    """One tokenizer per model family, built on first use"""
+    return ApproxTokenizer(family, FAMILY_CHARS_PER_TOKEN.get(family, 4.0))
+
+# Longest text worth memoizing; history turns are short, whole documents would only pin memory
+MEMO_MAX_CHARS = 2048
+
+@lru_cache(maxsize=8192)
+def _count_memoized(family: str, text: str) -> int:
+    return get_tokenizer(family).count(text)
+
+def count_tokens(family: str, text: str) -> int:
+    """Token count memoized per short text, so history turns are only counted once"""
+    if len(text) > MEMO_MAX_CHARS:
+        return get_tokenizer(family).count(text)
+    return _count_memoized(family, text)
+
+class TokenBudget:
+    """Keeps prompts within each model's context window, minus a reserve for the reply"""
+
+    def __init__(self, local_models: Dict[str, Dict[str, Any]], cloud_models: Dict[str, Dict[str, Any]],
+                 budget_config: Dict[str, Any]):
+        self.local_models = local_models
+        self.cloud_models = cloud_models
+        self.enabled = budget_config.get("enabled", False)
+        self.response_reserve = budget_config.get("response_reserve", 1024)
+        self.default_context_length = budget_config.get("default_context_length", 4096)
+        self.trimmed_prompts = 0
+        self.rejected = 0
+
+    def family(self, model: str) -> str:
+        provider, _, model_name = model.partition(":")
+        config = self.cloud_models.get(provider, {}) if model_name else self.local_models.get(model, {})
+        return config.get("tokenizer", "llama")
+
+    def context_length(self, model: str) -> int:
+        provider, _, model_name = model.partition(":")
+        if model_name:
+            lengths = self.cloud_models.get(provider, {}).get("context_lengths", {})
+            return lengths.get(model_name, self.default_context_length)
+        return self.local_models.get(model, {}).get("context_length", self.default_context_length)
+
+    def limit(self, model: str) -> int:
+        """Prompt tokens a model can take while leaving room for its answer"""
+        return self.context_length(model) - self.response_reserve
+
+    def count(self, model: str, text: str) -> int:
+        return count_tokens(self.family(model), text)
+
+    def fits(self, model: str, text: str) -> bool:
+        return not self.enabled or self.count(model, text) <= self.limit(model)
+
+    def fitting_models(self, models: List[str], message: str) -> List[str]:
+        """Mapped models whose window can hold at least the new message"""
+        fitting = [model for model in models if self.fits(model, message)]
+        if not fitting:
+            self.rejected += 1
+        return fitting
+
+    def answer_tokens(self, options: Optional[Dict[str, Any]], default: int = 1024) -> int:
+        """Longest answer to allow: the client's num_predict, capped at the reserve the prompt left for it"""
+        requested = (options or {}).get("num_predict")
+        try:
+            requested = int(requested) if requested is not None else None
+        except (TypeError, ValueError):
+            requested = None
+        # Ollama reads non-positive num_predict as unlimited
+        if requested is not None and requested <= 0:
+            requested = None
+        if not self.enabled:
+            return requested or default
+        return min(requested or self.response_reserve, self.response_reserve)
+
+    def generate_options(self, model: str, options: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Ollama options with the budget applied over the client's, so num_ctx and num_predict cannot be raised"""
+        merged = dict(options or {})
+        # Without num_ctx Ollama silently truncates to its small default window
+        merged["num_ctx"] = self.context_length(model)
+        if self.enabled:
+            merged["num_predict"] = self.answer_tokens(options)
+        return merged
+
+    def session_prompt(self, model: str, session: SessionContext, message: str) -> Tuple[str, Optional[List[int]]]:
+        """Session prompt for a model, keeping only the newest turns that fit its window"""
+        prompt, context = session.prompt_for(model, message)
+        if not self.enabled:
+            return prompt, context
+        limit = self.limit(model)
+        # Ollama's context array is already tokenized
+        if context is not None and len(context) + self.count(model, message) <= limit:
+            return prompt, context
+
+        # Count per message so earlier turns hit the memo instead of recounting the transcript
+        family = self.family(model)
+        used = count_tokens(family, f"user: {message}\nassistant:")
+        kept = 0
+        for role, content in reversed(session.messages):
+            used += count_tokens(family, f"{role}: {content}\n")
+            if used > limit:
+                break
+            kept += 1
+        if kept < len(session.messages):
+            self.trimmed_prompts += 1
+        return session.transcript(message, kept), None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "response_reserve": self.response_reserve,
+            "trimmed_prompts": self.trimmed_prompts,
+            "rejected_requests": self.rejected,
+            "tokenizer_cache": _count_memoized.cache_info()._asdict()
+        }
@@ -0,0 +1,27 @@
+import hashlib
+import hmac
+import os
+import uuid
+from typing import Optional
+
+# Signs the user_id /agent/init_session hands to anonymous visitors; without one their ids are not trusted
+VISITOR_ID_SECRET = os.getenv("VISITOR_ID_SECRET") or os.getenv("SECRET_KEY", "")
+
+def _signature(visitor: str, secret: str) -> str:
+    return hmac.new(secret.encode("utf-8"), visitor.encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+
+def issue_visitor_id(secret: Optional[str] = None) -> str:
+    """A fresh anonymous id, signed as "<uuid>.<signature>" when a secret is configured"""
+    secret = VISITOR_ID_SECRET if secret is None else secret
+    visitor = str(uuid.uuid4())
+    return f"{visitor}.{_signature(visitor, secret)}" if secret else visitor
+
+def verify_visitor_id(token: Optional[str], secret: Optional[str] = None) -> Optional[str]:
+    """The visitor behind an id this server issued, or None for unsigned or forged ids"""
+    secret = VISITOR_ID_SECRET if secret is None else secret
+    if not secret or not isinstance(token, str):
+        return None
+    visitor, _, signature = token.rpartition(".")
+    if not visitor or not hmac.compare_digest(signature, _signature(visitor, secret)):
+        return None
+    return visitor
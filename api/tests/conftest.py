@@ -0,0 +1,178 @@
+"""
+Shared fixtures for the behaviour tests
+The model backend is fake_ollama.py running in a subprocess on free local ports, and
+the database is a throwaway SQLite file, so the suite runs without Ollama or Postgres.
+"""
+import asyncio
+import copy
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import httpx
+import pytest
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Must be set before database.py is imported
+_db_dir = tempfile.mkdtemp(prefix="onelastai-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{_db_dir}/test.db")
+os.environ.setdefault("SYNC_DATABASE_URL", f"sqlite:///{_db_dir}/test.db")
+
+# Fast and deterministic unless a test says otherwise
+FAKE_DEFAULTS = {
+    "token_rate": 1000.0,
+    "ttft": 0.01,
+    "ttft_jitter": 0.0,
+    "tokens": 8,
+    "error_rate": 0.0,
+    "mid_stream_error_rate": 0.0,
+    "hang_probability": 0.0,
+    "load_time": 0.0
+}
+
+def free_ports(count: int):
+    sockets = []
+    for _ in range(count):
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        sockets.append(sock)
+    ports = [sock.getsockname()[1] for sock in sockets]
+    for sock in sockets:
+        sock.close()
+    return ports
+
+def start_fake_ollama(ports):
+    """Start fake_ollama.py on the given ports and wait until every one answers"""
+    command = [sys.executable, "fake_ollama.py", "--ports", ",".join(str(port) for port in ports), "--seed", "1"]
+    for key, value in FAKE_DEFAULTS.items():
+        command += [f"--{key.replace('_', '-')}", str(value)]
+    process = subprocess.Popen(command, cwd=API_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 15
+    pending = list(ports)
+    while pending:
+        if process.poll() is not None or time.monotonic() > deadline:
+            process.kill()
+            raise RuntimeError(f"fake_ollama did not start on {pending}")
+        try:
+            httpx.get(f"http://127.0.0.1:{pending[0]}/api/version", timeout=0.5).raise_for_status()
+            pending.pop(0)
+        except httpx.HTTPError:
+            time.sleep(0.05)
+    return process
+
+class FakeOllama:
+    """Handle on the running fake backend; settings are per port and reset after every test"""
+
+    def __init__(self, ports):
+        self.ports = ports
+        self.urls = [f"http://127.0.0.1:{port}" for port in ports]
+
+    def configure(self, index: int, **settings):
+        httpx.post(f"{self.urls[index]}/fake/config", json=settings, timeout=5).raise_for_status()
+
+    def stats(self, index: int):
+        return httpx.get(f"{self.urls[index]}/fake/config", timeout=5).json()["stats"]
+
+    def reset(self):
+        for index in range(len(self.urls)):
+            self.configure(index, **FAKE_DEFAULTS)
+
+@pytest.fixture(scope="session", autouse=True)
+def database_tables():
+    import database
+    database.Base.metadata.create_all(database.sync_engine)
+
+@pytest.fixture
+def run():
+    """asyncio.run that also waits for background inserts and releases pooled DB connections before the loop closes"""
+    from database import async_engine
+    from services.interactions import interaction_recorder
+
+    def run_scenario(coro):
+        async def scenario():
+            try:
+                return await coro
+            finally:
+                await asyncio.gather(*interaction_recorder._pending, return_exceptions=True)
+                await async_engine.dispose()
+        return asyncio.run(scenario())
+    return run_scenario
+
+@pytest.fixture
+def metrics(monkeypatch):
+    """Fresh router latency metrics, so latency-driven decisions do not depend on earlier tests"""
+    import services.model_router
+    from services.model_metrics import ModelMetrics
+    fresh = ModelMetrics()
+    monkeypatch.setattr(services.model_router, "model_metrics", fresh)
+    return fresh
+
+@pytest.fixture(scope="session")
+def _fake_ollama_process():
+    ports = free_ports(3)
+    process = start_fake_ollama(ports)
+    yield FakeOllama(ports)
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+@pytest.fixture
+def fake_ollama(_fake_ollama_process):
+    yield _fake_ollama_process
+    _fake_ollama_process.reset()
+
+def merge(base, overrides):
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(base.get(key), dict):
+            merge(base[key], value)
+        else:
+            base[key] = value
+    return base
+
+def router_config(backend: FakeOllama, **overrides):
+    """Two local models on the fake backend, mapped to neochat in order phi4 then llama3_2"""
+    config = {
+        "ai_models": {
+            "local_models": {
+                "phi4": {
+                    "ollama_model": "phi4", "tokenizer": "phi", "context_length": 4096,
+                    "endpoint": backend.urls[0], "memory_requirement": "4GB"
+                },
+                "llama3_2": {
+                    "ollama_model": "llama3.2", "tokenizer": "llama", "context_length": 4096,
+                    "endpoint": backend.urls[1], "memory_requirement": "4GB"
+                }
+            },
+            "cloud_models": {}
+        },
+        "model_selection": {
+            "agent_mappings": {"neochat": ["phi4", "llama3_2"]},
+            "failover_timeout": 1,
+            "retry_attempts": 1,
+            "health_check_interval": 30
+        },
+        "resource_management": {
+            "request_timeout": 5,
+            "max_concurrent_requests": 2,
+            "max_queued_requests": 2,
+            "queue_timeout": 1
+        },
+        "monitoring": {
+            "error_handling": {"circuit_breaker_threshold": 3, "circuit_breaker_timeout": 300}
+        }
+    }
+    return merge(copy.deepcopy(config), overrides)
+
+@pytest.fixture
+def make_router(fake_ollama):
+    """Build a ModelRouter against the fake backend; call inside the test's event loop and close it there"""
+    from services.model_router import ModelRouter
+
+    def make(**overrides):
+        return ModelRouter(router_config(fake_ollama, **overrides))
+    return make
@@ -0,0 +1,95 @@
+import asyncio
+import time
+import pytest
+from fastapi import HTTPException
+from services.admission import ModelAdmission, ModelOverloaded
+
+def test_freed_slots_go_to_the_premium_lane_first():
+    async def scenario():
+        admission = ModelAdmission("phi4", max_concurrent=1, max_queued=5, queue_timeout=5)
+        await admission.acquire()
+        order = []
+
+        async def wait(name, premium):
+            await admission.acquire(premium)
+            order.append(name)
+
+        waiters = [asyncio.create_task(wait("standard", False)), asyncio.create_task(wait("premium", True))]
+        await asyncio.sleep(0)
+        assert admission.snapshot()["queued_premium"] == 1
+        admission.release()
+        await asyncio.sleep(0)
+        admission.release()
+        await asyncio.gather(*waiters)
+        return order, admission.active
+
+    assert asyncio.run(scenario()) == (["premium", "standard"], 1)
+
+def test_full_lane_is_rejected_and_a_long_wait_times_out():
+    async def scenario():
+        admission = ModelAdmission("phi4", max_concurrent=1, max_queued=1, queue_timeout=0.05)
+        await admission.acquire()
+        waiting = asyncio.create_task(admission.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(ModelOverloaded) as full:
+            await admission.acquire()
+        with pytest.raises(ModelOverloaded) as slow:
+            await waiting
+        # The premium lane has its own room
+        with pytest.raises(ModelOverloaded):
+            await admission.acquire(premium=True, timeout=0.01)
+        return full.value, slow.value, admission
+
+    full, slow, admission = asyncio.run(scenario())
+    assert full.reason == "queue is full" and full.retry_after >= 1
+    assert slow.reason == "queue wait timed out"
+    assert (admission.rejected, admission.timed_out, admission.queued) == (1, 2, 0)
+
+def test_a_waiter_cancelled_as_it_is_handed_a_slot_gives_it_back():
+    async def scenario():
+        admission = ModelAdmission("phi4", max_concurrent=1, max_queued=5, queue_timeout=5)
+        await admission.acquire()
+        waiter = asyncio.create_task(admission.acquire())
+        await asyncio.sleep(0)
+        admission.release()
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return admission.active
+
+    assert asyncio.run(scenario()) == 0
+
+def test_a_waiter_timing_out_as_it_is_handed_a_slot_gives_it_back():
+    async def scenario():
+        admission = ModelAdmission("phi4", max_concurrent=1, max_queued=5, queue_timeout=5)
+        await admission.acquire()
+        waiter = asyncio.create_task(admission.acquire(timeout=0.05))
+        await asyncio.sleep(0)
+        # Stall the loop past the deadline so the timeout and the hand-off land in one pass
+        time.sleep(0.1)
+        await asyncio.sleep(0)
+        admission.release()
+        with pytest.raises(ModelOverloaded):
+            await waiter
+        return admission.active, admission.timed_out
+
+    assert asyncio.run(scenario()) == (0, 1)
+
+def test_router_sheds_load_with_429_and_retry_after_when_every_model_is_full(make_router, fake_ollama, run):
+    for index in (0, 1):
+        fake_ollama.configure(index, ttft=0.5)
+
+    async def scenario():
+        router = make_router(resource_management={"max_concurrent_requests": 1, "max_queued_requests": 0})
+        results = await asyncio.gather(*(router.generate("neochat", f"question {i}") for i in range(3)),
+                                       return_exceptions=True)
+        await router.close()
+        return results
+
+    results = run(scenario())
+    answered = sorted(result["model"] for result in results if isinstance(result, dict))
+    shed = [result for result in results if isinstance(result, HTTPException)]
+    assert answered == ["llama3_2", "phi4"]
+    assert len(shed) == 1
+    assert shed[0].status_code == 429
+    assert int(shed[0].headers["Retry-After"]) >= 1
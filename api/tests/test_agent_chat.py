@@ -0,0 +1,134 @@
+import json
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+from services import agent_chat as agent_chat_module
+
+def chat_client(router, monkeypatch) -> httpx.AsyncClient:
+    """Client for a bare app exposing agent_chat, routed through the given ModelRouter"""
+    monkeypatch.setattr(agent_chat_module, "model_router", router)
+    app = FastAPI()
+
+    @app.post("/chat/{agent_name}")
+    async def chat(request: Request, agent_name: str):
+        return await agent_chat_module.agent_chat(request, agent_name)
+
+    @app.post("/chat/{agent_name}/stream")
+    async def chat_stream(request: Request, agent_name: str):
+        return await agent_chat_module.agent_chat_stream(request, agent_name)
+
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+def test_chat_is_answered_by_the_first_mapped_model(make_router, monkeypatch, run):
+    async def scenario():
+        router = make_router()
+        async with chat_client(router, monkeypatch) as client:
+            response = await client.post("/chat/neochat", json={"message": "hello there"})
+        await router.close()
+        return response
+
+    response = run(scenario())
+    assert response.status_code == 200
+    body = response.json()
+    assert body["model"] == "phi4"
+    assert body["response"]
+    assert body["tokens_used"] > 0
+
+def test_chat_falls_back_to_the_next_mapped_model(make_router, fake_ollama, monkeypatch, run):
+    fake_ollama.configure(0, error_rate=1.0)
+
+    async def scenario():
+        router = make_router()
+        async with chat_client(router, monkeypatch) as client:
+            response = await client.post("/chat/neochat", json={"message": "hello there"})
+        await router.close()
+        return response
+
+    response = run(scenario())
+    assert response.status_code == 200
+    assert response.json()["model"] == "llama3_2"
+
+def test_unmapped_agent_is_not_found(make_router, monkeypatch, run):
+    async def scenario():
+        router = make_router()
+        async with chat_client(router, monkeypatch) as client:
+            response = await client.post("/chat/nobody", json={"message": "hello"})
+        await router.close()
+        return response
+
+    assert run(scenario()).status_code == 404
+
+@pytest.mark.parametrize("body", [
+    b"not json",
+    b"[1, 2, 3]",
+    b'"just a string"',
+    b'{"message": ""}',
+    b'{"message": "hi", "options": "x"}',
+    b'{"message": "hi", "options": [1]}'
+])
+def test_bad_chat_payloads_are_rejected_with_400(make_router, monkeypatch, body, run):
+    async def scenario():
+        router = make_router()
+        async with chat_client(router, monkeypatch) as client:
+            response = await client.post("/chat/neochat", content=body, headers={"Content-Type": "application/json"})
+        await router.close()
+        return response
+
+    assert run(scenario()).status_code == 400
+
+def sse_events(body: str):
+    """(event, data) pairs from a Server-Sent Events body"""
+    events = []
+    for frame in body.strip().split("\n\n"):
+        name, data = frame.split("\n")
+        events.append((name[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+def test_stream_sends_start_tokens_and_done_as_server_sent_events(make_router, monkeypatch, run):
+    async def scenario():
+        router = make_router()
+        async with chat_client(router, monkeypatch) as client:
+            response = await client.post("/chat/neochat/stream", json={"message": "hello there"})
+        await router.close()
+        return response
+
+    response = run(scenario())
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = sse_events(response.text)
+    names = [name for name, _ in events]
+    assert names[0] == "start" and names[-1] == "done"
+    assert names.count("token") == 8
+    assert events[0][1]["model"] == "phi4"
+    assert events[-1][1]["tokens_used"] > 0
+
+def test_stream_failing_before_its_first_token_gets_a_status_code(make_router, fake_ollama, monkeypatch, run):
+    for index in (0, 1):
+        fake_ollama.configure(index, error_rate=1.0)
+
+    async def scenario():
+        router = make_router()
+        async with chat_client(router, monkeypatch) as client:
+            response = await client.post("/chat/neochat/stream", json={"message": "hello there"})
+        await router.close()
+        return response
+
+    response = run(scenario())
+    assert response.status_code == 503
+    assert not response.headers["content-type"].startswith("text/event-stream")
+
+def test_stream_failing_mid_answer_ends_with_an_error_event(make_router, fake_ollama, monkeypatch, run):
+    fake_ollama.configure(0, mid_stream_error_rate=1.0)
+
+    async def scenario():
+        router = make_router()
+        async with chat_client(router, monkeypatch) as client:
+            response = await client.post("/chat/neochat/stream", json={"message": "hello there"})
+        await router.close()
+        return response
+
+    response = run(scenario())
+    assert response.status_code == 200
+    events = sse_events(response.text)
+    assert events[0][0] == "start" and events[-1][0] == "error"
+    assert "done" not in [name for name, _ in events]
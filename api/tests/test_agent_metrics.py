@@ -0,0 +1,69 @@
+import asyncio
+import time
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from database import AgentPerformance, sync_engine
+from services.agent_metrics import AgentMetrics, AgentSamples
+
+def test_ring_overwrites_the_oldest_turn_and_windows_walk_back_from_the_newest():
+    samples = AgentSamples(3)
+    now = time.time()
+    for age, seconds, ok in ((40, 1.0, True), (30, 2.0, False), (20, 3.0, True), (10, 4.0, True)):
+        samples.record(now - age, seconds, ok)
+    assert samples.count == 3
+    assert samples.last_finished() == now - 10
+    assert samples.window(now - 60) == {"turns": 3, "busy": 9.0, "succeeded": 2}
+    assert samples.window(now - 25) == {"turns": 2, "busy": 7.0, "succeeded": 2}
+
+def test_turns_count_successes_and_failures_but_not_cancellations():
+    metrics = AgentMetrics()
+    with metrics.turn("neochat"):
+        pass
+    for error in (RuntimeError("model down"), HTTPException(status_code=503)):
+        with pytest.raises(type(error)):
+            with metrics.turn("neochat"):
+                raise error
+    for error in (asyncio.CancelledError(), HTTPException(status_code=429)):
+        with pytest.raises(type(error)):
+            with metrics.turn("neochat"):
+                raise error
+
+    samples = metrics.samples("neochat")
+    assert samples.in_flight == 0
+    assert samples.window(0) == {"turns": 3, "busy": pytest.approx(0, abs=0.1), "succeeded": 1}
+
+def test_snapshot_reports_window_stats_and_idle_agents():
+    metrics = AgentMetrics({"monitoring": {"agent_metrics": {"window": 60}}})
+    now = time.time()
+    samples = metrics.samples("neochat")
+    for seconds, ok in ((0.2, True), (0.4, True), (0.6, False)):
+        samples.record(now, seconds, ok)
+    busy = metrics.turn("neochat")
+
+    stats = metrics.snapshot(["memora"])
+    busy.finish()
+    assert stats["memora"]["status"] == "idle"
+    assert stats["memora"]["response_time"] is None
+    neochat = stats["neochat"]
+    assert neochat["status"] == "busy" and neochat["in_flight"] == 1
+    assert neochat["response_time"] == pytest.approx(400)
+    assert neochat["success_rate"] == pytest.approx(200 / 3)
+    assert neochat["requests_per_minute"] == 3
+
+def test_active_agents_are_persisted_in_one_batch(run):
+    metrics = AgentMetrics({"monitoring": {"agent_metrics": {"persist_interval": 0}}})
+
+    async def scenario():
+        with metrics.turn("persisted-agent"):
+            pass
+        stats = metrics.snapshot(["idle-agent"])
+        metrics.maybe_persist(stats)
+        await metrics._persisting
+
+    run(scenario())
+    assert metrics.persisted_rows == 1 and metrics.persist_failures == 0
+    with Session(sync_engine) as db:
+        statuses = db.execute(select(AgentPerformance.status)).scalars().all()
+    assert "active" in statuses
@@ -0,0 +1,144 @@
+import asyncio
+import os
+import socket
+import sys
+from conftest import API_DIR, FAKE_DEFAULTS
+
+def worker_command():
+    command = [sys.executable, os.path.join(API_DIR, "fake_ollama.py"), "--ports", "{port}"]
+    for key, value in FAKE_DEFAULTS.items():
+        command += [f"--{key.replace('_', '-')}", str(value)]
+    return command
+
+def autoscaling(tmp_path, memory_budget="12GB", **overrides):
+    settings = {
+        "enabled": True, "check_interval": 0.1, "port_range_start": 0,
+        "worker_command": worker_command(), "lock_file": str(tmp_path / "autoscaler.lock")
+    }
+    return {"resource_management": {
+        "model_warmup_time": 15,
+        "residency": {"enabled": True, "memory_budget": memory_budget},
+        "auto_scaling": {**settings, **overrides}
+    }}
+
+def listening_port():
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+    return server
+
+def test_scale_up_is_refused_when_another_copy_would_exceed_the_memory_budget(make_router, run, tmp_path):
+    from services.autoscaler import ModelAutoscaler
+
+    async def scenario():
+        router = make_router(**autoscaling(tmp_path, memory_budget="8GB"))
+        router.residency.mark_resident("phi4")
+        router.residency.mark_resident("llama3_2")
+        autoscaler = ModelAutoscaler(router)
+        worker = await autoscaler.scale_up("phi4")
+        await router.close()
+        return worker, autoscaler
+
+    worker, autoscaler = run(scenario())
+    assert worker is None
+    assert autoscaler.failed_starts == 0
+    assert autoscaler.instances("phi4") == 1
+
+def test_worker_memory_stays_reserved_until_it_stops(make_router, run, tmp_path):
+    from services.autoscaler import ModelAutoscaler
+
+    async def scenario():
+        router = make_router(**autoscaling(tmp_path))
+        router.residency.mark_resident("phi4")
+        autoscaler = ModelAutoscaler(router)
+        server = listening_port()
+        autoscaler.port_range_start = server.getsockname()[1] + 1
+        worker = await autoscaler.scale_up("phi4")
+        try:
+            assert worker is not None
+            assert autoscaler.instances("phi4") == 2
+            # The worker's 4GB counts against the budget alongside phi4's
+            assert router.residency.used_memory == 8 * 1024 ** 3
+            assert router.residency.victims_for("llama3_2") == []
+            router.residency.mark_resident("llama3_2")
+            assert not router.residency.admits("phi4")
+            assert await autoscaler.scale_up("phi4") is None
+            await autoscaler.scale_down("phi4")
+            assert worker.process.returncode is not None
+            assert autoscaler.instances("phi4") == 1
+            assert router.residency.reserved == {}
+        finally:
+            server.close()
+            await autoscaler.shutdown()
+            await router.close()
+
+    run(scenario())
+
+def test_only_the_lock_holder_scales_and_the_others_follow_its_workers(make_router, run, tmp_path):
+    from services.autoscaler import ModelAutoscaler
+
+    async def scenario():
+        leader_router, follower_router = make_router(**autoscaling(tmp_path)), make_router(**autoscaling(tmp_path))
+        leader, follower = ModelAutoscaler(leader_router), ModelAutoscaler(follower_router)
+        server = listening_port()
+        leader.port_range_start = server.getsockname()[1] + 1
+        try:
+            assert leader.acquire_leadership()
+            assert not follower.acquire_leadership()
+            worker = await leader.scale_up("phi4")
+            await follower.follow()
+            assert follower.followed["phi4"] == [worker.endpoint]
+            assert worker.endpoint in [replica.endpoint for replica in follower_router.replicas["phi4"].replicas]
+            assert follower_router.residency.reserved == {worker.endpoint: 4 * 1024 ** 3}
+
+            await leader.shutdown()
+            await follower.follow()
+            assert follower.followed["phi4"] == []
+            assert follower_router.residency.reserved == {}
+            # The lock is free again once the leader has shut down
+            assert follower.acquire_leadership()
+        finally:
+            server.close()
+            await leader.shutdown()
+            await follower.shutdown()
+            await leader_router.close()
+            await follower_router.close()
+
+    run(scenario())
+
+def test_free_port_gives_up_after_the_port_range(make_router, run, tmp_path):
+    from services.autoscaler import ModelAutoscaler
+
+    async def scenario():
+        router = make_router(**autoscaling(tmp_path))
+        autoscaler = ModelAutoscaler(router)
+        server = listening_port()
+        autoscaler.port_range_start, autoscaler.port_range_size = server.getsockname()[1], 1
+        try:
+            port = await asyncio.to_thread(autoscaler.free_port)
+            worker = await autoscaler.scale_up("phi4")
+        finally:
+            server.close()
+            await router.close()
+        return port, worker, autoscaler.failed_starts
+
+    assert run(scenario()) == (None, None, 1)
+
+def test_free_port_skips_a_port_held_by_an_outgoing_connection(make_router, run, tmp_path):
+    from services.autoscaler import ModelAutoscaler
+
+    async def scenario():
+        router = make_router(**autoscaling(tmp_path))
+        autoscaler = ModelAutoscaler(router)
+        server = listening_port()
+        client = socket.create_connection(server.getsockname())
+        # Nothing listens on the client's local port, but a worker could not bind it either
+        autoscaler.port_range_start, autoscaler.port_range_size = client.getsockname()[1], 1
+        try:
+            return await asyncio.to_thread(autoscaler.free_port)
+        finally:
+            client.close()
+            server.close()
+            await router.close()
+
+    assert run(scenario()) is None
@@ -0,0 +1,69 @@
+import time
+from services.circuit_breaker import CircuitBreaker
+
+def test_breaker_opens_after_threshold_and_lets_one_trial_through(monkeypatch):
+    breaker = CircuitBreaker("phi4", threshold=3, reset_timeout=300)
+    for _ in range(3):
+        assert breaker.allow_request()
+        breaker.record_failure("timeout")
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+    opened_at = breaker.opened_at
+    monkeypatch.setattr(time, "monotonic", lambda: opened_at + 301)
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.consecutive_failures == 0
+
+def test_failed_half_open_trial_reopens(monkeypatch):
+    breaker = CircuitBreaker("phi4", threshold=1, reset_timeout=10)
+    breaker.record_failure("boom")
+    opened_at = breaker.opened_at
+    monkeypatch.setattr(time, "monotonic", lambda: opened_at + 11)
+    assert breaker.allow_request()
+    breaker.record_failure("still broken")
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.opened_at == opened_at + 11
+
+def test_probe_does_not_close_a_breaker_tripped_by_hanging_generation(make_router, fake_ollama, run):
+    # phi4 answers /api/version but every generation hangs
+    fake_ollama.configure(0, hang_probability=1.0)
+
+    async def scenario():
+        router = make_router(model_selection={"failover_timeout": 0.2})
+        for i in range(3):
+            result = await router.generate("neochat", f"question {i}")
+            assert result["model"] == "llama3_2"
+        breaker = router.get_breaker("phi4")
+        assert breaker.state == CircuitBreaker.OPEN
+
+        await router.probe_model("phi4")
+        state, failures = breaker.state, breaker.consecutive_failures
+
+        # With the breaker still open the next caller skips phi4 instead of waiting out its timeout
+        start = time.perf_counter()
+        result = await router.generate("neochat", "question after probe")
+        elapsed = time.perf_counter() - start
+        await router.close()
+        return state, failures, result["model"], elapsed
+
+    state, failures, model, elapsed = run(scenario())
+    assert state == CircuitBreaker.OPEN
+    assert failures == 3
+    assert model == "llama3_2"
+    assert elapsed < 0.2
+
+def test_probe_trips_the_breaker_of_an_unreachable_model(make_router, run):
+    async def scenario():
+        router = make_router(ai_models={"local_models": {"phi4": {"endpoint": "http://127.0.0.1:9"}}})
+        await router.probe_model("phi4")
+        state = router.get_breaker("phi4").state
+        healthy = router.replicas["phi4"].replicas[0].healthy
+        await router.close()
+        return state, healthy
+
+    assert run(scenario()) == (CircuitBreaker.OPEN, False)
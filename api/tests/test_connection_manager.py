@@ -0,0 +1,154 @@
+import asyncio
+import json
+from websockets.connection_manager import ClientConnection, ConnectionManager
+from websockets.frames import Frame
+
+class StalledSocket:
+    """A client that takes no frames until released, then records them"""
+
+    def __init__(self):
+        self.sent = []
+        self.released = asyncio.Event()
+        self.close_code = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        await self.released.wait()
+        self.sent.append(json.loads(message))
+
+    async def close(self, code: int = 1000):
+        self.close_code = code
+
+class BrokenSocket(StalledSocket):
+    async def send_text(self, message: str):
+        raise ConnectionResetError("client went away")
+
+class Failures:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, websocket, slow: bool):
+        self.calls.append(slow)
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+def test_coalesce_keeps_only_the_newest_keyed_frame_in_order():
+    async def scenario():
+        socket = StalledSocket()
+        client = ClientConnection(socket, Failures(), max_queue=2, policy=ClientConnection.COALESCE)
+        client.offer(Frame({"n": 0}))
+        await settle()  # The writer is now blocked sending frame 0
+        for n in range(1, 4):
+            client.offer(Frame({"tick": n}), key="tick")
+        client.offer(Frame({"n": 4}))
+        client.offer(Frame({"n": 5}))
+        socket.released.set()
+        await settle()
+        client.close()
+        return socket.sent, client.coalesced, client.dropped
+
+    sent, coalesced, dropped = asyncio.run(scenario())
+    # tick 3 replaced ticks 1 and 2 in place, then fell out of the full queue
+    assert sent == [{"n": 0}, {"n": 4}, {"n": 5}]
+    assert (coalesced, dropped) == (2, 1)
+
+def test_drop_oldest_bounds_the_queue():
+    async def scenario():
+        socket = StalledSocket()
+        client = ClientConnection(socket, Failures(), max_queue=3, policy=ClientConnection.DROP_OLDEST)
+        client.offer(Frame({"n": 0}))
+        await settle()
+        for n in range(1, 10):
+            assert client.offer(Frame({"n": n}), key="same")
+        depth = len(client.queue)
+        socket.released.set()
+        await settle()
+        client.close()
+        return depth, socket.sent, client.dropped
+
+    depth, sent, dropped = asyncio.run(scenario())
+    assert depth == 3
+    assert sent == [{"n": 0}, {"n": 7}, {"n": 8}, {"n": 9}]
+    assert dropped == 6
+
+def test_disconnect_policy_cuts_a_client_that_falls_behind():
+    async def scenario():
+        socket, failures = StalledSocket(), Failures()
+        client = ClientConnection(socket, failures, max_queue=1, policy=ClientConnection.DISCONNECT)
+        client.offer("0")
+        await settle()
+        results = [client.offer("1"), client.offer("2"), client.offer("3")]
+        await settle()
+        return results, failures.calls, socket.close_code, client.writer.cancelled()
+
+    results, failures, close_code, writer_cancelled = asyncio.run(scenario())
+    assert results == [True, False, False]
+    assert failures == [True]
+    assert close_code == 1013
+    assert writer_cancelled
+
+def test_a_send_that_times_out_or_fails_drops_the_client():
+    async def scenario():
+        stalled, broken = StalledSocket(), BrokenSocket()
+        manager = ConnectionManager()
+        await manager.connect(stalled, "neochat")
+        await manager.connect(broken, "neochat")
+        manager.clients[stalled].send_timeout = 0.05
+        await manager.broadcast_to_agent(Frame({"n": 1}), "neochat", local_only=True)
+        await asyncio.sleep(0.1)
+        return manager.connection_count(), manager.connection_count("neochat"), manager.slow_disconnects
+
+    assert asyncio.run(scenario()) == (0, 0, 0)
+
+def test_a_stalled_client_does_not_hold_up_the_others():
+    async def scenario():
+        manager = ConnectionManager()
+        stalled, fast = StalledSocket(), StalledSocket()
+        fast.released.set()
+        await manager.connect(stalled, "neochat")
+        await manager.connect(fast, "neochat")
+        for n in range(200):
+            await manager.broadcast_to_agent(Frame({"n": n}), "neochat", local_only=True)
+            await asyncio.sleep(0)
+        await settle()
+        stats = manager.stats()
+        for socket in (stalled, fast):
+            manager.disconnect(socket)
+        return len(fast.sent), len(stalled.sent), stats
+
+    fast_sent, stalled_sent, stats = asyncio.run(scenario())
+    assert fast_sent == 200
+    assert stalled_sent == 0
+    assert stats["deepest_queue"] <= stats["max_queue"]
+    assert stats["dropped"] > 0
+
+def test_registry_tracks_subscriptions_and_refreshes_snapshots_on_change():
+    async def scenario():
+        manager = ConnectionManager()
+        first, second = StalledSocket(), StalledSocket()
+        await manager.connect(first, "neochat")
+        snapshot = manager.connections("neochat")
+        assert manager.connections("neochat") is snapshot
+
+        await manager.connect(second)
+        manager.subscribe(second, "neochat")
+        manager.subscribe(second, "memora")
+        assert len(manager.connections("neochat")) == 2
+        assert manager.connections("neochat") is not snapshot
+        assert manager.agent_channel("memora") in manager.broker.watched
+
+        manager.disconnect(second)
+        manager.disconnect(second)  # Already gone: a no-op
+        counts = (manager.connection_count(), manager.connection_count("neochat"), manager.connection_count("memora"))
+        memora_watched = manager.agent_channel("memora") in manager.broker.watched
+        manager.disconnect(first)
+        return counts, memora_watched, manager.agent_connections, manager.clients
+
+    counts, memora_watched, agent_connections, clients = asyncio.run(scenario())
+    assert counts == (1, 1, 0)
+    assert not memora_watched
+    assert agent_connections == {} and clients == {}
@@ -0,0 +1,67 @@
+import time
+import pytest
+from fastapi import HTTPException
+from services.deadline import Deadline
+
+def test_stage_timeouts_are_cut_short_by_the_deadline():
+    deadline = Deadline(0.5)
+    assert deadline.timeout(10) <= 0.5
+    assert deadline.timeout(0.1) == 0.1
+    assert deadline.allows(0.1) and not deadline.allows(1)
+    assert Deadline(0).expired()
+
+def test_hung_models_get_a_504_at_the_deadline_without_tripping_breakers(make_router, fake_ollama, run, metrics):
+    for index in (0, 1):
+        fake_ollama.configure(index, hang_probability=1.0)
+
+    async def scenario():
+        router = make_router(
+            model_selection={"failover_timeout": 10, "retry_attempts": 3, "min_attempt_time": 0.1},
+            resource_management={"request_timeout": 0.6}
+        )
+        start = time.perf_counter()
+        with pytest.raises(HTTPException) as error:
+            await router.generate("neochat", "question")
+        elapsed = time.perf_counter() - start
+        failures = [router.get_breaker(model).consecutive_failures for model in ("phi4", "llama3_2")]
+        await router.close()
+        return error.value, elapsed, failures
+
+    error, elapsed, failures = run(scenario())
+    assert error.status_code == 504
+    assert elapsed < 1.5
+    assert failures == [0, 0]
+    assert metrics.deadline_misses["request"] == 1
+
+def test_a_fallback_that_cannot_finish_in_time_is_skipped(make_router, fake_ollama, run, metrics):
+    fake_ollama.configure(0, error_rate=1.0)
+    # llama3_2 usually takes longer than the whole budget
+    for _ in range(5):
+        metrics.record_model_latency("llama3_2", 3.0)
+    llama_requests = fake_ollama.stats(1)["requests"]
+
+    async def scenario():
+        router = make_router(model_selection={"min_attempt_time": 0.1}, resource_management={"request_timeout": 1})
+        with pytest.raises(HTTPException) as error:
+            await router.generate("neochat", "question")
+        await router.close()
+        return error.value
+
+    assert run(scenario()).status_code == 504
+    assert fake_ollama.stats(1)["requests"] == llama_requests
+    assert metrics.deadline_misses["fallback"] == 1
+
+def test_stream_ends_with_an_error_event_when_the_deadline_passes_mid_answer(make_router, fake_ollama, run, metrics):
+    fake_ollama.configure(0, tokens=100, token_rate=20.0)
+
+    async def scenario():
+        router = make_router(model_selection={"min_attempt_time": 0.1}, resource_management={"request_timeout": 0.5})
+        events = [event async for event in router.stream("neochat", "question")]
+        await router.close()
+        return events
+
+    events = run(scenario())
+    assert events[0]["type"] == "start"
+    assert 0 < sum(event["type"] == "token" for event in events) < 100
+    assert events[-1] == {"type": "error", "model": "phi4", "detail": "Deadline exceeded"}
+    assert metrics.deadline_misses["stream"] == 1
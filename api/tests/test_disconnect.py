@@ -0,0 +1,119 @@
+import asyncio
+import json
+import time
+import pytest
+from fastapi import HTTPException, Request
+from services import agent_chat as agent_chat_module
+from services.agent_metrics import AgentMetrics
+
+def chat_request(message: str, disconnect_after: float = None) -> Request:
+    """A chat request whose client leaves disconnect_after seconds after sending it, or never"""
+    body = json.dumps({"message": message}).encode("utf-8")
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        if disconnect_after is None:
+            await asyncio.Event().wait()
+        await asyncio.sleep(disconnect_after)
+        return {"type": "http.disconnect"}
+
+    scope = {"type": "http", "method": "POST", "path": "/", "query_string": b"",
+             "headers": [(b"content-type", b"application/json")]}
+    return Request(scope, receive)
+
+@pytest.fixture
+def chat(make_router, monkeypatch, metrics):
+    """Point agent_chat at a router on the fake backend, with fresh metrics"""
+    monkeypatch.setattr(agent_chat_module, "model_metrics", metrics)
+    monkeypatch.setattr(agent_chat_module, "agent_metrics", AgentMetrics())
+
+    def router():
+        model_router = make_router()
+        monkeypatch.setattr(agent_chat_module, "model_router", model_router)
+        return model_router
+    return router
+
+def test_disconnect_cancels_the_model_call_and_answers_499(chat, fake_ollama, run, metrics):
+    fake_ollama.configure(0, hang_probability=1.0)
+
+    async def scenario():
+        router = chat()
+        start = time.perf_counter()
+        with pytest.raises(HTTPException) as error:
+            await agent_chat_module.agent_chat(chat_request("hello", disconnect_after=0.1), "neochat")
+        elapsed = time.perf_counter() - start
+        await asyncio.sleep(0.05)
+        active = router.admission["phi4"].active
+        samples = agent_chat_module.agent_metrics.samples("neochat")
+        await router.close()
+        return error.value.status_code, elapsed, active, samples
+
+    status, elapsed, active, samples = run(scenario())
+    assert status == 499
+    assert elapsed < 0.5
+    assert active == 0
+    assert metrics.cancelled == {"http": 1}
+    # An abandoned turn is neither a success nor a failure of the agent
+    assert (samples.in_flight, samples.count) == (0, 0)
+
+def test_closing_an_sse_stream_cancels_the_model(chat, fake_ollama, run, metrics):
+    fake_ollama.configure(0, tokens=200, token_rate=50.0)
+
+    async def scenario():
+        router = chat()
+        response = await agent_chat_module.agent_chat_stream(chat_request("hello"), "neochat")
+        frames = []
+        async for frame in response.body_iterator:
+            frames.append(frame)
+            if len(frames) == 4:
+                break
+        # What Starlette does when the client goes away mid-stream
+        await response.body_iterator.aclose()
+        await asyncio.sleep(0.05)
+        tokens = fake_ollama.stats(0)["tokens"]
+        await asyncio.sleep(0.2)
+        active = router.admission["phi4"].active
+        await router.close()
+        return frames, tokens, fake_ollama.stats(0)["tokens"], active
+
+    frames, tokens_at_close, tokens_later, active = run(scenario())
+    assert frames[0].startswith("event: start")
+    assert metrics.cancelled == {"sse": 1}
+    assert metrics.cancelled_tokens == 3
+    assert active == 0
+    # The fake stopped generating once the upstream request was closed
+    assert tokens_later == tokens_at_close
+
+def test_an_sse_stream_whose_client_left_before_the_body_still_settles(chat, fake_ollama, run):
+    fake_ollama.configure(0, tokens=200, token_rate=50.0)
+
+    async def scenario():
+        router = chat()
+        request = chat_request("hello")
+        response = await agent_chat_module.agent_chat_stream(request, "neochat")
+
+        async def gone():
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            # The socket never drains, so the body is not iterated before the disconnect lands
+            await asyncio.Event().wait()
+
+        # Starlette cancels the response and then runs its background task
+        await response(request.scope, gone, send)
+        await asyncio.sleep(0.05)
+        tokens = fake_ollama.stats(0)["tokens"]
+        await asyncio.sleep(0.2)
+        active = router.admission["phi4"].active
+        samples = agent_chat_module.agent_metrics.samples("neochat")
+        await router.close()
+        return tokens, fake_ollama.stats(0)["tokens"], active, samples
+
+    tokens_at_close, tokens_later, active, samples = run(scenario())
+    assert active == 0
+    assert (samples.in_flight, samples.count) == (0, 0)
+    assert tokens_later == tokens_at_close
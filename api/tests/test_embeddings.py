@@ -0,0 +1,80 @@
+import asyncio
+import pytest
+from services.embeddings import EmbeddingService
+
+def embeddings(fake_ollama, **overrides):
+    return {"embeddings": {"endpoint": fake_ollama.urls[2], "max_wait_ms": 20, **overrides}}
+
+def test_concurrent_callers_share_one_batch_in_input_order(make_router, fake_ollama, run):
+    requests = fake_ollama.stats(2)["requests"]
+
+    async def scenario():
+        router = make_router(**embeddings(fake_ollama))
+        service = EmbeddingService(router)
+        first, second = await asyncio.gather(service.embed(["a", "b"]), service.embed(["c", "a"]))
+        again = await service.embed(["b"])
+        await router.close()
+        return first, second, again, service.stats()
+
+    first, second, again, stats = run(scenario())
+    assert len(first[0]) == 768
+    # The fake's vectors are deterministic per text
+    assert second[1] == first[0] and again[0] == first[1]
+    assert fake_ollama.stats(2)["requests"] == requests + 1
+    assert (stats["embedded"], stats["coalesced"], stats["cache_hits"]) == (3, 1, 1)
+    assert stats["batch_size"]["count"] == 1
+
+def test_batches_are_split_at_max_batch(make_router, fake_ollama, run):
+    requests = fake_ollama.stats(2)["requests"]
+
+    async def scenario():
+        router = make_router(**embeddings(fake_ollama, max_batch=4))
+        service = EmbeddingService(router)
+        vectors = await service.embed([f"text {n}" for n in range(10)])
+        await router.close()
+        return vectors
+
+    assert len(run(scenario())) == 10
+    assert fake_ollama.stats(2)["requests"] == requests + 3
+
+def test_a_failed_batch_fails_its_callers_and_is_not_cached(make_router, fake_ollama, run):
+    fake_ollama.configure(2, error_rate=1.0)
+
+    async def scenario():
+        router = make_router(**embeddings(fake_ollama))
+        service = EmbeddingService(router)
+        with pytest.raises(Exception):
+            await service.embed(["a"])
+        await asyncio.to_thread(fake_ollama.configure, 2, error_rate=0.0)
+        vectors = await service.embed(["a"])
+        await router.close()
+        return vectors, service.stats()
+
+    vectors, stats = run(scenario())
+    assert len(vectors) == 1
+    assert (stats["failed_batches"], stats["embedded"], stats["cache_hits"]) == (1, 1, 0)
+
+def test_a_cancelled_batch_cancels_its_callers_and_frees_their_texts(make_router, fake_ollama, run):
+    fake_ollama.configure(2, hang_probability=1.0)
+
+    async def scenario():
+        router = make_router(**embeddings(fake_ollama))
+        service = EmbeddingService(router)
+        caller = asyncio.create_task(service.embed(["a"]))
+        while not service._batches:
+            await asyncio.sleep(0.01)
+        for batch in list(service._batches):
+            batch.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            # Bounded, since a caller left waiting on its batch would hang here
+            async with asyncio.timeout(5):
+                await caller
+        in_flight = dict(service._in_flight)
+        await asyncio.to_thread(fake_ollama.configure, 2, hang_probability=0.0)
+        vectors = await service.embed(["a"])
+        await router.close()
+        return in_flight, vectors
+
+    in_flight, vectors = run(scenario())
+    assert in_flight == {}
+    assert len(vectors) == 1
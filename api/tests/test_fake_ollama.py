@@ -0,0 +1,40 @@
+import signal
+import socket
+import subprocess
+import sys
+import httpx
+from conftest import API_DIR, free_ports, start_fake_ollama
+
+def listening(port: int) -> bool:
+    with socket.socket() as sock:
+        return sock.connect_ex(("127.0.0.1", port)) == 0
+
+def test_sigterm_stops_every_port():
+    ports = free_ports(3)
+    process = start_fake_ollama(ports)
+    process.send_signal(signal.SIGTERM)
+    assert process.wait(timeout=10) == 0
+    assert not any(listening(port) for port in ports)
+
+def test_a_port_that_cannot_be_bound_stops_the_others():
+    taken = socket.socket()
+    taken.bind(("127.0.0.1", 0))
+    taken.listen()
+    free = free_ports(1)[0]
+    process = subprocess.Popen(
+        [sys.executable, "fake_ollama.py", "--ports", f"{free},{taken.getsockname()[1]}"],
+        cwd=API_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        assert process.wait(timeout=10) == 1
+        assert not listening(free)
+    finally:
+        process.kill()
+        taken.close()
+
+def test_fake_generate_streams_the_configured_tokens(fake_ollama):
+    fake_ollama.configure(0, tokens=5)
+    with httpx.stream("POST", f"{fake_ollama.urls[0]}/api/generate", json={"model": "phi4", "prompt": "hi"}) as response:
+        lines = [line for line in response.iter_lines() if line]
+    assert len(lines) == 6
+    assert '"done": true' in lines[-1]
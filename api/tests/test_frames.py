@@ -0,0 +1,24 @@
+import json
+from datetime import datetime
+from websockets import frames
+from websockets.frames import Frame, encode_frame, frame_text
+
+def test_frame_is_compact_json_with_iso_datetimes():
+    when = datetime(2024, 5, 1, 12, 30, 15, 250000)
+    frame = Frame({"type": "agent_performance", "agent": "neochat", "at": when, "reply": "héllo ✓", 1: "x"})
+    assert frame.text == '{"type":"agent_performance","agent":"neochat","at":"2024-05-01T12:30:15.250000","reply":"héllo ✓","1":"x"}'
+    assert frame.data == frame.text.encode("utf-8")
+    assert json.loads(frame.text)["at"] == when.isoformat()
+
+def test_frames_from_the_broker_keep_their_bytes():
+    frame = Frame.from_bytes(Frame({"type": "chat_token", "token": "ü"}).data)
+    assert frame_text(frame) == '{"type":"chat_token","token":"ü"}'
+    assert encode_frame({"type": "chat_token", "token": "ü"}) == frame.text
+    assert frame_text("already text") == "already text"
+
+def test_frames_fall_back_to_the_stdlib_encoder_without_orjson(monkeypatch):
+    monkeypatch.setattr(frames, "orjson", None)
+    when = datetime(2024, 5, 1, 12, 30, 15, 250000)
+    frame = Frame({"type": "chat_token", "token": "ü", "at": when, 1: "x"})
+    assert frame.text == '{"type":"chat_token","token":"\\u00fc","at":"2024-05-01 12:30:15.250000","1":"x"}'
+    assert frame.data == frame.text.encode()
@@ -0,0 +1,63 @@
+import asyncio
+import time
+import pytest
+from services.hedging import HedgePolicy
+
+@pytest.fixture
+def phi4_latency(metrics):
+    """phi4 usually answers in 50ms, so the hedge fires soon after"""
+    for _ in range(5):
+        metrics.record_model_latency("phi4", 0.05)
+    return metrics.model_latency["phi4"]
+
+def hedging(**overrides):
+    return {"model_selection": {"hedging": {"enabled": True, "agents": ["neochat"], "min_samples": 5, **overrides}}}
+
+def test_hedge_budget_refills_per_request_up_to_its_cap():
+    policy = HedgePolicy(["neochat"], budget=0.5, max_tokens=1)
+    assert policy.try_spend()
+    assert not policy.try_spend()
+    policy.record_request()
+    assert not policy.try_spend()
+    policy.record_request()
+    assert policy.try_spend()
+    assert (policy.hedged, policy.budget_exhausted) == (2, 2)
+
+def test_slow_primary_is_hedged_to_the_next_model_and_cancelled(make_router, fake_ollama, run, phi4_latency):
+    fake_ollama.configure(0, hang_probability=1.0)
+
+    async def scenario():
+        router = make_router(**hedging(), resource_management={"request_timeout": 10})
+        start = time.perf_counter()
+        result = await router.generate("neochat", "question")
+        elapsed = time.perf_counter() - start
+        snapshot = router.hedging.snapshot()
+        # Single-flight cancels the shared call without waiting for it
+        await asyncio.sleep(0.05)
+        active = router.admission["phi4"].active
+        await router.close()
+        return result, elapsed, snapshot, active
+
+    result, elapsed, snapshot, active = run(scenario())
+    assert result["model"] == "llama3_2"
+    assert elapsed < 1
+    assert (snapshot["hedged"], snapshot["hedge_wins"]) == (1, 1)
+    # The losing call gave its slot back, and its slow sample was kept
+    assert active == 0
+    assert len(phi4_latency.samples) == 6
+
+def test_no_hedge_once_the_budget_is_spent(make_router, fake_ollama, run, phi4_latency):
+    fake_ollama.configure(0, ttft=0.3)
+    llama_requests = fake_ollama.stats(1)["requests"]
+
+    async def scenario():
+        router = make_router(**hedging(budget=0, max_tokens=0))
+        result = await router.generate("neochat", "question")
+        snapshot = router.hedging.snapshot()
+        await router.close()
+        return result, snapshot
+
+    result, snapshot = run(scenario())
+    assert result["model"] == "phi4"
+    assert (snapshot["hedged"], snapshot["budget_exhausted"]) == (0, 1)
+    assert fake_ollama.stats(1)["requests"] == llama_requests
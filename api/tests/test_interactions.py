@@ -0,0 +1,16 @@
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from database import AgentInteraction, sync_engine
+from services.deadline import Deadline
+from services.interactions import interaction_recorder
+
+def test_a_turn_answered_at_its_deadline_is_still_recorded(run):
+    async def scenario():
+        interaction_recorder.record("neochat", None, "answered just in time", "an answer", 5.0, 12, deadline=Deadline(0))
+
+    run(scenario())
+    with Session(sync_engine) as db:
+        interaction = db.execute(
+            select(AgentInteraction).where(AgentInteraction.input_text == "answered just in time")
+        ).scalar_one()
+    assert (interaction.output_text, interaction.tokens_used) == ("an answer", 12)
@@ -0,0 +1,49 @@
+import asyncio
+from services.load_balancer import ReplicaPool
+
+def test_pick_prefers_the_cheapest_healthy_replica():
+    pool = ReplicaPool("phi4", ["a", "b", "c"])
+    a, b, c = pool.replicas
+    a.outstanding, b.outstanding, c.outstanding = 3, 1, 0
+    c.latency = 5.0
+    assert pool.pick() is b
+    b.healthy = False
+    assert pool.pick() is a
+    # With every replica down, all of them are candidates again
+    a.healthy = c.healthy = False
+    assert pool.pick() is b
+
+def test_session_affinity_holds_within_the_slack():
+    pool = ReplicaPool("phi4", ["a", "b"], affinity_slack=2.0)
+    a, b = pool.replicas
+    a.outstanding = 1
+    assert pool.pick(prefer="a") is a
+    a.outstanding = 2
+    assert pool.pick(prefer="a") is b
+
+def test_unbalanced_pool_always_uses_the_first_healthy_replica():
+    pool = ReplicaPool("phi4", ["a", "b"], balanced=False)
+    pool.replicas[0].outstanding = 10
+    assert pool.pick().endpoint == "a"
+
+def test_requests_spread_to_the_faster_replica(make_router, fake_ollama, run):
+    fake_ollama.configure(0, ttft=0.3)
+
+    async def scenario():
+        router = make_router(
+            ai_models={"local_models": {"phi4": {"endpoints": [fake_ollama.urls[0], fake_ollama.urls[2]]}}},
+            model_selection={"agent_mappings": {"neochat": ["phi4"]}},
+            resource_management={"max_concurrent_requests": 10, "max_queued_requests": 20}
+        )
+        for wave in range(6):
+            await asyncio.gather(*(router.generate("neochat", f"question {wave}-{i}") for i in range(4)))
+        replicas = router.replica_status()["phi4"]
+        await router.close()
+        return replicas
+
+    replicas = run(scenario())
+    slow, fast = replicas[fake_ollama.urls[0]], replicas[fake_ollama.urls[2]]
+    assert slow["requests"] + fast["requests"] == 24
+    assert fast["requests"] > slow["requests"]
+    assert slow["ewma_latency"] > fast["ewma_latency"]
+    assert slow["outstanding"] == fast["outstanding"] == 0
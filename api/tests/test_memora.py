@@ -0,0 +1,67 @@
+import threading
+from services.embeddings import EmbeddingService
+from services.memora import MemoraMemory
+from services.memory_store import MemoryStore, VectorIndex
+from services.visitor_ids import issue_visitor_id, verify_visitor_id
+
+SECRET = "test-secret"
+
+class SignedInUser:
+    id = 42
+
+def test_visitor_ids_are_signed_and_verified():
+    token = issue_visitor_id(SECRET)
+    visitor = verify_visitor_id(token, SECRET)
+    assert visitor and token.startswith(visitor + ".")
+    assert verify_visitor_id(visitor, SECRET) is None
+    assert verify_visitor_id(visitor + ".forged", SECRET) is None
+    assert verify_visitor_id(token, "another-secret") is None
+    assert verify_visitor_id(token, "") is None
+
+def test_only_signed_visitor_ids_own_memories(make_router, monkeypatch):
+    monkeypatch.setattr("services.visitor_ids.VISITOR_ID_SECRET", SECRET)
+    memora = MemoraMemory(EmbeddingService(make_router()))
+    token = issue_visitor_id()
+    assert memora.owner(None, {"user_id": token}) == f"visitor:{token.rpartition('.')[0]}"
+    assert memora.owner(None, {"user_id": "someone-elses-uuid"}) is None
+    assert memora.owner(None, {}) is None
+    assert memora.owner(SignedInUser(), {"user_id": "ignored"}) == "user:42"
+
+def test_memories_are_recalled_per_owner_and_stored_off_the_event_loop(make_router, tmp_path, monkeypatch, run):
+    threads = set()
+    remember = MemoryStore.remember
+
+    def recording_remember(self, *args):
+        threads.add(threading.current_thread().name)
+        return remember(self, *args)
+    monkeypatch.setattr(MemoryStore, "remember", recording_remember)
+    monkeypatch.setenv("MEMORA_STORE_PATH", str(tmp_path))
+
+    async def scenario():
+        router = make_router(embeddings={"endpoint": router_endpoint})
+        memora = MemoraMemory(EmbeddingService(router))
+        await memora.recall_and_remember("user:1", "my cat is called Miso")
+        recalled = await memora.recall_and_remember("user:1", "my cat is called Miso")
+        stranger = await memora.recall_and_remember("user:2", "my cat is called Miso")
+        analysis = await memora.analysis("user:1", recalled)
+        await router.close()
+        return recalled, stranger, analysis
+
+    router_endpoint = make_router().local_models["phi4"]["endpoint"]
+    recalled, stranger, analysis = run(scenario())
+    assert [memory["text"] for memory in recalled] == ["my cat is called Miso"]
+    assert stranger == []
+    assert analysis["total_memories"] == 2
+    assert threads and threading.main_thread().name not in threads
+
+def test_a_record_torn_by_a_crash_is_cut_off_when_the_index_reopens(tmp_path):
+    path = str(tmp_path / "memories")
+    index = VectorIndex(3, path, initial_capacity=4)
+    index.append([[1, 0, 0], [0, 1, 0]], [{"text": "first"}, {"text": "second"}])
+    with open(f"{path}.jsonl", "a", encoding="utf-8") as records_file:
+        records_file.write('{"text": "thi')
+
+    reopened = VectorIndex(3, path, initial_capacity=4)
+    assert [record["text"] for record in reopened.records] == ["first", "second"]
+    reopened.append([[0, 0, 1]], [{"text": "third"}])
+    assert [record["text"] for record in VectorIndex(3, path).records] == ["first", "second", "third"]
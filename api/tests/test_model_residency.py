@@ -0,0 +1,72 @@
+import asyncio
+import httpx
+from services.model_residency import ResidencyScheduler
+
+GB = 1024 ** 3
+
+def scheduler(busy=()):
+    return ResidencyScheduler({"small": 2 * GB, "medium": 4 * GB, "large": 8 * GB}, 10 * GB, busy=lambda model: model in busy)
+
+def test_least_valuable_idle_models_are_evicted_first():
+    residency = scheduler()
+    residency.mark_resident("small")
+    residency.mark_resident("medium")
+    for _ in range(5):
+        residency.record_demand("small")
+    residency.record_demand("medium")
+    # Medium earns less demand per GB than small, so it goes first
+    assert residency.victims_for("large") == ["medium"]
+
+def test_busy_models_are_never_evicted():
+    residency = scheduler(busy={"medium"})
+    residency.mark_resident("small")
+    residency.mark_resident("medium")
+    assert residency.victims_for("large") is None
+    assert residency.victims_for("large", exclude=["small"]) is None
+
+def test_plan_keeps_the_most_valuable_models_that_fit_together():
+    residency = scheduler()
+    for model, requests in (("small", 1), ("medium", 4), ("large", 4)):
+        for _ in range(requests):
+            residency.record_demand(model)
+    assert sorted(residency.plan(["small", "medium", "large"])) == ["medium", "small"]
+
+def test_router_evicts_an_idle_model_to_load_another_within_the_budget(make_router, fake_ollama, run):
+    async def scenario():
+        router = make_router(
+            model_selection={"agent_mappings": {"memora": ["phi4"]}},
+            resource_management={"residency": {"enabled": True, "memory_budget": "4GB"}}
+        )
+        await router.load_model("llama3_2", "10m", 5)
+        router.residency.mark_resident("llama3_2")
+        result = await router.generate("memora", "question")
+        resident = router.residency.snapshot()
+        # The evicted model is unloaded in the background
+        await asyncio.sleep(0.2)
+        async with httpx.AsyncClient() as client:
+            loaded = (await client.get(f"{fake_ollama.urls[1]}/api/ps")).json()["models"]
+        await router.close()
+        return result, resident, loaded
+
+    result, resident, loaded = run(scenario())
+    assert result["model"] == "phi4"
+    assert resident["resident"] == ["phi4"] and resident["evictions"] == 1
+    assert "llama3.2:latest" not in [model["name"] for model in loaded]
+
+def test_background_unloads_are_kept_until_done_and_their_failures_logged(make_router, run, caplog):
+    async def scenario():
+        router = make_router(resource_management={"residency": {"enabled": True, "memory_budget": "4GB"}})
+
+        async def broken_unload(model_key):
+            raise RuntimeError("backend went away")
+        router.unload_model = broken_unload
+        router.residency.mark_resident("llama3_2")
+        assert router.ensure_resident("phi4")
+        pending = set(router._unloads)
+        await asyncio.gather(*pending, return_exceptions=True)
+        await router.close()
+        return pending, router._unloads
+
+    pending, left = run(scenario())
+    assert len(pending) == 1 and left == set()
+    assert "Failed to unload llama3_2: RuntimeError('backend went away')" in caplog.text
@@ -0,0 +1,45 @@
+from services.model_selection import AdaptiveSelector
+
+def selector(load=None, cold=(), **settings):
+    config = {"enabled": True, "exploration_rate": 0, **settings}
+    return AdaptiveSelector(config, 5, load or (lambda model: 0.0), lambda model: model in cold)
+
+def test_a_faster_model_moves_ahead_at_most_max_promotion_places():
+    adaptive = selector(max_promotion=1)
+    for model, latency in (("a", 3.0), ("b", 2.0), ("c", 0.1)):
+        adaptive.record("neochat", model, latency, True)
+    # c is fastest but may not jump two places ahead of a
+    assert adaptive.order("neochat", ["a", "b", "c"]) == ["b", "a", "c"]
+    assert adaptive.decisions[-1]["chosen"] == ["b", "a", "c"]
+    assert adaptive.reordered == 1
+
+def test_errors_queue_load_and_cold_models_raise_the_cost():
+    busy = selector(load=lambda model: 3.0 if model == "a" else 0.0)
+    failing, cold = selector(), selector(cold={"a"})
+    for adaptive in (busy, failing, cold):
+        adaptive.record("neochat", "a", 1.0, True)
+        adaptive.record("neochat", "b", 1.5, True)
+    failing.record("neochat", "a", None, False)
+    for adaptive in (busy, failing, cold):
+        assert adaptive.order("neochat", ["a", "b"]) == ["b", "a"]
+
+def test_cloud_models_stay_behind_local_ones_unless_promote_cloud():
+    for promote_cloud, expected in ((False, ["phi4", "openai:gpt-4o"]), (True, ["openai:gpt-4o", "phi4"])):
+        adaptive = selector(promote_cloud=promote_cloud)
+        adaptive.record("neochat", "phi4", 3.0, True)
+        adaptive.record("neochat", "openai:gpt-4o", 0.5, True)
+        assert adaptive.order("neochat", ["phi4", "openai:gpt-4o"]) == expected
+
+def test_router_learns_to_lead_with_the_faster_model(make_router, fake_ollama, run):
+    fake_ollama.configure(0, ttft=0.5)
+
+    async def scenario():
+        router = make_router(model_selection={
+            "adaptive_selection": {"enabled": True, "exploration_rate": 0, "default_latency": 0.2}
+        })
+        models = [(await router.generate("neochat", f"question {n}"))["model"] for n in range(3)]
+        await router.close()
+        return models
+
+    # Untried, llama3_2 is assumed to take default_latency, which beats phi4's first sample
+    assert run(scenario()) == ["phi4", "llama3_2", "llama3_2"]
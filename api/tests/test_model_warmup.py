@@ -0,0 +1,65 @@
+import asyncio
+import httpx
+from services.model_warmup import ModelWarmupManager
+
+def agents_env(tmp_path, **enabled) -> str:
+    path = tmp_path / "ai_agents.env"
+    path.write_text("".join(f"{agent.upper()}_ENABLED={str(on).lower()}\n" for agent, on in enabled.items()))
+    return str(path)
+
+def two_agents(**overrides):
+    return {"model_selection": {"agent_mappings": {"neochat": ["phi4", "llama3_2"], "memora": ["llama3_2"]}}, **overrides}
+
+async def wait_until(condition, timeout: float = 5):
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.02)
+
+def test_enabled_agents_primary_models_are_loaded_and_marked_resident(make_router, fake_ollama, run, tmp_path):
+    async def scenario():
+        router = make_router(**two_agents(resource_management={"residency": {"enabled": True}}))
+        warmup = ModelWarmupManager(router, agents_env(tmp_path, neochat=True, memora=False))
+        task = asyncio.create_task(warmup.start())
+        await wait_until(warmup.is_ready)
+        warmup.stop()
+        task.cancel()
+        async with httpx.AsyncClient() as client:
+            loaded = (await client.get(f"{fake_ollama.urls[0]}/api/ps")).json()["models"]
+        await router.close()
+        return warmup, router, loaded
+
+    warmup, router, loaded = run(scenario())
+    assert warmup.required == ["phi4"]
+    assert warmup.snapshot()["phi4"]["state"] == ModelWarmupManager.WARM
+    assert router.residency.is_resident("phi4") and not router.residency.is_resident("llama3_2")
+    assert "phi4:latest" in [model["name"] for model in loaded]
+
+def test_only_the_models_that_fit_the_budget_are_preloaded(make_router, run, tmp_path):
+    async def scenario():
+        router = make_router(**two_agents(resource_management={"residency": {"enabled": True, "memory_budget": "4GB"}}))
+        warmup = ModelWarmupManager(router, agents_env(tmp_path, neochat=True, memora=True))
+        required = warmup.required_models()
+        await router.close()
+        return required
+
+    assert len(run(scenario())) == 1
+
+def test_failed_warm_up_is_retried_until_the_model_loads(make_router, fake_ollama, run, tmp_path):
+    fake_ollama.configure(0, error_rate=1.0)
+
+    async def scenario():
+        router = make_router(model_selection={"health_check_interval": 0.05})
+        warmup = ModelWarmupManager(router, agents_env(tmp_path, neochat=True))
+        task = asyncio.create_task(warmup.start())
+        await wait_until(lambda: warmup.status.get("phi4", {}).get("state") == ModelWarmupManager.FAILED)
+        failed = dict(warmup.status["phi4"])
+        await asyncio.to_thread(fake_ollama.configure, 0, error_rate=0.0)
+        await wait_until(warmup.is_ready)
+        warmup.stop()
+        task.cancel()
+        await router.close()
+        return failed, warmup.status["phi4"]
+
+    failed, warm = run(scenario())
+    assert failed["last_error"]
+    assert warm["state"] == ModelWarmupManager.WARM and warm["last_error"] is None
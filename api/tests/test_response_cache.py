@@ -0,0 +1,35 @@
+import pytest
+
+@pytest.mark.parametrize("options, cacheable", [
+    ({"temperature": 0}, True),
+    ({"temperature": "0"}, True),
+    ({"temperature": 0.7}, False),
+    ({"temperature": None}, False),
+    ({"temperature": "hot"}, False),
+    ({}, False),
+    (None, False)
+])
+def test_only_deterministic_requests_are_cacheable(make_router, options, cacheable):
+    router = make_router(response_cache={"enabled": True, "default_temperature": 0.8})
+    assert router.is_cacheable("neochat", options) is cacheable
+
+def test_sampled_agents_opt_in_to_caching(make_router):
+    router = make_router(response_cache={"enabled": True, "cache_sampled_agents": ["neochat"]})
+    assert router.is_cacheable("neochat", {"temperature": 0.9})
+    assert not router.is_cacheable("infoseek", {"temperature": 0.9})
+
+def test_deterministic_completion_is_served_from_cache(make_router, fake_ollama, run):
+    async def scenario():
+        router = make_router(response_cache={"enabled": True})
+        first = await router.generate("neochat", "what is two plus two", {"temperature": "0"})
+        requests = fake_ollama.stats(0)["requests"]
+        second = await router.generate("neochat", "what  is two plus two", {"temperature": "0"})
+        sampled = await router.generate("neochat", "what is two plus two", {"temperature": None})
+        await router.close()
+        return first, second, sampled, requests, fake_ollama.stats(0)["requests"]
+
+    first, second, sampled, requests_after_first, requests_at_end = run(scenario())
+    assert second["cached"] and second["response"] == first["response"]
+    assert not sampled.get("cached")
+    # The cached answer never reached the backend; the sampled one did
+    assert requests_at_end == requests_after_first + 1
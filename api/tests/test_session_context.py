@@ -0,0 +1,60 @@
+import asyncio
+import time
+from services.session_context import SessionContextStore
+
+def test_store_keys_sessions_per_agent_and_evicts_the_least_recent():
+    store = SessionContextStore(max_sessions=2)
+    first = store.get("s1", "neochat")
+    assert store.get("s1", "neochat") is first
+    assert store.get("s1", "memora") is not first
+    store.get("s2", "neochat")
+    # s1 for neochat was used least recently
+    assert store.get("s1", "neochat") is not first
+    assert (store.hits, store.misses, store.evictions) == (1, 4, 2)
+
+def test_idle_sessions_expire(monkeypatch):
+    store = SessionContextStore(ttl=10)
+    session = store.get("s1", "neochat")
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+    assert store.get("s1", "neochat") is not session
+
+def test_transcript_keeps_the_newest_turns():
+    session = SessionContextStore(max_messages=4).get("s1", "neochat")
+    for n in range(3):
+        session.record("phi4", f"question {n}", f"answer {n}")
+    assert session.transcript("next") == "user: question 1\nassistant: answer 1\nuser: question 2\nassistant: answer 2\nuser: next\nassistant:"
+    assert session.transcript("next", keep=2).startswith("(2 earlier messages omitted)\nuser: question 2")
+
+def test_follow_up_turns_send_only_the_new_message_with_the_context(make_router, run):
+    async def scenario():
+        router = make_router(session_context={"enabled": True})
+        session = router.sessions.get("s1", "neochat")
+        await router.generate("neochat", "first question here", session=session)
+        first_context = list(session.context)
+        await router.generate("neochat", "and another", session=session)
+        await router.close()
+        return session, first_context
+
+    session, first_context = run(scenario())
+    assert session.model == "phi4" and session.turns == 2 and session.context_turns == 1
+    # The fake extends the context by the prompt's words and the 8 answer tokens
+    assert session.context[:len(first_context)] == first_context
+    assert len(session.context) == len(first_context) + len("and another".split()) + 8
+
+def test_a_different_model_gets_the_transcript_instead_of_the_context(make_router, fake_ollama, run):
+    async def scenario():
+        router = make_router(session_context={"enabled": True})
+        session = router.sessions.get("s1", "neochat")
+        await router.generate("neochat", "first question here", session=session)
+        await asyncio.to_thread(fake_ollama.configure, 0, error_rate=1.0)
+        result = await router.generate("neochat", "and another", session=session)
+        await router.close()
+        return result, session
+
+    result, session = run(scenario())
+    assert result["model"] == "llama3_2"
+    assert session.model == "llama3_2" and session.context_turns == 0
+    # A fresh context, built from a prompt that replayed the first turn
+    assert session.context[0] == 0
+    assert len(session.context) > len("and another".split()) + 8
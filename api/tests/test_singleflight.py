@@ -0,0 +1,91 @@
+import asyncio
+from services.singleflight import SingleFlight
+
+def counting_source(total: int, pulled: list):
+    async def source():
+        for n in range(total):
+            pulled.append(n)
+            yield {"n": n}
+            await asyncio.sleep(0)
+    return source
+
+def test_stream_producer_is_paced_by_the_slowest_subscriber(run):
+    async def scenario():
+        flight = SingleFlight(max_buffered=8)
+        pulled = []
+        chunks = flight.stream("key", counting_source(1000, pulled))
+        read = [await chunks.__anext__() for _ in range(5)]
+        await asyncio.sleep(0.05)
+        ahead = len(pulled) - len(read)
+        rest = [chunk async for chunk in chunks]
+        return ahead, [chunk["n"] for chunk in read + rest]
+
+    ahead, received = run(scenario())
+    assert ahead <= 8
+    assert received == list(range(1000))
+
+def test_concurrent_identical_streams_share_one_upstream(run):
+    async def scenario():
+        flight = SingleFlight(max_buffered=4)
+        calls = []
+
+        def source():
+            calls.append(1)
+            return counting_source(50, [])()
+
+        async def consume():
+            return [chunk["n"] async for chunk in flight.stream("key", source)]
+        results = await asyncio.gather(consume(), consume(), consume())
+        return len(calls), results, flight.stats()
+
+    calls, results, stats = run(scenario())
+    assert calls == 1
+    assert all(result == list(range(50)) for result in results)
+    assert stats["hits"] == 2 and stats["in_flight"] == 0
+
+def test_late_joiner_after_the_buffer_rolled_over_gets_its_own_stream(run):
+    async def scenario():
+        flight = SingleFlight(max_buffered=4)
+        calls = []
+
+        def source():
+            calls.append(1)
+            return counting_source(20, [])()
+
+        first = flight.stream("key", source)
+        early = [(await first.__anext__())["n"] for _ in range(10)]
+        late = [chunk["n"] async for chunk in flight.stream("key", source)]
+        rest = [chunk["n"] async for chunk in first]
+        return len(calls), early + rest, late
+
+    calls, first, late = run(scenario())
+    assert calls == 2
+    assert first == list(range(20))
+    assert late == list(range(20))
+
+def test_abandoned_stream_stops_upstream(run):
+    async def scenario():
+        flight = SingleFlight(max_buffered=4)
+        pulled = []
+        chunks = flight.stream("key", counting_source(1000, pulled))
+        await chunks.__anext__()
+        await chunks.aclose()
+        await asyncio.sleep(0.05)
+        return len(pulled), flight.stats()["in_flight"]
+
+    pulled, in_flight = run(scenario())
+    assert pulled <= 5
+    assert in_flight == 0
+
+def test_identical_concurrent_chats_reach_the_backend_once(make_router, fake_ollama, run):
+    async def scenario():
+        router = make_router()
+        before = fake_ollama.stats(0)["requests"]
+        results = await asyncio.gather(*(router.generate("neochat", "same question") for _ in range(3)))
+        after = fake_ollama.stats(0)["requests"]
+        await router.close()
+        return results, after - before
+
+    results, requests = run(scenario())
+    assert requests == 1
+    assert len({result["response"] for result in results}) == 1
@@ -0,0 +1,47 @@
+from services.token_budget import MEMO_MAX_CHARS, TokenBudget, count_tokens
+
+LOCAL = {"phi4": {"tokenizer": "phi", "context_length": 4096}}
+
+def test_client_options_cannot_raise_the_budgeted_window_or_answer():
+    budget = TokenBudget(LOCAL, {}, {"enabled": True, "response_reserve": 512})
+    options = budget.generate_options("phi4", {"num_ctx": 131072, "num_predict": 100000, "temperature": 0.2})
+    assert options == {"num_ctx": 4096, "num_predict": 512, "temperature": 0.2}
+
+def test_client_may_ask_for_a_shorter_answer():
+    budget = TokenBudget(LOCAL, {}, {"enabled": True, "response_reserve": 512})
+    assert budget.generate_options("phi4", {"num_predict": 64})["num_predict"] == 64
+    # Unlimited or malformed requests get the reserve
+    assert budget.generate_options("phi4", {"num_predict": -1})["num_predict"] == 512
+    assert budget.generate_options("phi4", {"num_predict": "lots"})["num_predict"] == 512
+
+def test_only_short_texts_are_memoized():
+    budget = TokenBudget(LOCAL, {}, {"enabled": True})
+    before = budget.stats()["tokenizer_cache"]["currsize"]
+    document = "a " * MEMO_MAX_CHARS
+    assert count_tokens("phi", document) == MEMO_MAX_CHARS
+    assert budget.stats()["tokenizer_cache"]["currsize"] == before
+    count_tokens("phi", "a short history turn that is memoized")
+    assert budget.stats()["tokenizer_cache"]["currsize"] == before + 1
+
+def test_disabled_budget_still_pins_the_context_window():
+    budget = TokenBudget(LOCAL, {}, {"enabled": False})
+    assert budget.generate_options("phi4", {"num_ctx": 99, "num_predict": 2000}) == {"num_ctx": 4096, "num_predict": 2000}
+
+def test_oversized_prompts_are_rejected_and_answers_capped_end_to_end(make_router, run):
+    async def scenario():
+        router = make_router(
+            token_budget={"enabled": True, "response_reserve": 5},
+            ai_models={"local_models": {"phi4": {"context_length": 64}, "llama3_2": {"context_length": 64}}}
+        )
+        result = await router.generate("neochat", "short question", {"num_predict": 500, "num_ctx": 100000})
+        try:
+            await router.generate("neochat", "word " * 200)
+            status = None
+        except Exception as e:
+            status = getattr(e, "status_code", None)
+        await router.close()
+        return result, status
+
+    result, status = run(scenario())
+    assert len(result["response"].split()) == 5
+    assert status == 413
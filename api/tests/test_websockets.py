@@ -0,0 +1,202 @@
+import asyncio
+import importlib
+import json
+import time
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from database import AgentInteraction, async_engine, sync_engine
+from services.interactions import interaction_recorder
+from websockets import websocket_routes
+from websockets.broker import InMemoryBroker, InMemoryHub
+from websockets.connection_manager import ConnectionManager
+from websockets.frames import Frame
+
+class RecordingSocket:
+    """Stands in for a client socket; records every text frame sent to it"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        self.sent.append(json.loads(message))
+
+# The package re-exports the router under the module's name, so fetch the module itself
+websocket_routes_module = importlib.import_module("websockets.websocket_routes")
+
+def socket_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(websocket_routes, prefix="/api")
+    return app
+
+def test_global_socket_reaches_the_global_endpoint_and_broadcasts():
+    client = TestClient(socket_app())
+    with client.websocket_connect("/api/ws/global") as sender, client.websocket_connect("/api/ws/global") as listener:
+        assert sender.receive_json()["type"] == "global_connection_established"
+        assert listener.receive_json()["type"] == "global_connection_established"
+
+        sender.send_json({"type": "broadcast_message", "message": "maintenance at noon", "from": "ops"})
+        for socket in (sender, listener):
+            frame = socket.receive_json()
+            assert frame == {"type": "global_broadcast", "message": "maintenance at noon", "from": "ops"}
+
+def test_agent_socket_still_routes_by_agent_name():
+    client = TestClient(socket_app())
+    with client.websocket_connect("/api/ws/neochat") as socket:
+        frame = socket.receive_json()
+        assert frame["type"] == "connection_established"
+        assert frame["agent"] == "neochat"
+
+def test_socket_chat_streams_tokens_and_records_the_interaction(make_router, monkeypatch):
+    router = make_router()
+    monkeypatch.setattr(websocket_routes_module, "model_router", router)
+    with TestClient(socket_app()) as client:
+        with client.websocket_connect("/api/ws/neochat") as socket:
+            socket.receive_json()
+            socket.send_json({"type": "chat", "request_id": "r1", "message": "recorded over a socket"})
+            frames = []
+            while not frames or frames[-1]["type"] not in ("chat_done", "chat_error"):
+                frames.append(socket.receive_json())
+
+        async def settle():
+            await asyncio.gather(*interaction_recorder._pending, return_exceptions=True)
+            await router.close()
+            await async_engine.dispose()
+        client.portal.call(settle)
+
+    assert frames[-1]["type"] == "chat_done"
+    streamed = "".join(frame["content"] for frame in frames if frame["type"] == "chat_token")
+    with Session(sync_engine) as db:
+        interaction = db.execute(
+            select(AgentInteraction).where(AgentInteraction.input_text == "recorded over a socket")
+        ).scalar_one()
+    assert interaction.output_text == streamed
+    assert interaction.tokens_used == frames[-1]["tokens_used"] > 0
+
+def chat_frames(socket, request_ids, until=("chat_done", "chat_error", "chat_cancelled")):
+    """Frames received until every given request id has finished"""
+    frames, pending = [], set(request_ids)
+    while pending:
+        frames.append(socket.receive_json())
+        if frames[-1]["type"] in until:
+            pending.discard(frames[-1]["request_id"])
+    return frames
+
+def test_cancel_stops_upstream_generation_and_frees_the_slot(make_router, fake_ollama, monkeypatch):
+    fake_ollama.configure(0, tokens=200, token_rate=50.0)
+    router = make_router()
+    monkeypatch.setattr(websocket_routes_module, "model_router", router)
+    with TestClient(socket_app()) as client:
+        with client.websocket_connect("/api/ws/neochat") as socket:
+            socket.receive_json()
+            socket.send_json({"type": "chat", "request_id": "r1", "message": "a long answer"})
+            frames = [socket.receive_json() for _ in range(3)]
+            socket.send_json({"type": "cancel", "request_id": "r1"})
+            frames += chat_frames(socket, ["r1"])
+            time.sleep(0.1)
+            tokens = fake_ollama.stats(0)["tokens"]
+            time.sleep(0.2)
+            active = router.admission["phi4"].active
+        client.portal.call(router.close)
+
+    assert frames[0]["type"] == "chat_start" and frames[-1]["type"] == "chat_cancelled"
+    assert active == 0
+    # The fake stopped generating once the upstream request was closed
+    assert fake_ollama.stats(0)["tokens"] == tokens
+
+def test_concurrent_streams_on_one_socket_are_tagged_with_their_request_id(make_router, fake_ollama, monkeypatch):
+    fake_ollama.configure(0, token_rate=40.0)
+    router = make_router()
+    monkeypatch.setattr(websocket_routes_module, "model_router", router)
+    with TestClient(socket_app()) as client:
+        with client.websocket_connect("/api/ws/neochat") as socket:
+            socket.receive_json()
+            socket.send_json({"type": "chat", "request_id": "long", "message": "first", "options": {"num_predict": 12}})
+            socket.send_json({"type": "chat", "request_id": "short", "message": "second", "options": {"num_predict": 4}})
+            frames = chat_frames(socket, ["long", "short"])
+
+        async def settle():
+            await asyncio.gather(*interaction_recorder._pending, return_exceptions=True)
+            await router.close()
+            await async_engine.dispose()
+        client.portal.call(settle)
+
+    tokens = {request_id: [f for f in frames if f["type"] == "chat_token" and f["request_id"] == request_id]
+              for request_id in ("long", "short")}
+    assert (len(tokens["long"]), len(tokens["short"])) == (12, 4)
+    done = [frame["request_id"] for frame in frames if frame["type"] == "chat_done"]
+    # The short answer finished while the long one was still streaming
+    assert done == ["short", "long"]
+
+def test_a_repeated_request_id_replaces_the_running_stream(make_router, fake_ollama, monkeypatch):
+    fake_ollama.configure(0, tokens=200, token_rate=50.0)
+    router = make_router()
+    monkeypatch.setattr(websocket_routes_module, "model_router", router)
+    with TestClient(socket_app()) as client:
+        with client.websocket_connect("/api/ws/neochat") as socket:
+            socket.receive_json()
+            socket.send_json({"type": "chat", "request_id": "r1", "message": "a long answer"})
+            frames = [socket.receive_json() for _ in range(3)]
+            socket.send_json({"type": "chat", "request_id": "r1", "message": "never mind", "options": {"num_predict": 3}})
+            frames += chat_frames(socket, ["r1"])
+            time.sleep(0.1)
+            active = router.admission["phi4"].active
+
+        async def settle():
+            await asyncio.gather(*interaction_recorder._pending, return_exceptions=True)
+            await router.close()
+            await async_engine.dispose()
+        client.portal.call(settle)
+
+    starts = [n for n, frame in enumerate(frames) if frame["type"] == "chat_start"]
+    assert len(starts) == 2
+    replacement = frames[starts[1]:]
+    assert [frame["type"] for frame in replacement] == ["chat_start"] + ["chat_token"] * 3 + ["chat_done"]
+    assert active == 0
+
+def test_broadcasts_relay_between_workers_sharing_a_broker_hub(run):
+    async def scenario():
+        hub = InMemoryHub()
+        worker_a, worker_b = ConnectionManager(InMemoryBroker(hub)), ConnectionManager(InMemoryBroker(hub))
+        await worker_a.start_broker()
+        await worker_b.start_broker()
+        on_a, on_b, global_b = RecordingSocket(), RecordingSocket(), RecordingSocket()
+        await worker_a.connect(on_a, "neochat")
+        await worker_b.connect(on_b, "neochat")
+        await worker_b.connect(global_b)
+
+        await worker_a.broadcast_to_agent(Frame({"n": 1}), "neochat")
+        await worker_b.broadcast_to_all(Frame({"n": 2}))
+        await worker_a.broadcast_to_agent(Frame({"n": 3}), "neochat", local_only=True)
+        await asyncio.sleep(0.05)
+
+        for manager, sockets in ((worker_a, [on_a]), (worker_b, [on_b, global_b])):
+            for socket in sockets:
+                manager.disconnect(socket)
+        await worker_a.close_broker()
+        await worker_b.close_broker()
+        return on_a.sent, on_b.sent, global_b.sent
+
+    on_a, on_b, global_b = run(scenario())
+    assert on_a == [{"n": 1}, {"n": 2}, {"n": 3}]
+    assert on_b == [{"n": 1}, {"n": 2}]
+    assert global_b == [{"n": 2}]
+
+def test_broker_is_skipped_for_channels_no_other_worker_watches(run):
+    async def scenario():
+        hub = InMemoryHub()
+        worker_a, worker_b = ConnectionManager(InMemoryBroker(hub)), ConnectionManager(InMemoryBroker(hub))
+        socket = RecordingSocket()
+        await worker_a.connect(socket, "neochat")
+        await worker_a.broadcast_to_agent(Frame({"n": 1}), "neochat")
+        worker_a.disconnect(socket)
+        return worker_a.broker.stats(), worker_b.broker.stats()
+
+    stats_a, stats_b = run(scenario())
+    assert stats_a["published"] == 0
+    assert stats_a["skipped_local_only"] == 1
+    assert stats_b["received"] == 0
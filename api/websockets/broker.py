@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import os
+import uuid
+import redis.asyncio as aioredis
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+from websockets.frames import Frame
+
+logger = logging.getLogger(__name__)
+
+# memory (one process, or several managers sharing a hub) or redis (every worker and node)
+WS_BROKER = os.getenv("WS_BROKER", "memory")
+WS_BROKER_URL = os.getenv("WS_BROKER_URL") or os.getenv("REDIS_URL", "redis://localhost:6379")
+WS_BROKER_PREFIX = os.getenv("WS_BROKER_PREFIX", "onelastai:ws:")
+# How often the remote subscriber counts behind the publish shortcut are refreshed
+WS_BROKER_REFRESH = float(os.getenv("WS_BROKER_REFRESH", "1"))
+
+# Called with (channel, frame, coalescing key) for broadcasts published by other workers
+Deliver = Callable[[str, Frame, Optional[str]], Awaitable[None]]
+
+class Broker:
+    """Carries broadcasts between workers; each worker still delivers to its own sockets
+
+    A worker watches a channel while it has local subscribers on it. Publishing is
+    skipped for channels no other worker watches, so single-worker traffic never
+    leaves the process.
+    """
+
+    def __init__(self):
+        self.worker_id = uuid.uuid4().hex
+        self.deliver: Optional[Deliver] = None
+        self.watched: Set[str] = set()
+        self.published = 0
+        self.skipped = 0
+        self.received = 0
+
+    async def start(self, deliver: Deliver):
+        self.deliver = deliver
+
+    async def close(self):
+        self.deliver = None
+
+    def watch(self, channel: str):
+        self.watched.add(channel)
+
+    def unwatch(self, channel: str):
+        self.watched.discard(channel)
+
+    def has_remote_subscribers(self, channel: str) -> bool:
+        raise NotImplementedError
+
+    async def publish(self, channel: str, frame: Frame, key: Optional[str] = None):
+        raise NotImplementedError
+
+    async def relay(self, channel: str, frame: Frame, key: Optional[str] = None):
+        """Publish a broadcast this worker has delivered locally, unless nobody else would receive it"""
+        if not self.has_remote_subscribers(channel):
+            self.skipped += 1
+            return
+        await self.publish(channel, frame, key)
+
+    async def _receive(self, channel: str, frame: Frame, key: Optional[str]):
+        self.received += 1
+        if self.deliver is not None:
+            await self.deliver(channel, frame, key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self).__name__,
+            "worker_id": self.worker_id,
+            "watched_channels": len(self.watched),
+            "published": self.published,
+            "skipped_local_only": self.skipped,
+            "received": self.received
+        }
+
+class InMemoryHub:
+    """Stands in for Redis between brokers living in one process"""
+
+    def __init__(self):
+        self.watchers: Dict[str, Set["InMemoryBroker"]] = {}
+
+class InMemoryBroker(Broker):
+    """Broker for a single worker; managers sharing a hub behave like separate workers"""
+
+    def __init__(self, hub: Optional[InMemoryHub] = None):
+        super().__init__()
+        self.hub = hub or InMemoryHub()
+
+    async def close(self):
+        for channel in list(self.watched):
+            self.unwatch(channel)
+        await super().close()
+
+    def watch(self, channel: str):
+        super().watch(channel)
+        self.hub.watchers.setdefault(channel, set()).add(self)
+
+    def unwatch(self, channel: str):
+        super().unwatch(channel)
+        watchers = self.hub.watchers.get(channel)
+        if watchers is not None:
+            watchers.discard(self)
+            if not watchers:
+                del self.hub.watchers[channel]
+
+    def has_remote_subscribers(self, channel: str) -> bool:
+        return any(broker is not self for broker in self.hub.watchers.get(channel, ()))
+
+    async def publish(self, channel: str, frame: Frame, key: Optional[str] = None):
+        self.published += 1
+        for broker in list(self.hub.watchers.get(channel, ())):
+            if broker is not self:
+                await broker._receive(channel, frame, key)
+
+class RedisBroker(Broker):
+    """Redis pub/sub between uvicorn workers and nodes
+
+    Messages are "<worker id>|<key>|<frame bytes>" so a worker can ignore its own
+    broadcasts, which it has already delivered locally. Remote subscriber counts
+    come from PUBSUB NUMSUB, refreshed every WS_BROKER_REFRESH seconds; channels
+    not counted yet are always published to.
+    """
+
+    def __init__(self, url: str = WS_BROKER_URL, prefix: str = WS_BROKER_PREFIX, refresh_interval: float = WS_BROKER_REFRESH):
+        super().__init__()
+        self.redis = aioredis.from_url(url)
+        self.prefix = prefix
+        self.refresh_interval = refresh_interval
+        self.pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        self.remote: Dict[str, int] = {}
+        self.pending: asyncio.Queue = asyncio.Queue()
+        self.tasks: Set[asyncio.Task] = set()
+        self.errors = 0
+
+    async def start(self, deliver: Deliver):
+        await super().start(deliver)
+        self.tasks = {asyncio.create_task(self._listen()), asyncio.create_task(self._refresh())}
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        await self.pubsub.aclose()
+        await self.redis.aclose()
+        await super().close()
+
+    def watch(self, channel: str):
+        super().watch(channel)
+        self.pending.put_nowait(("subscribe", channel))
+
+    def unwatch(self, channel: str):
+        super().unwatch(channel)
+        self.pending.put_nowait(("unsubscribe", channel))
+
+    def has_remote_subscribers(self, channel: str) -> bool:
+        if channel not in self.remote:
+            self.remote[channel] = -1
+        return self.remote[channel] != 0
+
+    async def publish(self, channel: str, frame: Frame, key: Optional[str] = None):
+        envelope = f"{self.worker_id}|{key or ''}|".encode("utf-8") + frame.data
+        try:
+            self.remote[channel] = max(0, await self.redis.publish(self.prefix + channel, envelope) - (channel in self.watched))
+            self.published += 1
+        except Exception as e:
+            # Local sockets already have the frame; only other workers miss it
+            self.errors += 1
+            logger.warning(f"Could not publish to {channel}: {e!r}")
+
+    async def _listen(self):
+        """Apply (un)subscribe requests between reads so the pub/sub connection has one user"""
+        while True:
+            try:
+                while not self.pending.empty():
+                    action, channel = self.pending.get_nowait()
+                    if action == "subscribe" and channel in self.watched:
+                        await self.pubsub.subscribe(self.prefix + channel)
+                    elif action == "unsubscribe" and channel not in self.watched:
+                        await self.pubsub.unsubscribe(self.prefix + channel)
+                if not self.pubsub.subscribed:
+                    await asyncio.sleep(0.1)
+                    continue
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=0.1)
+                if message and message["type"] == "message":
+                    await self._handle(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"WebSocket broker listener error: {e!r}")
+                await asyncio.sleep(1)
+
+    async def _handle(self, message: Dict[str, Any]):
+        sender, key, data = message["data"].split(b"|", 2)
+        if sender.decode("utf-8") == self.worker_id:
+            return
+        channel = message["channel"].decode("utf-8")[len(self.prefix):]
+        await self._receive(channel, Frame.from_bytes(data), key.decode("utf-8") or None)
+
+    async def _refresh(self):
+        """Recount other workers' subscriptions to the channels this worker publishes on"""
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            channels = list(self.remote)
+            if not channels:
+                continue
+            try:
+                counts = await self.redis.pubsub_numsub(*(self.prefix + channel for channel in channels))
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Could not count WebSocket broker subscribers: {e!r}")
+                continue
+            for channel, (_, count) in zip(channels, counts):
+                self.remote[channel] = max(0, count - (channel in self.watched))
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(super().stats(), errors=self.errors)
+
+def create_broker(backend: str = WS_BROKER) -> Broker:
+    if backend == "redis":
+        return RedisBroker()
+    return InMemoryBroker()
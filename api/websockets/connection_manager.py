@@ -1,78 +1,303 @@
 from fastapi import WebSocket, WebSocketDisconnect
-from typing import List, Dict
-import json
+from collections import deque
+from typing import Any, Dict, Optional, Set, Tuple, Union
 import asyncio
+import logging
+import os
 import time
 from datetime import datetime
+from services.agent_metrics import agent_metrics
+from websockets.broker import Broker, create_broker
+from websockets.frames import Frame, frame_text
+
+logger = logging.getLogger(__name__)
+
+# Outbound frames buffered per socket before the full-queue policy kicks in
+WS_MAX_QUEUE = int(os.getenv("WS_MAX_QUEUE", "64"))
+# drop_oldest, coalesce (replace a queued frame with the same key, else drop oldest) or disconnect
+WS_FULL_QUEUE_POLICY = os.getenv("WS_FULL_QUEUE_POLICY", "coalesce")
+# A socket that cannot take one frame in this many seconds is dropped
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10"))
+
+class ClientConnection:
+    """One socket's bounded outbound queue, drained by its own writer task
+
+    Broadcasts only enqueue, so a slow client falls behind on its own instead of
+    stalling every other subscriber. Direct sends share the writer's lock, which
+    keeps frames whole and in order on the wire.
+    """
+
+    DROP_OLDEST = "drop_oldest"
+    COALESCE = "coalesce"
+    DISCONNECT = "disconnect"
+
+    def __init__(self, websocket: WebSocket, on_failure, max_queue: int = WS_MAX_QUEUE,
+                 policy: str = WS_FULL_QUEUE_POLICY, send_timeout: float = WS_SEND_TIMEOUT):
+        self.websocket = websocket
+        self.on_failure = on_failure
+        self.max_queue = max_queue
+        self.policy = policy
+        self.send_timeout = send_timeout
+        # Entries are [key, message] so a coalesced frame can be replaced in place
+        self.queue: deque = deque()
+        self.keyed: Dict[str, list] = {}
+        self.agents: Set[str] = set()
+        self.send_lock = asyncio.Lock()
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.writer = asyncio.create_task(self._write())
+
+    def offer(self, message: Union[str, Frame], key: Optional[str] = None) -> bool:
+        """Queue a frame without waiting; False once the connection is closed or cut for being too slow"""
+        if self.closed:
+            return False
+        if key is not None and self.policy == self.COALESCE and key in self.keyed:
+            # A newer frame of the same kind supersedes the queued one
+            self.keyed[key][1] = frame_text(message)
+            self.coalesced += 1
+            return True
+        if len(self.queue) >= self.max_queue:
+            if self.policy == self.DISCONNECT:
+                logger.warning(f"Disconnecting slow WebSocket client after {len(self.queue)} queued frames")
+                self.close()
+                self.on_failure(self.websocket, slow=True)
+                asyncio.create_task(self._close_socket(1013))
+                return False
+            self._forget(self.queue.popleft())
+            self.dropped += 1
+
+        entry = [key, frame_text(message)]
+        self.queue.append(entry)
+        if key is not None:
+            self.keyed[key] = entry
+        self.ready.set()
+        return True
+
+    def _forget(self, entry: list):
+        if entry[0] is not None and self.keyed.get(entry[0]) is entry:
+            del self.keyed[entry[0]]
+
+    async def send(self, message: Union[str, Frame]):
+        """Send one frame now, in order with queued broadcasts"""
+        async with self.send_lock:
+            # asyncio.timeout, unlike wait_for on 3.11, never swallows a cancel that races the send
+            async with asyncio.timeout(self.send_timeout):
+                await self.websocket.send_text(frame_text(message))
+        self.sent += 1
+
+    async def _write(self):
+        try:
+            while not self.closed:
+                while not self.queue:
+                    self.ready.clear()
+                    await self.ready.wait()
+                entry = self.queue.popleft()
+                self._forget(entry)
+                await self.send(entry[1])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.debug(f"WebSocket writer stopped: {e!r}")
+            self.close()
+            self.on_failure(self.websocket, slow=False)
+
+    async def _close_socket(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+    def close(self):
+        """Stop the writer and discard anything still queued"""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.clear()
+        self.keyed.clear()
+        if self.writer is not asyncio.current_task():
+            self.writer.cancel()
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-        self.agent_connections: Dict[str, List[WebSocket]] = {}
+    """Registry of connected sockets and the agents each one follows
+
+    Sockets map to their connection and subscriptions, and agents to sets of
+    sockets, so connect, subscribe and disconnect are O(1) per subscription.
+    Broadcasts iterate immutable snapshots that are rebuilt only after the
+    registry changes, so sockets coming and going mid-broadcast are safe.
+
+    Broadcasts are delivered to local sockets first and then relayed once through
+    the broker to other workers, which deliver them to their own sockets.
+    """
+
+    ALL_CHANNEL = "all"
+
+    def __init__(self, broker: Optional[Broker] = None):
+        self.broker = broker or create_broker()
+        self.clients: Dict[WebSocket, ClientConnection] = {}
+        self.agent_connections: Dict[str, Set[WebSocket]] = {}
+        # Snapshot per agent, and of every socket under None; dropped on change
+        self._snapshots: Dict[Optional[str], Tuple[ClientConnection, ...]] = {}
+        self.slow_disconnects = 0
+        # Losses of sockets that have since gone, so stats stay cumulative
+        self.retired_dropped = 0
+        self.retired_coalesced = 0
 
     async def connect(self, websocket: WebSocket, agent_name: str = None):
         await websocket.accept()
-        self.active_connections.append(websocket)
-        
+        self.clients[websocket] = ClientConnection(websocket, self._drop_client)
+        self._snapshots.pop(None, None)
+        if len(self.clients) == 1:
+            self.broker.watch(self.ALL_CHANNEL)
         if agent_name:
-            if agent_name not in self.agent_connections:
-                self.agent_connections[agent_name] = []
-            self.agent_connections[agent_name].append(websocket)
+            self.subscribe(websocket, agent_name)
+
+    def subscribe(self, websocket: WebSocket, agent_name: str):
+        client = self.clients.get(websocket)
+        if client is None:
+            return
+        client.agents.add(agent_name)
+        if agent_name not in self.agent_connections:
+            self.agent_connections[agent_name] = set()
+            self.broker.watch(self.agent_channel(agent_name))
+        self.agent_connections[agent_name].add(websocket)
+        self._snapshots.pop(agent_name, None)
+
+    def unsubscribe(self, websocket: WebSocket, agent_name: str):
+        client = self.clients.get(websocket)
+        if client is not None:
+            client.agents.discard(agent_name)
+        sockets = self.agent_connections.get(agent_name)
+        if sockets is not None:
+            sockets.discard(websocket)
+            if not sockets:
+                del self.agent_connections[agent_name]
+                self.broker.unwatch(self.agent_channel(agent_name))
+        self._snapshots.pop(agent_name, None)
 
     def disconnect(self, websocket: WebSocket, agent_name: str = None):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-        
-        if agent_name and agent_name in self.agent_connections:
-            if websocket in self.agent_connections[agent_name]:
-                self.agent_connections[agent_name].remove(websocket)
-
-    async def send_personal_message(self, message: str, websocket: WebSocket):
+        """Forget a socket and every subscription it holds"""
+        client = self.clients.pop(websocket, None)
+        if client is None:
+            return
+        for subscribed in list(client.agents):
+            self.unsubscribe(websocket, subscribed)
+        self._snapshots.pop(None, None)
+        if not self.clients:
+            self.broker.unwatch(self.ALL_CHANNEL)
+        client.close()
+        self.retired_dropped += client.dropped
+        self.retired_coalesced += client.coalesced
+
+    async def disconnect_websocket(self, websocket: WebSocket):
+        self.disconnect(websocket)
+
+    def _drop_client(self, websocket: WebSocket, slow: bool):
+        """Forget a socket whose writer failed or that fell too far behind"""
+        if slow:
+            self.slow_disconnects += 1
+        self.disconnect(websocket)
+
+    def connections(self, agent_name: Optional[str] = None) -> Tuple[ClientConnection, ...]:
+        """Immutable snapshot of an agent's subscribers, or of every socket"""
+        snapshot = self._snapshots.get(agent_name)
+        if snapshot is None:
+            if agent_name is None:
+                snapshot = tuple(self.clients.values())
+            else:
+                snapshot = tuple(self.clients[websocket] for websocket in self.agent_connections.get(agent_name, ()))
+            self._snapshots[agent_name] = snapshot
+        return snapshot
+
+    def connection_count(self, agent_name: Optional[str] = None) -> int:
+        if agent_name is None:
+            return len(self.clients)
+        return len(self.agent_connections.get(agent_name, ()))
+
+    async def send_personal_message(self, message: Union[str, Frame], websocket: WebSocket) -> bool:
+        """Send to one socket; False if it has gone away"""
+        client = self.clients.get(websocket)
         try:
-            await websocket.send_text(message)
+            if client:
+                await client.send(message)
+            else:
+                await websocket.send_text(frame_text(message))
+            return True
+        except asyncio.CancelledError:
+            # A chat stream cancelled mid-send; the socket itself is fine
+            raise
         except:
             await self.disconnect_websocket(websocket)
+            return False
 
-    async def broadcast_to_agent(self, message: str, agent_name: str):
-        if agent_name in self.agent_connections:
-            disconnected = []
-            for connection in self.agent_connections[agent_name]:
-                try:
-                    await connection.send_text(message)
-                except:
-                    disconnected.append(connection)
-            
-            # Clean up disconnected connections
-            for conn in disconnected:
-                self.disconnect(conn, agent_name)
-
-    async def broadcast_to_all(self, message: str):
-        disconnected = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except:
-                disconnected.append(connection)
-        
-        # Clean up disconnected connections
-        for conn in disconnected:
-            self.disconnect(conn)
+    @staticmethod
+    def agent_channel(agent_name: str) -> str:
+        return f"agent:{agent_name}"
 
-    async def disconnect_websocket(self, websocket: WebSocket):
-        # Remove from all connections
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-        
-        # Remove from agent-specific connections
-        for agent_name in self.agent_connections:
-            if websocket in self.agent_connections[agent_name]:
-                self.agent_connections[agent_name].remove(websocket)
+    async def broadcast_to_agent(self, message: Union[str, Frame], agent_name: str, key: Optional[str] = None,
+                                 local_only: bool = False):
+        """Queue a frame for every subscriber of an agent, on every worker, without waiting on any of them"""
+        self._deliver(self.connections(agent_name), message, key)
+        if not local_only:
+            await self.broker.relay(self.agent_channel(agent_name), self._as_frame(message), key)
+
+    async def broadcast_to_all(self, message: Union[str, Frame], key: Optional[str] = None, local_only: bool = False):
+        """Queue a frame for every connected socket, on every worker, without waiting on any of them"""
+        self._deliver(self.connections(), message, key)
+        if not local_only:
+            await self.broker.relay(self.ALL_CHANNEL, self._as_frame(message), key)
+
+    def _deliver(self, clients: Tuple[ClientConnection, ...], message: Union[str, Frame], key: Optional[str]):
+        # Every queue shares the same encoded string
+        for client in clients:
+            client.offer(message, key)
+
+    @staticmethod
+    def _as_frame(message: Union[str, Frame]) -> Frame:
+        return message if isinstance(message, Frame) else Frame.from_bytes(message.encode("utf-8"))
+
+    async def _deliver_remote(self, channel: str, frame: Frame, key: Optional[str]):
+        """Deliver a broadcast another worker published to this worker's sockets"""
+        if channel == self.ALL_CHANNEL:
+            self._deliver(self.connections(), frame, key)
+        elif channel.startswith("agent:"):
+            self._deliver(self.connections(channel[len("agent:"):]), frame, key)
+
+    async def start_broker(self):
+        await self.broker.start(self._deliver_remote)
+
+    async def close_broker(self):
+        await self.broker.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Outbound queue depth and losses across connected sockets"""
+        clients = self.connections()
+        return {
+            "policy": WS_FULL_QUEUE_POLICY,
+            "max_queue": WS_MAX_QUEUE,
+            "queued": sum(len(client.queue) for client in clients),
+            "deepest_queue": max((len(client.queue) for client in clients), default=0),
+            "dropped": self.retired_dropped + sum(client.dropped for client in clients),
+            "coalesced": self.retired_coalesced + sum(client.coalesced for client in clients),
+            "slow_disconnects": self.slow_disconnects,
+            "broker": self.broker.stats()
+        }
 
 # Global connection manager
 manager = ConnectionManager()
 
 # Agent performance monitoring
 class AgentPerformanceMonitor:
+    """Broadcasts each agent's rolling-window stats from agent_metrics every couple of seconds"""
+
+    AGENTS = [
+        "aiblogster", "girlfriend", "taskmaster", "spylens", "reportly",
+        "personax", "netscope", "neochat", "memora", "learn", "labx",
+        "infoseek", "ideaforge", "tradesage", "vocamind"
+    ]
+
     def __init__(self):
         self.agent_stats = {}
         self.is_monitoring = False
@@ -80,44 +305,29 @@ class AgentPerformanceMonitor:
     async def start_monitoring(self):
         self.is_monitoring = True
         while self.is_monitoring:
-            # Simulate agent performance data
             performance_data = await self.get_agent_performance()
+            self.agent_stats = performance_data
+            agent_metrics.maybe_persist(performance_data)
             
             # Broadcast to all connected clients
             for agent_name, stats in performance_data.items():
-                message = json.dumps({
+                message = Frame({
                     "type": "agent_performance",
                     "agent": agent_name,
                     "data": stats,
                     "timestamp": datetime.now().isoformat()
                 })
-                await manager.broadcast_to_agent(message, agent_name)
+                # Each tick supersedes the last, so a lagging client only gets the newest stats.
+                # Every worker runs its own monitor, so ticks stay on this worker's sockets.
+                await manager.broadcast_to_agent(message, agent_name, key=f"agent_performance:{agent_name}", local_only=True)
             
             await asyncio.sleep(2)  # Update every 2 seconds
 
     async def get_agent_performance(self):
-        """Simulate real-time agent performance metrics"""
-        import random
-        
-        agents = [
-            "aiblogster", "girlfriend", "taskmaster", "spylens", "reportly",
-            "personax", "netscope", "neochat", "memora", "learn", "labx",
-            "infoseek", "ideaforge", "tradesage", "vocamind"
-        ]
-        
-        performance_data = {}
-        for agent in agents:
-            performance_data[agent] = {
-                "cpu_usage": random.uniform(10, 90),
-                "memory_usage": random.uniform(20, 85),
-                "response_time": random.uniform(50, 500),
-                "requests_per_minute": random.randint(10, 100),
-                "success_rate": random.uniform(95, 99.9),
-                "active_connections": random.randint(0, 50),
-                "status": random.choice(["active", "busy", "idle"]),
-                "last_activity": datetime.now().isoformat()
-            }
-        
+        """Real agent performance metrics over the agent_metrics window"""
+        performance_data = agent_metrics.snapshot(self.AGENTS)
+        for agent_name, stats in performance_data.items():
+            stats["active_connections"] = manager.connection_count(agent_name)
         return performance_data
 
     def stop_monitoring(self):
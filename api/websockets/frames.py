@@ -0,0 +1,40 @@
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib encoder gives equivalent JSON, only slower
+    orjson = None
+
+def dumps(payload: Any) -> bytes:
+    """Compact UTF-8 JSON; orjson writes datetimes as ISO strings, the fallback as str()"""
+    if orjson is not None:
+        return orjson.dumps(payload, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, separators=(",", ":"), default=str).encode()
+
+class Frame:
+    """A message encoded once and shared by every recipient
+
+    data is the UTF-8 JSON for byte transports such as a pub/sub broker; text is the
+    same frame decoded once for WebSocket text frames, which browsers expect.
+    """
+
+    __slots__ = ("data", "text")
+
+    def __init__(self, payload: Any):
+        self.data = dumps(payload)
+        self.text = self.data.decode("utf-8")
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Frame":
+        frame = cls.__new__(cls)
+        frame.data = data
+        frame.text = data.decode("utf-8")
+        return frame
+
+def encode_frame(payload: Any) -> str:
+    """One-off text frame for a single recipient"""
+    return dumps(payload).decode("utf-8")
+
+def frame_text(message: Union[str, Frame]) -> str:
+    return message.text if isinstance(message, Frame) else message
@@ -1,17 +1,134 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query, HTTPException
 from websockets.connection_manager import manager, performance_monitor
+from websockets.frames import Frame, encode_frame
+from services.agent_chat import chat_options, chat_session, session_id_of
+from services.agent_metrics import agent_metrics
+from services.deadline import Deadline
+from services.interactions import interaction_recorder
+from services.model_metrics import model_metrics
+from services.model_router import model_router
+from typing import Dict
 import json
 import asyncio
+import functools
+import time
+import uuid
 
 router = APIRouter()
 
+async def stream_chat_to_socket(websocket: WebSocket, agent_name: str, request_id: str, client_message: dict):
+    """Relay model tokens for one chat request as chat_* frames tagged with its request id"""
+    message = str(client_message.get("message") or "").strip()
+    if not message:
+        await manager.send_personal_message(encode_frame({
+            "type": "chat_error",
+            "request_id": request_id,
+            "detail": "Message is required"
+        }), websocket)
+        return
+
+    try:
+        options = chat_options(client_message)
+    except HTTPException as e:
+        await manager.send_personal_message(encode_frame({
+            "type": "chat_error",
+            "request_id": request_id,
+            "detail": e.detail
+        }), websocket)
+        return
+
+    deadline = Deadline(model_router.request_timeout)
+    start = time.perf_counter()
+    tokens = []
+    events = model_router.stream(
+        agent_name, message, options,
+        session=chat_session(client_message, agent_name), deadline=deadline
+    )
+    with agent_metrics.turn(agent_name) as turn:
+        try:
+            async for event in events:
+                frame = dict(event, type=f"chat_{event['type']}", request_id=request_id)
+                if not await manager.send_personal_message(encode_frame(frame), websocket):
+                    # The socket is gone; closing events stops the model generating for nobody
+                    model_metrics.record_cancelled(agent_name, "websocket", time.perf_counter() - start, len(tokens))
+                    turn.finish(None)
+                    return
+                if event["type"] == "token":
+                    tokens.append(event["content"])
+                elif event["type"] == "error":
+                    turn.finish(False)
+                elif event["type"] == "done":
+                    elapsed = time.perf_counter() - start
+                    model_metrics.record_turn(agent_name, elapsed)
+                    # Sockets are not authenticated, so the interaction has no user
+                    interaction_recorder.record(
+                        agent_name, None, message, "".join(tokens),
+                        elapsed, event.get("tokens_used", 0), session_id_of(client_message), deadline
+                    )
+        except asyncio.CancelledError:
+            # Cancelled by the client or because its socket closed
+            model_metrics.record_cancelled(agent_name, "websocket", time.perf_counter() - start, len(tokens))
+            raise
+        except HTTPException as e:
+            turn.abort(e)
+            await manager.send_personal_message(encode_frame({
+                "type": "chat_error",
+                "request_id": request_id,
+                "detail": e.detail
+            }), websocket)
+        finally:
+            await events.aclose()
+
+# Declared before /ws/{agent_name}, which would otherwise match "global" as an agent name
+@router.websocket("/ws/global")
+async def websocket_global_endpoint(websocket: WebSocket):
+    """WebSocket endpoint for global system monitoring"""
+    await manager.connect(websocket)
+    
+    # Send initial connection message
+    await manager.send_personal_message(encode_frame({
+        "type": "global_connection_established",
+        "message": "Connected to global system monitoring"
+    }), websocket)
+    
+    try:
+        while True:
+            data = await websocket.receive_text()
+            client_message = json.loads(data)
+            
+            if client_message.get("type") == "get_all_agents":
+                # Send status of all agents
+                all_agents_message = encode_frame({
+                    "type": "all_agents_status",
+                    "data": performance_monitor.agent_stats,
+                    "active_connections": manager.connection_count()
+                })
+                await manager.send_personal_message(all_agents_message, websocket)
+                
+            elif client_message.get("type") == "broadcast_message":
+                # Broadcast message to all connected clients
+                broadcast_message = Frame({
+                    "type": "global_broadcast",
+                    "message": client_message.get("message"),
+                    "from": client_message.get("from", "system")
+                })
+                await manager.broadcast_to_all(broadcast_message)
+                
+    except WebSocketDisconnect:
+        manager.disconnect(websocket)
+
 @router.websocket("/ws/{agent_name}")
 async def websocket_agent_endpoint(websocket: WebSocket, agent_name: str):
     """WebSocket endpoint for specific agent monitoring"""
     await manager.connect(websocket, agent_name)
+    chat_streams: Dict[str, asyncio.Task] = {}
+
+    def forget_stream(request_id: str, task: asyncio.Task):
+        if chat_streams.get(request_id) is task:
+            del chat_streams[request_id]
     
     # Send initial connection message
-    await manager.send_personal_message(json.dumps({
+    await manager.send_personal_message(encode_frame({
         "type": "connection_established",
         "agent": agent_name,
         "message": f"Connected to {agent_name} performance monitoring"
@@ -26,7 +143,7 @@ async def websocket_agent_endpoint(websocket: WebSocket, agent_name: str):
             # Handle different message types
             if client_message.get("type") == "get_status":
                 # Send current agent status
-                status_message = json.dumps({
+                status_message = encode_frame({
                     "type": "agent_status",
                     "agent": agent_name,
                     "status": "active",
@@ -41,7 +158,7 @@ async def websocket_agent_endpoint(websocket: WebSocket, agent_name: str):
                 
             elif client_message.get("type") == "agent_interaction":
                 # Broadcast agent interaction to all connected clients
-                interaction_message = json.dumps({
+                interaction_message = Frame({
                     "type": "agent_interaction",
                     "agent": agent_name,
                     "data": client_message.get("data"),
@@ -49,55 +166,42 @@ async def websocket_agent_endpoint(websocket: WebSocket, agent_name: str):
                     "timestamp": client_message.get("timestamp")
                 })
                 await manager.broadcast_to_agent(interaction_message, agent_name)
-                
-    except WebSocketDisconnect:
-        manager.disconnect(websocket, agent_name)
 
-@router.websocket("/ws/global")
-async def websocket_global_endpoint(websocket: WebSocket):
-    """WebSocket endpoint for global system monitoring"""
-    await manager.connect(websocket)
-    
-    # Send initial connection message
-    await manager.send_personal_message(json.dumps({
-        "type": "global_connection_established",
-        "message": "Connected to global system monitoring"
-    }), websocket)
-    
-    try:
-        while True:
-            data = await websocket.receive_text()
-            client_message = json.loads(data)
-            
-            if client_message.get("type") == "get_all_agents":
-                # Send status of all agents
-                all_agents_message = json.dumps({
-                    "type": "all_agents_status",
-                    "data": performance_monitor.agent_stats,
-                    "active_connections": len(manager.active_connections)
-                })
-                await manager.send_personal_message(all_agents_message, websocket)
-                
-            elif client_message.get("type") == "broadcast_message":
-                # Broadcast message to all connected clients
-                broadcast_message = json.dumps({
-                    "type": "global_broadcast",
-                    "message": client_message.get("message"),
-                    "from": client_message.get("from", "system")
-                })
-                await manager.broadcast_to_all(broadcast_message)
+            elif client_message.get("type") == "chat":
+                # Stream model tokens back on this socket, multiplexed by request id
+                request_id = str(client_message.get("request_id") or uuid.uuid4())
+                if request_id in chat_streams:
+                    chat_streams.pop(request_id).cancel()
+                task = asyncio.create_task(stream_chat_to_socket(websocket, agent_name, request_id, client_message))
+                task.add_done_callback(functools.partial(forget_stream, request_id))
+                chat_streams[request_id] = task
+
+            elif client_message.get("type") == "cancel":
+                # Stop an in-flight chat stream and its upstream generation
+                request_id = str(client_message.get("request_id"))
+                task = chat_streams.pop(request_id, None)
+                if task:
+                    task.cancel()
+                    await manager.send_personal_message(encode_frame({
+                        "type": "chat_cancelled",
+                        "request_id": request_id
+                    }), websocket)
                 
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
+        manager.disconnect(websocket, agent_name)
+    finally:
+        for task in list(chat_streams.values()):
+            task.cancel()
 
 @router.get("/ws/status")
 async def get_websocket_status():
     """Get current WebSocket connection status"""
     return {
-        "total_connections": len(manager.active_connections),
+        "total_connections": manager.connection_count(),
         "agent_connections": {
-            agent: len(connections) 
+            agent: len(connections)
             for agent, connections in manager.agent_connections.items()
         },
-        "monitoring_active": performance_monitor.is_monitoring
+        "monitoring_active": performance_monitor.is_monitoring,
+        "outbound": manager.stats()
     }